@@ -28,13 +28,12 @@ try:
     from simglucose.simulation.env import T1DSimEnv
     from simglucose.controller.basal_bolus_ctrller import BBController
     from simglucose.controller.pid_ctrller import PIDController
-    from simglucose.controller.loop_ctrller import LoopController
     from simglucose.sensor.cgm import CGMSensor
     from simglucose.actuator.pump import InsulinPump
     from simglucose.patient.t1dpatient import T1DPatient
     from simglucose.simulation.scenario_gen import RandomScenario
     from simglucose.simulation.sim_engine import SimObj, sim
-    import loop_to_python_api.api as loop_to_python_api
+    from simglucose.analysis import glucose_effects
 except ImportError as e:
     click.echo(click.style(f"✗ Import error: {e}", fg='red'))
     click.echo(click.style("Please ensure simglucose is properly installed:", fg='yellow'))
@@ -47,18 +46,25 @@ CONTROLLER_TYPES = ['bolus-basal', 'loop-temp-basal', 'loop-automatic-bolus', 'p
 
 def create_controller(controller_type, pid_p=0.000001, pid_i=0.00000005, pid_d=0.0):
     """Create a controller object based on the specified type and parameters."""
+    # Built on demand, so that the Loop package is only needed by the Loop controllers
     controllers = {
-        'bolus-basal': BBController(),
-        'loop-temp-basal': LoopController(recommendation_type='tempBasal'),
-        'loop-automatic-bolus': LoopController(recommendation_type='automaticBolus'),
-        'pid-automated': PIDController(P=pid_p, I=pid_i, D=pid_d, is_fully_automated=True),
-        'pid-bolus': PIDController(P=pid_p, I=pid_i, D=pid_d, is_fully_automated=False),
+        'bolus-basal': lambda: BBController(),
+        'loop-temp-basal': lambda: loop_controller(recommendation_type='tempBasal'),
+        'loop-automatic-bolus': lambda: loop_controller(recommendation_type='automaticBolus'),
+        'pid-automated': lambda: PIDController(P=pid_p, I=pid_i, D=pid_d, is_fully_automated=True),
+        'pid-bolus': lambda: PIDController(P=pid_p, I=pid_i, D=pid_d, is_fully_automated=False),
     }
     
     if controller_type not in controllers:
         raise ValueError(f"Unknown controller type: {controller_type}. Available: {list(controllers.keys())}")
     
-    return controllers[controller_type]
+    return controllers[controller_type]()
+
+
+def loop_controller(**kwargs):
+    """Create a LoopController, importing it only here as it needs the Loop package."""
+    from simglucose.controller.loop_ctrller import LoopController
+    return LoopController(**kwargs)
 
 
 def load_patient_data(patient_pattern='adult', patient_id=None, max_patients=None):
@@ -90,7 +96,7 @@ def load_patient_data(patient_pattern='adult', patient_id=None, max_patients=Non
 def generate_dataset_core(
     n_days, controller_type, patient_pattern, patient_id, max_patients, 
     output_dir, filename_prefix, compute_therapy_settings, sensor, pump, 
-    pid_p, pid_i, pid_d, results_path, quiet
+    pid_p, pid_i, pid_d, results_path, quiet, native_effects=False
 ):
     """Core function to generate the dataset with the given configuration."""
     # Create controller
@@ -183,8 +189,12 @@ def generate_dataset_core(
         formatted_df['weight'] = weight * 2.20462
 
         # Add iob and ice columns
-        formatted_df = loop_to_python_api.add_insulin_counteraction_effect_to_df(formatted_df, basal, isf, cr)
-        formatted_df = loop_to_python_api.add_insulin_on_board_to_df(formatted_df, basal, isf, cr)
+        if native_effects:
+            effects = glucose_effects
+        else:
+            import loop_to_python_api.api as effects
+        formatted_df = effects.add_insulin_counteraction_effect_to_df(formatted_df, basal, isf, cr)
+        formatted_df = effects.add_insulin_on_board_to_df(formatted_df, basal, isf, cr)
         formatted_df['ice'] = (formatted_df['ice'] * 60 * 5).round(2)  # From mg/dL*s to mg/dL
 
         formatted_df.index.name = 'date'
@@ -230,7 +240,8 @@ def generate_dataset_programmatic(
     pid_i=0.00000005,
     pid_d=0.0,
     results_path='./results',
-    quiet=False
+    quiet=False,
+    native_effects=False
 ):
     """
     Programmatic interface for generating datasets without CLI.
@@ -243,7 +254,7 @@ def generate_dataset_programmatic(
     return generate_dataset_core(
         n_days, controller, patient_pattern, patient_id, max_patients,
         output_dir, filename_prefix, compute_therapy_settings, sensor, pump,
-        pid_p, pid_i, pid_d, results_path, quiet
+        pid_p, pid_i, pid_d, results_path, quiet, native_effects
     )
 
 
@@ -279,15 +290,17 @@ def generate_dataset_programmatic(
               help='Insulin pump type to use')
 @click.option('--quiet', is_flag=True, default=False,
               help='Suppress progress output')
+@click.option('--native-effects', is_flag=True, default=False,
+              help='Compute IOB and insulin counteraction effects with simglucose instead of the Loop Algorithm')
 def main(n_days, filename_prefix, output_dir, results_path, controller, 
          pid_p, pid_i, pid_d, patient_pattern, patient_id, max_patients,
-         compute_therapy_settings, sensor, pump, quiet):
+         compute_therapy_settings, sensor, pump, quiet, native_effects):
     """Generate synthetic glucose datasets using simglucose simulator."""
     try:
         result_file = generate_dataset_core(
             n_days, controller, patient_pattern, patient_id, max_patients,
             output_dir, filename_prefix, compute_therapy_settings, sensor, pump,
-            pid_p, pid_i, pid_d, results_path, quiet
+            pid_p, pid_i, pid_d, results_path, quiet, native_effects
         )
         
         if result_file:
@@ -0,0 +1,282 @@
+"""
+Insulin on board (IOB), carbs on board (COB) and the glucose effects derived
+from them, following the models of the Loop Algorithm: an exponential insulin
+action curve and linear carb absorption.
+
+Two flavours are provided:
+    - InsulinOnBoard / CarbsOnBoard keep a running state that is updated in
+      O(1) amortized time per dose, for controllers stepping through time.
+    - the *_to_df functions compute the whole curves of a regularly sampled
+      DataFrame at once, vectorized over time.
+Times are in minutes, insulin in U, carbs in g and glucose in mg/dL.
+"""
+from collections import deque
+from collections import namedtuple
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# action_duration, peak_activity and delay in minutes
+InsulinModel = namedtuple('insulin_model',
+                          ['action_duration', 'peak_activity', 'delay'])
+
+INSULIN_MODELS = {
+    'novolog': InsulinModel(360, 75, 10),
+    'humalog': InsulinModel(360, 75, 10),
+    'apidra': InsulinModel(360, 75, 10),
+    'fiasp': InsulinModel(360, 55, 10),
+    'lyumjev': InsulinModel(360, 55, 10),
+}
+CARB_ABSORPTION_TIME = 180  # min
+CARB_DELAY = 10  # min
+
+
+class ExponentialInsulinCurve(object):
+    """
+    The exponential insulin action curve used by Loop. The fraction of a dose
+    remaining u minutes after the delay is
+
+        1 - S(1 - a)((u^2 / (tau D (1 - a)) - u / tau - 1) exp(-u / tau) + 1)
+
+    which can be written C0 + (c2 u^2 + c1 u + c0) exp(-u / tau). That form
+    is what lets InsulinOnBoard track the sum over all doses incrementally.
+    """
+    def __init__(self, action_duration=360, peak_activity=75, delay=10):
+        self.action_duration = action_duration
+        self.peak_activity = peak_activity
+        self.delay = delay
+
+        D, tp = action_duration, peak_activity
+        self.tau = tp * (1 - tp / D) / (1 - 2 * tp / D)
+        a = 2 * self.tau / D
+        S = 1 / (1 - a + (1 + a) * np.exp(-D / self.tau))
+        self.C0 = 1 - S * (1 - a)
+        self.c2 = -S / (self.tau * D)
+        self.c1 = S * (1 - a) / self.tau
+        self.c0 = S * (1 - a)
+
+    @classmethod
+    def withName(cls, insulin_type):
+        return cls(*INSULIN_MODELS[insulin_type])
+
+    def percent_effect_remaining(self, t):
+        """
+        Fraction of a dose not yet acting t minutes after it was given.
+        """
+        u = np.asarray(t, dtype=float) - self.delay
+        remaining = self.C0 + np.exp(-u / self.tau) * (
+            (self.c2 * u + self.c1) * u + self.c0)
+        remaining = np.where(u <= 0, 1.0, remaining)
+        return np.where(u >= self.action_duration, 0.0, remaining)
+
+
+class LinearCarbCurve(object):
+    """
+    Linear carb absorption: nothing is absorbed during the delay, then the
+    carbs are absorbed at a constant rate over absorption_time minutes.
+    """
+    def __init__(self, absorption_time=CARB_ABSORPTION_TIME,
+                 delay=CARB_DELAY):
+        self.action_duration = absorption_time
+        self.delay = delay
+
+    def percent_effect_remaining(self, t):
+        u = np.asarray(t, dtype=float) - self.delay
+        return np.clip(1 - u / self.action_duration, 0.0, 1.0)
+
+
+class _OnBoard(object):
+    """
+    Running sum of the remaining effect of a time ordered sequence of doses.
+    Doses are pending during the delay, active for action_duration minutes
+    and expired afterwards. Active doses are summarized by a few moments
+    taken relative to a reference time, which is moved forward (and the
+    moments recomputed) once per action_duration, so every dose is touched
+    a constant number of times.
+    """
+    def __init__(self, curve):
+        self.curve = curve
+        self.reset()
+
+    def reset(self):
+        self._pending = deque()
+        self._active = deque()
+        self._pending_sum = 0.0
+        self._active_sum = 0.0
+        self._moments = np.zeros(self.N_MOMENTS)
+        self._ref = 0.0
+        self._t = -np.inf
+        self.total = 0.0
+
+    def add(self, t, amount):
+        """
+        Add a dose given at time t (minutes). Doses must be added in time
+        order.
+        """
+        if t < self._t:
+            raise ValueError('Doses must be added in time order.')
+        if amount == 0:
+            return
+        self._pending.append((t + self.curve.delay, amount))
+        self._pending_sum += amount
+        self.total += amount
+
+    def _advance(self, t):
+        if t < self._t:
+            raise ValueError('Time must not go backwards.')
+        self._t = t
+        duration = self.curve.action_duration
+
+        while self._active and t >= self._active[0][0] + duration:
+            s, amount = self._active.popleft()
+            self._active_sum -= amount
+            self._moments -= self._terms(s - self._ref, amount)
+
+        while self._pending and self._pending[0][0] <= t:
+            s, amount = self._pending.popleft()
+            self._pending_sum -= amount
+            self._active.append((s, amount))
+            self._active_sum += amount
+            self._moments += self._terms(s - self._ref, amount)
+
+        if t - self._ref > duration or not self._active:
+            self._ref = t
+            self._moments = np.zeros(self.N_MOMENTS)
+            self._active_sum = 0.0
+            for s, amount in self._active:
+                self._active_sum += amount
+                self._moments += self._terms(s - self._ref, amount)
+
+    def value(self, t):
+        """
+        Amount still on board at time t. Queries must be in time order.
+        """
+        self._advance(t)
+        return self._pending_sum + self._active_value(t - self._ref)
+
+    def absorbed(self, t):
+        """
+        Amount that has acted by time t.
+        """
+        return self.total - self.value(t)
+
+
+class InsulinOnBoard(_OnBoard):
+    """
+    Incremental insulin on board.
+
+        iob = InsulinOnBoard(ExponentialInsulinCurve.withName('novolog'))
+        iob.add(t, units)
+        iob.value(t)
+    """
+    N_MOMENTS = 3
+
+    def _terms(self, sigma, amount):
+        w = amount * np.exp(sigma / self.curve.tau)
+        return np.array([w, w * sigma, w * sigma * sigma])
+
+    def _active_value(self, v):
+        c = self.curve
+        A0, A1, A2 = self._moments
+        return c.C0 * self._active_sum + np.exp(-v / c.tau) * (
+            c.c2 * (v * v * A0 - 2 * v * A1 + A2) + c.c1 * (v * A0 - A1) +
+            c.c0 * A0)
+
+    def effect(self, t, isf):
+        """
+        Cumulative glucose effect (mg/dL) of all the insulin added so far.
+        """
+        return -isf * self.absorbed(t)
+
+
+class CarbsOnBoard(_OnBoard):
+    """
+    Incremental carbs on board with linear absorption.
+    """
+    N_MOMENTS = 1
+
+    def _terms(self, sigma, amount):
+        return np.array([amount * sigma])
+
+    def _active_value(self, v):
+        return self._active_sum - (
+            v * self._active_sum - self._moments[0]) / self.curve.action_duration
+
+    def effect(self, t, isf, cr):
+        """
+        Cumulative glucose effect (mg/dL) of all the carbs added so far.
+        """
+        return isf / cr * self.absorbed(t)
+
+
+def on_board(amounts, sample_time, curve):
+    """
+    Amount on board at every sample of a regularly sampled dose series,
+    computed as a convolution with the effect curve.
+    """
+    amounts = np.nan_to_num(np.asarray(amounts, dtype=float))
+    n_kernel = int(np.ceil(
+        (curve.action_duration + curve.delay) / sample_time)) + 1
+    kernel = curve.percent_effect_remaining(
+        np.arange(min(n_kernel, len(amounts))) * sample_time)
+    return np.convolve(amounts, kernel)[:len(amounts)]
+
+
+def _sample_time(df):
+    return float(np.median(np.diff(df.index.values)) / np.timedelta64(1, 'm'))
+
+
+def _net_insulin(df, basal, sample_time):
+    """
+    Insulin delivered on top of the scheduled basal rate (U) in every row.
+    The basal column is a rate (U/hr) and the bolus column an amount (U).
+    """
+    delivered = np.nan_to_num(df['basal'].to_numpy(dtype=float))
+    net_basal = (delivered - basal) * sample_time / 60
+    return net_basal + np.nan_to_num(df['bolus'].to_numpy(dtype=float))
+
+
+def add_insulin_on_board_to_df(df, basal, isf, cr, insulin_type='novolog'):
+    """
+    Add an 'iob' column (U) with the insulin on board, net of the scheduled
+    basal rate, to a DataFrame with a regular DatetimeIndex and 'basal' (U/hr)
+    and 'bolus' (U) columns.
+    """
+    sample_time = _sample_time(df)
+    curve = ExponentialInsulinCurve.withName(insulin_type)
+    df['iob'] = on_board(_net_insulin(df, basal, sample_time), sample_time,
+                         curve)
+    return df
+
+
+def add_carbs_on_board_to_df(df, basal, isf, cr,
+                             absorption_time=CARB_ABSORPTION_TIME):
+    """
+    Add a 'cob' column (g) with the carbs on board, from a 'carbs' (g) column.
+    """
+    sample_time = _sample_time(df)
+    curve = LinearCarbCurve(absorption_time=absorption_time)
+    df['cob'] = on_board(df['carbs'].to_numpy(dtype=float), sample_time,
+                         curve)
+    return df
+
+
+def add_insulin_counteraction_effect_to_df(df, basal, isf, cr,
+                                           insulin_type='novolog'):
+    """
+    Add an 'ice' column with the insulin counteraction effect: the observed
+    CGM change minus the change explained by insulin, as a velocity in
+    mg/dL/s like Loop reports it. The first row is NaN.
+    """
+    sample_time = _sample_time(df)
+    curve = ExponentialInsulinCurve.withName(insulin_type)
+    net_insulin = _net_insulin(df, basal, sample_time)
+    iob = on_board(net_insulin, sample_time, curve)
+    insulin_effect = -isf * (np.cumsum(net_insulin) - iob)
+
+    glucose_change = np.diff(df['CGM'].to_numpy(dtype=float))
+    ice = np.full(len(df), np.nan)
+    ice[1:] = (glucose_change - np.diff(insulin_effect)) / (sample_time * 60)
+    df['ice'] = ice
+    return df
@@ -1,5 +1,7 @@
 from .base import Controller
 from .base import Action
+from .therapy_settings import TherapySettingsCache
+import numpy as np
 import pandas as pd
 import pkg_resources
 import logging
@@ -20,6 +22,8 @@ class BBController(Controller):
     def __init__(self, target=140, use_tdd_settings=False):
         self.quest = pd.read_csv(CONTROL_QUEST)
         self.patient_params = pd.read_csv(PATIENT_PARA_FILE)
+        self.therapy_settings = TherapySettingsCache(self.quest,
+                                                     self.patient_params)
         self.target = target
         self.use_tdd_settings = use_tdd_settings
 
@@ -31,6 +35,38 @@ class BBController(Controller):
         action = self._bb_policy(pname, meal, observation.CGM, sample_time)
         return action
 
+    def policy_batch(self, observations, infos, rewards=None, dones=None):
+        glucose = np.array([obs.CGM for obs in observations], dtype=float)
+        meal = np.array([info.get('meal') for info in infos], dtype=float)
+        sample_time = np.array([info.get('sample_time', 1) for info in infos],
+                               dtype=float)
+        basal, cr, isf = self._batch_settings(
+            tuple(info.get('patient_name') for info in infos))
+
+        # Same formula as _bb_policy, bolus converted from U to U/min
+        bolus = np.where(
+            meal > 0,
+            (meal * sample_time) / cr +
+            (glucose > 150) * (glucose - self.target) / isf, 0) / sample_time
+        return Action(basal=basal.copy(), bolus=bolus)
+
+    def _batch_settings(self, names):
+        """
+        Basal, CR and ISF arrays of a cohort, kept until the cohort changes.
+        """
+        key = (names, self.use_tdd_settings)
+        if getattr(self, '_cohort_settings', (None, ))[0] != key:
+            settings = [
+                self.therapy_settings.get(
+                    name, self.get_therapy_settings_from_tdd
+                    if self.use_tdd_settings else None) for name in names
+            ]
+            self._cohort_settings = (key,
+                                     np.array([s.basal for s in settings]),
+                                     np.array([s.cr for s in settings]),
+                                     np.array([s.isf for s in settings]))
+        return self._cohort_settings[1:]
+
     def _bb_policy(self, name, meal, glucose, env_sample_time):
         """
         Helper function to compute the basal and bolus amount.
@@ -49,35 +85,21 @@ class BBController(Controller):
         simulator only accepts insulin rate. Hence the bolus is converted to
         insulin rate.
         """
-        if any(self.quest.Name.str.match(name)):
-            quest = self.quest[self.quest.Name.str.match(name)]
-            params = self.patient_params[self.patient_params.Name.str.match(
-                name)]
-            u2ss = params.u2ss.values.item()  # unit: pmol/(L*kg)
-            BW = params.BW.values.item()  # unit: kg
-            TDD = quest.TDI.values[0]
-        else:
-            quest = pd.DataFrame([['Average', 1 / 15, 1 / 50, 50, 30]],
-                                 columns=['Name', 'CR', 'CF', 'TDI', 'Age'])
-            u2ss = 1.43  # unit: pmol/(L*kg)
-            BW = 57.0  # unit: kg
-            TDD = 50
-
-        if self.use_tdd_settings:
-            basal_pr_hr, isf, cr = self.get_therapy_settings_from_tdd(TDD)
-            basal = basal_pr_hr / 60  # unit: U/hr
-        else:
-            basal = u2ss * BW / 6000  # unit: U/min
-            cr = float(quest.CR.values[0])
-            isf = float(quest.CF.values[0])
+        settings = self.therapy_settings.get(
+            name,
+            self.get_therapy_settings_from_tdd
+            if self.use_tdd_settings else None)
+        basal = settings.basal  # unit: U/min
+        cr = settings.cr
+        isf = settings.isf
 
         if meal > 0:
             logger.info('Calculating bolus ...')
             logger.info(f'Meal = {meal} g/min')
             logger.info(f'glucose = {glucose}')
-            bolus = (
+            bolus = float(
                 (meal * env_sample_time) / cr + (glucose > 150) *
-                (glucose - self.target) / isf).item()  # unit: U
+                (glucose - self.target) / isf)  # unit: U
         else:
             bolus = 0  # unit: U
 
@@ -1,4 +1,5 @@
 from collections import namedtuple
+import numpy as np
 
 Action = namedtuple('ctrller_action', ['basal', 'bolus'])
 
@@ -27,6 +28,35 @@ class Controller(object):
         '''
         raise NotImplementedError
 
+    def policy_batch(self, observations, infos, rewards=None, dones=None):
+        '''
+        Batched version of policy, for engines stepping many patients at once.
+        Controllers with vectorized math or per-patient state should override
+        it, the default implementation calls policy once per patient.
+        ----
+        Inputs:
+        observations - a sequence of observations, one per patient.
+        infos        - a sequence of info dicts, one per patient, as returned
+                       by simglucose.simulation.env.T1DSimEnv.step.
+        rewards      - optional sequence of rewards, 0 by default.
+        dones        - optional sequence of done flags, False by default.
+        ----
+        Output:
+        action - an Action namedtuple whose basal and bolus entries are numpy
+                 arrays with one entry per patient.
+        '''
+        n = len(observations)
+        rewards = [0] * n if rewards is None else rewards
+        dones = [False] * n if dones is None else dones
+        basal = np.zeros(n)
+        bolus = np.zeros(n)
+        for i, (obs, reward, done, info) in enumerate(
+                zip(observations, rewards, dones, infos)):
+            action = self.policy(obs, reward, done, **info)
+            basal[i] = action.basal
+            bolus[i] = action.bolus
+        return Action(basal=basal, bolus=bolus)
+
     def reset(self):
         '''
         Reset the controller state to inital state, must be implemented
@@ -0,0 +1,316 @@
+from .base import Controller
+from .base import Action
+from simglucose.simulation.features import FeatureEngine
+from simglucose.simulation.sim_engine import SimObj
+from scipy.spatial import cKDTree
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+import logging
+import copy
+
+logger = logging.getLogger(__name__)
+
+FEATURE_NAMES = ['CGM', 'CGM_roc', 'IOB', 'COB', 'meal']
+ACTION_NAMES = ['basal', 'bolus']
+
+
+class PolicyFeatures(object):
+    """
+    The inputs a distilled policy is fit on, computed online from what a
+    controller sees: the CGM reading and its rate of change, the insulin on
+    board of the actions issued so far, the carbs on board and the current
+    meal (g/min). Kept per patient with a FeatureEngine.
+    """
+    def __init__(self, window_size=10, trend_size=3):
+        self.window_size = window_size
+        self.trend_size = trend_size
+        self.reset()
+
+    def reset(self):
+        self._patients = {}
+
+    def __call__(self, observation, info):
+        name = info.get('patient_name')
+        sample_time = info.get('sample_time', 1)
+        meal = info.get('meal') or 0
+        t = info.get('time')
+        if name not in self._patients:
+            engine = FeatureEngine(window_size=self.window_size,
+                                   trend_size=self.trend_size)
+            engine.reset(observation.CGM, sample_time)
+            self._patients[name] = [engine, t, 0.0]
+        else:
+            engine, t0, insulin = self._patients[name]
+            minutes = ((t - t0).total_seconds() / 60 if t is not None else
+                       engine.t + sample_time)
+            engine.update(observation.CGM, insulin, meal, minutes)
+        engine = self._patients[name][0]
+        return np.array([
+            observation.CGM, engine.cgm_roc, engine.insulin_on_board,
+            engine.carbs_on_board, meal
+        ])
+
+    def record_action(self, name, action):
+        """
+        Remember the insulin (U/min) delivered until the next call.
+        """
+        self._patients[name][2] = action.basal + action.bolus
+
+
+class PolicyRecorder(Controller):
+    """
+    Wraps a controller, and records the features it was called with and the
+    actions it returned, to distill it with DistilledController.fit.
+
+        recorder = PolicyRecorder(LoopController())
+        SimObj(env, recorder, sim_time, animate=False).simulate()
+        dataset = recorder.dataset()
+    """
+    def __init__(self, controller, features=None):
+        self.controller = controller
+        self.features = PolicyFeatures() if features is None else features
+        self._rows = []
+        self._names = []
+        self._episodes = []
+        self._episode = 0
+
+    @property
+    def needs_patient_snapshot(self):
+        return getattr(self.controller, 'needs_patient_snapshot', False)
+
+    def policy(self, observation, reward, done, **info):
+        x = self.features(observation, info)
+        action = self.controller.policy(observation, reward, done, **info)
+        self.features.record_action(info.get('patient_name'), action)
+        self._rows.append(np.concatenate([x, [action.basal, action.bolus]]))
+        self._names.append(info.get('patient_name'))
+        self._episodes.append(self._episode)
+        return action
+
+    def dataset(self):
+        """
+        The records as a DataFrame with patient_name and episode columns,
+        the FEATURE_NAMES and the ACTION_NAMES. An episode is a run between
+        two resets of the recorder.
+        """
+        df = pd.DataFrame(np.array(self._rows).reshape(-1, 7),
+                          columns=FEATURE_NAMES + ACTION_NAMES)
+        df.insert(0, 'patient_name', self._names)
+        df.insert(1, 'episode', np.array(self._episodes, dtype=int))
+        return df
+
+    def reset(self):
+        # the wrapped controller is reset for every run, the records are kept
+        if self._episodes and self._episodes[-1] == self._episode:
+            self._episode += 1
+        self.controller.reset()
+        self.features.reset()
+
+
+class LookupTable(object):
+    """
+    Piecewise constant approximator: every feature is cut into up to n_bins
+    quantile bins, and every cell of the grid stores the mean target of the
+    samples falling in it. Empty cells take the value of the nearest
+    populated cell. A prediction is one binary search per feature and an
+    array lookup.
+    """
+    def __init__(self, n_bins=8):
+        self.n_bins = n_bins
+
+    def fit(self, X, y):
+        X = np.asarray(X, dtype=float)
+        y = np.asarray(y, dtype=float).reshape(len(X), -1)
+        self.edges = [
+            np.unique(np.quantile(X[:, j], np.linspace(0, 1, self.n_bins +
+                                                       1)[1:-1]))
+            for j in range(X.shape[1])
+        ]
+        self.shape = tuple(len(e) + 1 for e in self.edges)
+
+        cells = self._cells(X)
+        n_cells = int(np.prod(self.shape))
+        counts = np.bincount(cells, minlength=n_cells)
+        sums = np.stack([
+            np.bincount(cells, weights=y[:, k], minlength=n_cells)
+            for k in range(y.shape[1])
+        ], axis=1)
+        populated = np.flatnonzero(counts)
+        self.table = np.empty((n_cells, y.shape[1]))
+        self.table[populated] = sums[populated] / counts[populated, None]
+
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            coords = np.array(np.unravel_index(populated, self.shape)).T
+            _, nearest = cKDTree(coords).query(
+                np.array(np.unravel_index(empty, self.shape)).T)
+            self.table[empty] = self.table[populated[nearest]]
+        return self
+
+    def _cells(self, X):
+        index = [
+            np.searchsorted(e, X[:, j], side='right')
+            for j, e in enumerate(self.edges)
+        ]
+        return np.ravel_multi_index(index, self.shape)
+
+    def predict(self, X):
+        return self.table[self._cells(np.atleast_2d(X))]
+
+
+class DistilledController(Controller):
+    """
+    A fast approximation of a slower controller, fit on the records of a
+    PolicyRecorder. A lookup table is fit per patient, plus one on all the
+    records for patients that were not recorded. fidelity holds the error
+    against the original controller on held out episodes or patients, and
+    agreement compares closed loop runs of both controllers.
+    """
+    def __init__(self, tables, fidelity=None, agreement=None, window_size=10,
+                 trend_size=3):
+        '''
+        tables    - dict mapping patient names (None for all the patients) to
+                    LookupTable instances predicting (basal, bolus).
+        fidelity  - see fit.
+        agreement - see fit.
+        '''
+        self.tables = tables
+        self.fidelity = fidelity
+        self.agreement = agreement
+        self.features = PolicyFeatures(window_size, trend_size)
+
+    @classmethod
+    def fit(cls, dataset, n_bins=8, test_fraction=0.2, seed=None,
+            holdout='episode', teacher=None, validation_envs=(),
+            sim_time=timedelta(days=1), **kwargs):
+        """
+        Fit the lookup tables on a PolicyRecorder dataset.
+
+        A random test_fraction of the episodes (holdout='episode') or of the
+        patients (holdout='patient_name') is held out whole, at least one
+        when there are two or more, to measure the fidelity: for basal and
+        bolus, the mean absolute error (U/min), the R2 and the ratio of the
+        total predicted insulin to the original one. Records of the same
+        run are correlated, so random records would overstate it.
+
+        When the teacher, the controller recorded, and validation_envs,
+        T1DSimEnv instances of runs that were not recorded, are given, each
+        env is simulated for sim_time with both controllers and agreement
+        holds the closed loop comparison, see closed_loop_agreement.
+        """
+        if holdout not in dataset:
+            raise ValueError('The dataset has no {} column.'.format(holdout))
+        random_gen = np.random.RandomState(seed)
+        groups = dataset[holdout].to_numpy()
+        unique = np.unique(groups)
+        n_test = 0
+        if len(unique) > 1 and test_fraction > 0:
+            n_test = min(max(int(round(test_fraction * len(unique))), 1),
+                         len(unique) - 1)
+        test = np.isin(groups,
+                       random_gen.choice(unique, n_test, replace=False))
+        train_df = dataset[~test]
+
+        tables = {None: cls._fit_table(train_df, n_bins)}
+        for name, df in train_df.groupby('patient_name'):
+            tables[name] = cls._fit_table(df, n_bins)
+
+        fidelity = None
+        if test.any():
+            controller = cls(tables, **kwargs)
+            predicted = controller.predict(dataset[test])
+            fidelity = _fidelity(dataset[test][ACTION_NAMES].to_numpy(),
+                                 predicted)
+            logger.info('Distilled policy fidelity:\n{}'.format(fidelity))
+
+        agreement = None
+        if teacher is not None and len(validation_envs):
+            controller = cls(tables, **kwargs)
+            agreement = pd.DataFrame([
+                closed_loop_agreement(controller, teacher, env, sim_time)
+                for env in validation_envs
+            ])
+            logger.info('Distilled policy closed loop agreement:\n{}'.format(
+                agreement))
+        return cls(tables, fidelity=fidelity, agreement=agreement, **kwargs)
+
+    @staticmethod
+    def _fit_table(df, n_bins):
+        return LookupTable(n_bins).fit(df[FEATURE_NAMES].to_numpy(),
+                                       df[ACTION_NAMES].to_numpy())
+
+    def predict(self, dataset):
+        """
+        Actions (basal, bolus) for the records of a dataset, shape (N, 2).
+        """
+        predicted = np.empty((len(dataset), 2))
+        names = dataset['patient_name'].to_numpy()
+        X = dataset[FEATURE_NAMES].to_numpy()
+        for name in np.unique(names):
+            rows = names == name
+            predicted[rows] = self._table(name).predict(X[rows])
+        return predicted
+
+    def _table(self, name):
+        return self.tables.get(name, self.tables[None])
+
+    def policy(self, observation, reward, done, **info):
+        name = info.get('patient_name')
+        x = self.features(observation, info)
+        basal, bolus = np.maximum(self._table(name).predict(x)[0], 0)
+        action = Action(basal=basal, bolus=bolus)
+        self.features.record_action(name, action)
+        return action
+
+    def reset(self):
+        self.features.reset()
+
+
+def _fidelity(actual, predicted):
+    rows = []
+    for k, name in enumerate(ACTION_NAMES):
+        a, p = actual[:, k], predicted[:, k]
+        ss = np.sum((a - a.mean())**2)
+        rows.append({
+            'action': name,
+            'mae': np.mean(np.abs(a - p)),
+            # R2 is undefined for a constant action, e.g. a fixed basal
+            'r2': (1 - np.sum((a - p)**2) / ss
+                   if np.ptp(a) > 1e-12 else np.nan),
+            'total_ratio': p.sum() / a.sum() if a.sum() else np.nan,
+        })
+    return pd.DataFrame(rows).set_index('action')
+
+
+def closed_loop_agreement(controller, teacher, env, sim_time):
+    """
+    Simulate copies of env for sim_time with a distilled controller and with
+    its teacher, and compare the glucose traces: the mean and max absolute
+    BG difference (mg/dL), the time in 70 - 180 mg/dL and the mean risk of
+    both runs, and the ratio of the distilled total insulin to the
+    teacher's one.
+    """
+    results = []
+    for ctrller in (teacher, controller):
+        sim_obj = SimObj(copy.deepcopy(env), ctrller, sim_time, animate=False)
+        sim_obj.simulate()
+        results.append(sim_obj.results())
+    expected, actual = results
+    n = min(len(expected), len(actual))
+    error = np.abs(actual.BG.to_numpy()[:n] - expected.BG.to_numpy()[:n])
+    return pd.Series({
+        'patient_name': env.patient.name,
+        'bg_mae': error.mean(),
+        'bg_max_error': error.max(),
+        'tir_teacher': _time_in_range(expected.BG),
+        'tir_distilled': _time_in_range(actual.BG),
+        'risk_teacher': expected.Risk.mean(),
+        'risk_distilled': actual.Risk.mean(),
+        'insulin_ratio': actual.insulin.sum() / expected.insulin.sum()
+        if expected.insulin.sum() else np.nan,
+    })
+
+
+def _time_in_range(BG):
+    return ((BG >= 70) & (BG <= 180)).mean()
@@ -1,15 +1,30 @@
 from .base import Controller
 from .base import Action
+from .therapy_settings import TherapySettingsCache
+from .observation_buffer import ObservationBuffer
 from loop_to_python_api.helpers import get_json_loop_prediction_input_from_df
 import loop_to_python_api.api as loop_to_python_api
+from collections import OrderedDict
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import numpy as np
 import pandas as pd
+import hashlib
 import pkg_resources
 import logging
 
 logger = logging.getLogger(__name__)
 CONTROL_QUEST = pkg_resources.resource_filename('simglucose', 'params/Quest.csv')
 PATIENT_PARA_FILE = pkg_resources.resource_filename('simglucose', 'params/vpatient_params.csv')
+OBSERVATION_COLUMNS = ["CGM", "basal", "bolus", "carbs"]
+LOOKBACK_MINUTES = 12 * 60  # history sent to the Loop Algorithm
+WARMUP_MINUTES = 3 * 60  # history needed before Loop takes over from basal
+
+# A step that needs Loop dose recommendations. requests holds (json_data, key) pairs, the first one for the
+# configured recommendation type and a second one for the manual meal bolus when the patient eats. json_data is
+# a function building the Loop input, only called when the recommendation is not cached.
+LoopStep = namedtuple('loop_step', ['name', 'datetime', 'glucose', 'meal_grams', 'env_sample_time', 'requests'])
 
 
 class LoopController(Controller):
@@ -18,15 +33,20 @@ class LoopController(Controller):
     """
 
     def __init__(self, target=140, recommendation_type='tempBasal', use_tdd_settings=False,
-                 use_fully_closed_loop=False, insulin_type='novolog'):
+                 use_fully_closed_loop=False, insulin_type='novolog', cache_size=1024):
+        """
+        cache_size - number of Loop dose recommendations memoized by the controller, 0 disables memoization.
+        """
         self.quest = pd.read_csv(CONTROL_QUEST)
         self.patient_params = pd.read_csv(PATIENT_PARA_FILE)
+        self.therapy_settings = TherapySettingsCache(self.quest, self.patient_params)
         self.target = target
         self.observations = {}
         self.recommendation_type = recommendation_type
         self.use_tdd_settings = use_tdd_settings
         self.use_fully_closed_loop = use_fully_closed_loop
         self.insulin_type = insulin_type
+        self.recommender = DoseRecommender(cache_size=cache_size)
 
     def policy(self, observation, reward, done, **kwargs):
         sample_time = kwargs.get('sample_time', 1)
@@ -37,29 +57,55 @@ class LoopController(Controller):
         action = self._loop_policy(datetime, pname, meal, observation.CGM, sample_time)
         return action
 
+    def policy_batch(self, observations, infos, rewards=None, dones=None, max_workers=None):
+        """
+        Compute the actions of many patients' steps at once. The Loop dose recommendations of all the steps are
+        dispatched together to the thread pool of the recommender, of max_workers threads and kept between
+        calls, and identical requests are only computed once.
+        ----
+        Inputs:
+        observations - a sequence of observations, one per patient.
+        infos        - a sequence of info dicts as returned by T1DSimEnv.step, one per patient. Every patient_name
+                       must appear at most once per batch.
+        ----
+        Output:
+        action - an Action namedtuple whose basal and bolus entries are numpy arrays (U/min).
+        """
+        names = [info.get('patient_name') for info in infos]
+        if len(set(names)) < len(names):
+            raise ValueError('Every patient can only appear once in a batch, got {}.'.format(names))
+        steps = [self._prepare_step(info.get('time'), info.get('patient_name'), info.get('meal'), obs.CGM,
+                                    info.get('sample_time', 1))
+                 for obs, info in zip(observations, infos)]
+        requests = [request for step in steps if isinstance(step, LoopStep) for request in step.requests]
+        recommendations = iter(self.recommender.recommend_many(requests, max_workers=max_workers))
+
+        basal = np.zeros(len(steps))
+        bolus = np.zeros(len(steps))
+        for i, step in enumerate(steps):
+            if isinstance(step, LoopStep):
+                step = self._finish_step(step, [next(recommendations) for _ in step.requests])
+            basal[i], bolus[i] = step
+        return Action(basal=basal, bolus=bolus)
+
     def _loop_policy(self, datetime, name, meal, glucose, env_sample_time):
-        if any(self.quest.Name.str.match(name)):
-            quest = self.quest[self.quest.Name.str.match(name)]
-            params = self.patient_params[self.patient_params.Name.str.match(
-                name)]
-            u2ss = params.u2ss.values.item()  # unit: pmol/(L*kg)
-            BW = params.BW.values.item()  # unit: kg
-            TDD = quest.TDI.values[0]
-        else:
-            quest = pd.DataFrame([['Average', 1 / 15, 1 / 50, 50, 30]],
-                                 columns=['Name', 'CR', 'CF', 'TDI', 'Age'])
-            u2ss = 1.43  # unit: pmol/(L*kg)
-            BW = 57.0  # unit: kg
-            TDD = 50
-
-        if self.use_tdd_settings:
-            basal_pr_hr, isf, cr = self.get_therapy_settings_from_tdd(TDD)
-            basal = basal_pr_hr / 60  # unit: U/hr
-        else:
-            basal = u2ss * BW / 6000  # unit: U/min
-            basal_pr_hr = basal * 60  # unit: U/hr
-            cr = float(quest.CR.values[0])
-            isf = float(quest.CF.values[0])
+        step = self._prepare_step(datetime, name, meal, glucose, env_sample_time)
+        if not isinstance(step, LoopStep):
+            return step
+        recommendations = [self.recommender.recommend(*request) for request in step.requests]
+        return self._finish_step(step, recommendations)
+
+    def _prepare_step(self, datetime, name, meal, glucose, env_sample_time):
+        """
+        Record the new observation and build the Loop requests of the step. Returns the action directly when no
+        recommendation is needed.
+        """
+        settings = self.therapy_settings.get(
+            name, self.get_therapy_settings_from_tdd if self.use_tdd_settings else None)
+        basal = settings.basal  # unit: U/min
+        basal_pr_hr = settings.basal_hr  # unit: U/hr
+        cr = settings.cr
+        isf = settings.isf
 
         meal_grams = meal * env_sample_time  # From g/min to g
 
@@ -67,61 +113,192 @@ class LoopController(Controller):
             meal_grams = 0
             meal = 0
 
-        # Load previous observations for patient and add the new CGM observation
-        # TODO: Shouldn't observations be fetched after we add the new glucose and meal reading?
-        df_observations = self.get_patient_observations(key=name)
-        self.add_patient_observation(name, datetime, glucose, np.nan, np.nan, meal_grams)
+        # Add the new CGM observation to the patient's lookback buffer
+        self.add_patient_observation(name, datetime, glucose, np.nan, np.nan, meal_grams,
+                                     sample_time=env_sample_time)
 
         # If observations for < 3 hrs, return basal=scheduled basal and bolus=0
-        if len(df_observations) < (3 * 60 // env_sample_time):
+        if len(self.observations[name]) < (WARMUP_MINUTES // env_sample_time):
             self.add_patient_observation(name, datetime, glucose, basal_pr_hr, 0, meal_grams)
             return Action(basal=basal, bolus=0)
 
-        # Get data input for the Loop Algorithm insulin recommendation
-        df_observations = df_observations.sort_index().tail(int(12*60 // env_sample_time))
-        json_data = get_json_loop_prediction_input_from_df(df_observations, basal_pr_hr, isf, cr,
-                                                           prediction_start=datetime, insulin_type=self.insulin_type)
-
-        # Setting max basal to the double of the scheduled basal rate
-        json_data['maxBasalRate'] = basal_pr_hr * 2
-        json_data['recommendationType'] = self.recommendation_type  # Can be: "automaticBolus", "tempBasal"
-        dose_recommendations = loop_to_python_api.get_dose_recommendations(json_data)
-        basal_rec = dose_recommendations['automatic']['basalAdjustment']['unitsPerHour']
+        # The Loop Algorithm input is only built if the recommendation is not cached
+        df_observations = self.get_patient_observations(key=name)
+        key = recommendation_key(df_observations, datetime, basal_pr_hr, isf, cr, self.insulin_type)
+        loop_input = LoopInput(df_observations, datetime, basal_pr_hr, isf, cr, self.insulin_type)
+        # Can be: "automaticBolus", "tempBasal"
+        requests = [(partial(loop_input.build, self.recommendation_type), key + (self.recommendation_type,))]
 
         if meal > 0:
             # Add manual bolus for meals. Algorithm does not recommend meal boluses if we do not do this
-            json_data['recommendationType'] = 'manualBolus'
-            dose_recommendations = loop_to_python_api.get_dose_recommendations(json_data)
-            bolus_rec = dose_recommendations['manual']['amount']
+            requests.append((partial(loop_input.build, 'manualBolus'), key + ('manualBolus',)))
+
+        return LoopStep(name=name, datetime=datetime, glucose=glucose, meal_grams=meal_grams,
+                        env_sample_time=env_sample_time, requests=requests)
+
+    def _finish_step(self, step, recommendations):
+        dose_recommendations = recommendations[0]
+        basal_rec = dose_recommendations['automatic']['basalAdjustment']['unitsPerHour']
+
+        if len(recommendations) > 1:
+            bolus_rec = recommendations[1]['manual']['amount']
         elif 'bolusUnits' in dose_recommendations['automatic']:
             bolus_rec = dose_recommendations['automatic']['bolusUnits']
         else:
             bolus_rec = 0.0
 
         # Overwrite patient data iteration with insulin action
-        self.add_patient_observation(name, datetime, glucose, basal=basal_rec, bolus=bolus_rec, carbs=meal_grams)
+        self.add_patient_observation(step.name, step.datetime, step.glucose, basal=basal_rec, bolus=bolus_rec,
+                                     carbs=step.meal_grams)
 
         # This is to convert basal (U/hr) and bolus (U) to insulin rate (U/min), as required by the simulation env
-        action = Action(basal=basal_rec / 60, bolus=bolus_rec / env_sample_time)
+        action = Action(basal=basal_rec / 60, bolus=bolus_rec / step.env_sample_time)
         return action
 
     def reset(self):
-        pass
+        self.observations = {}
 
     def get_patient_observations(self, key: str) -> pd.DataFrame:
+        """The last 12 hours of observations of the given key, oldest first."""
         if key in self.observations:
-            return self.observations[key]
-        return pd.DataFrame(columns=["CGM", "basal", "bolus", "carbs"], index=pd.DatetimeIndex([], name="date"))
-
-    def add_patient_observation(self, key: str, datetime, cgm, basal, bolus, carbs):
-        """Add a row to the state dataframe under the given key."""
-        new_data = {
-            "CGM": cgm,
-            "basal": basal,
-            "bolus": bolus,
-            "carbs": np.nan if carbs <= 0 else carbs
-        }
-        df = self.get_patient_observations(key)
-        df.loc[datetime] = new_data
-        self.observations[key] = df
+            return self.observations[key].to_frame()
+        return pd.DataFrame(columns=OBSERVATION_COLUMNS, index=pd.DatetimeIndex([], name="date"))
+
+    def add_patient_observation(self, key: str, datetime, cgm, basal, bolus, carbs, sample_time=1):
+        """
+        Add a row to the observation buffer under the given key. A row at the
+        same datetime as the last one overwrites it.
+        """
+        if key not in self.observations:
+            capacity = int(LOOKBACK_MINUTES // sample_time)
+            self.observations[key] = ObservationBuffer(capacity, OBSERVATION_COLUMNS)
+        self.observations[key].append(datetime, [cgm, basal, bolus, np.nan if carbs <= 0 else carbs])
+
+
+class LoopInput(object):
+    """
+    The Loop Algorithm input of a step, built on first use.
+    """
+
+    def __init__(self, df_observations, prediction_start, basal, isf, cr, insulin_type):
+        self.df_observations = df_observations
+        self.prediction_start = prediction_start
+        self.basal = basal
+        self.isf = isf
+        self.cr = cr
+        self.insulin_type = insulin_type
+        self._json_data = None
+
+    def build(self, recommendation_type):
+        if self._json_data is None:
+            json_data = get_json_loop_prediction_input_from_df(self.df_observations, self.basal, self.isf, self.cr,
+                                                               prediction_start=self.prediction_start,
+                                                               insulin_type=self.insulin_type)
+            # Setting max basal to the double of the scheduled basal rate
+            json_data['maxBasalRate'] = self.basal * 2
+            self._json_data = json_data
+        return dict(self._json_data, recommendationType=recommendation_type)
 
+
+class DoseRecommender(object):
+    """
+    Calls the Loop Algorithm and memoizes the dose recommendations in a LRU cache keyed by recommendation_key.
+    Requests are (json_data, key) pairs, json_data is the Loop input or a function building it on a cache miss.
+    """
+
+    def __init__(self, cache_size=1024):
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        # thread pool of recommend_many, created on first use and kept for the next batches
+        self._executor = None
+        self._max_workers = None
+
+    def recommend(self, json_data, key=None):
+        if key is not None and key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        recommendation = loop_to_python_api.get_dose_recommendations(_loop_json(json_data))
+        self._store(key, recommendation)
+        return recommendation
+
+    def recommend_many(self, requests, max_workers=None):
+        """
+        Recommendations for a list of (json_data, key) requests, in order. Cache misses are deduplicated and run
+        concurrently on a thread pool.
+        """
+        misses = OrderedDict()
+        for i, (json_data, key) in enumerate(requests):
+            if key is None or key not in self._cache:
+                misses.setdefault(key if key is not None else (None, i), json_data)
+
+        if len(misses) > 1 and max_workers != 1:
+            executor = self._get_executor(max_workers)
+            computed = list(executor.map(_recommend, misses.values()))
+        else:
+            computed = [_recommend(json_data) for json_data in misses.values()]
+        computed = dict(zip(misses.keys(), computed))
+
+        recommendations = []
+        for i, (json_data, key) in enumerate(requests):
+            if key is None:
+                recommendations.append(computed[(None, i)])
+            elif key in computed:
+                recommendations.append(computed[key])
+            else:
+                self._cache.move_to_end(key)
+                recommendations.append(self._cache[key])
+        for key, recommendation in computed.items():
+            if key[0] is not None:
+                self._store(key, recommendation)
+        return recommendations
+
+    def _store(self, key, recommendation):
+        if key is None or self.cache_size <= 0:
+            return
+        self._cache[key] = recommendation
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _get_executor(self, max_workers):
+        if self._executor is None or max_workers != self._max_workers:
+            self.close()
+            self._executor = ThreadPoolExecutor(max_workers=max_workers)
+            self._max_workers = max_workers
+        return self._executor
+
+    def clear(self):
+        self._cache = OrderedDict()
+
+    def close(self):
+        """
+        Shut the thread pool down. It is created again by the next recommend_many.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __getstate__(self):
+        # the thread pool is per process, e.g. when the controller is sent to a worker
+        state = self.__dict__.copy()
+        state['_executor'] = None
+        return state
+
+
+def _loop_json(json_data):
+    return json_data() if callable(json_data) else json_data
+
+
+def _recommend(json_data):
+    return loop_to_python_api.get_dose_recommendations(_loop_json(json_data))
+
+
+def recommendation_key(df_observations, prediction_start, basal, isf, cr, insulin_type):
+    """
+    Memoization key of a Loop request. The observations are keyed by their time relative to the prediction start,
+    so that identical situations at different times of the simulation (e.g. fasting with a constant CGM) share a key.
+    This relies on the therapy settings being constant over the day, as they are in this controller.
+    """
+    offsets = (df_observations.index - pd.Timestamp(prediction_start)) // pd.Timedelta(seconds=1)
+    digest = hashlib.sha1(np.asarray(offsets, dtype=np.int64).tobytes())
+    digest.update(df_observations.to_numpy(dtype=float).tobytes())
+    return (digest.hexdigest(), float(basal), float(isf), float(cr), insulin_type)
@@ -0,0 +1,206 @@
+from .base import Controller
+from .base import Action
+from collections import namedtuple
+from simglucose.patient.batch_model import BatchT1DModel
+import numpy as np
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# t      - patient time the plan was made at (min)
+# rates  - insulin rates (U/min), one per minute of the horizon
+# mu     - log basal multipliers to warm start the next decision with
+# eating - whether carbs were being eaten when the plan was made
+Plan = namedtuple('mpc_plan', ['t', 'rates', 'mu', 'eating'])
+
+
+def glucose_risk(BG):
+    """
+    Vectorized simglucose.analysis.risk.risk, the Kovatchev risk index
+    (0 - 100) of glucose values in mg/dL.
+    """
+    BG = np.clip(BG, 20.0, 600.0)
+    U = 1.509 * (np.log(BG)**1.084 - 5.381)
+    return np.minimum(10 * U**2, 100.0)
+
+
+class MPCController(Controller):
+    """
+    A sampling-based model predictive controller. At every decision it takes
+    a snapshot of the patient (the 'patient_snapshot' entry of the info
+    returned by T1DSimEnv.step), rolls out candidate insulin plans with the
+    patient model itself (BatchT1DModel) and refines them with the
+    cross-entropy method, minimizing the mean glucose risk over the horizon.
+    The first part of the best plan is delivered as basal insulin.
+
+    The snapshots are only built by environments created with
+    T1DSimEnv(snapshots=True). SimObj turns them on for controllers with
+    needs_patient_snapshot, like this one.
+
+    The controller knows the true patient state and parameters, so it is an
+    upper reference for controllers that only see CGM readings. Future meals
+    are not known to it.
+
+    A plan is n_blocks insulin rates of block_minutes each, expressed as
+    multiples of the patient's steady state basal rate, followed by the
+    basal rate until the end of the horizon. Candidates are sampled in log
+    space, and the basal plan and a full suspension are always evaluated.
+    """
+    needs_patient_snapshot = True
+
+    def __init__(self,
+                 horizon=240,
+                 block_minutes=30,
+                 n_blocks=4,
+                 n_candidates=256,
+                 n_elites=32,
+                 n_iterations=3,
+                 max_basal_multiplier=50,
+                 replan_interval=15,
+                 time_budget=0.5,
+                 dt=1,
+                 seed=None):
+        '''
+        horizon              - prediction horizon (min).
+        block_minutes        - duration of a plan block (min).
+        n_blocks             - number of blocks optimized, block_minutes *
+                               n_blocks must not exceed horizon.
+        n_candidates         - candidate plans rolled out per iteration.
+        n_elites             - best candidates the sampling distribution is
+                               refit to.
+        n_iterations         - maximum cross-entropy iterations per decision.
+        max_basal_multiplier - largest insulin rate, as a multiple of basal.
+        replan_interval      - minutes between decisions, the current plan
+                               is followed in between.
+        time_budget          - wall time budget per decision (s), None for
+                               no limit. Iterations stop once the next one
+                               is not expected to fit, and a rollout
+                               running out of time is cut short: the best
+                               plan so far is used, or the first rollout's
+                               candidates are compared over the minutes
+                               simulated.
+        dt                   - integration step of the rollouts (min).
+        seed                 - seed of the candidate sampling.
+        '''
+        if block_minutes * n_blocks > horizon:
+            raise ValueError('The optimized blocks ({} min) exceed the '
+                             'horizon ({} min).'.format(
+                                 block_minutes * n_blocks, horizon))
+        if replan_interval > horizon:
+            raise ValueError('replan_interval must not exceed the horizon.')
+        self.horizon = horizon
+        self.block_minutes = block_minutes
+        self.n_blocks = n_blocks
+        self.n_candidates = n_candidates
+        self.n_elites = n_elites
+        self.n_iterations = n_iterations
+        self.max_basal_multiplier = max_basal_multiplier
+        self.replan_interval = replan_interval
+        self.time_budget = time_budget
+        self.dt = dt
+        self.seed = seed
+        self._models = {}
+        self.reset()
+
+    def policy(self, observation, reward, done, **kwargs):
+        snapshot = kwargs.get('patient_snapshot')
+        if snapshot is None:
+            raise ValueError('MPCController needs the patient_snapshot '
+                             'entry of the environment info, see '
+                             'T1DSimEnv(snapshots=True).')
+        pname = kwargs.get('patient_name')
+        model = self._model(pname)
+
+        plan = self._plans.get(pname)
+        # replan early when the patient starts eating
+        eating = kwargs.get('meal', 0) > 0
+        if plan is None or snapshot.t - plan.t >= self.replan_interval or (
+                eating and not plan.eating):
+            rates, mu = self._optimize(model, snapshot,
+                                       plan.mu if plan is not None else None)
+            plan = Plan(t=snapshot.t, rates=rates, mu=mu, eating=eating)
+            self._plans[pname] = plan
+
+        return Action(basal=plan.rates[int(snapshot.t - plan.t)], bolus=0)
+
+    def _model(self, name):
+        if name not in self._models:
+            self._models[name] = BatchT1DModel.withName(name, dt=self.dt)
+        return self._models[name]
+
+    def _optimize(self, model, snapshot, mu=None):
+        """
+        Cross-entropy search over plans. Returns the per-minute insulin
+        rates of the best plan found and the log multipliers to warm start
+        the next decision with.
+        """
+        start = time.perf_counter()
+        basal = model.p['u2ss'] * model.p['BW'] / 6000  # U/min
+        z_max = np.log(self.max_basal_multiplier)
+        mu = np.zeros(self.n_blocks) if mu is None else mu
+        sigma = np.ones(self.n_blocks)
+
+        best_cost, best_rates = np.inf, None
+        deadline = None if self.time_budget is None else \
+            start + self.time_budget
+        for iteration in range(self.n_iterations):
+            iteration_start = time.perf_counter()
+            z = np.minimum(
+                mu + sigma * self.random_gen.standard_normal(
+                    (self.n_candidates, self.n_blocks)), z_max)
+            multipliers = np.exp(z)
+            # always evaluate the distribution mean, basal and suspension
+            multipliers[0] = np.exp(mu)
+            multipliers[1] = 1
+            multipliers[2] = 0
+
+            rates = self._rates(basal * multipliers, basal)
+            glucose = model.rollout(snapshot, rates, deadline=deadline)
+            self.n_rollouts += len(rates)
+            truncated = glucose.shape[1] < self.horizon
+            if truncated and best_rates is not None:
+                # not comparable with the full horizon costs
+                break
+
+            cost = glucose_risk(glucose).mean(axis=1)
+            order = np.argsort(cost)
+            if cost[order[0]] < best_cost:
+                best_cost, best_rates = cost[order[0]], rates[order[0]]
+            if truncated:
+                logger.debug('MPC rollout stopped by the time budget after '
+                             '{} min'.format(glucose.shape[1]))
+                break
+            elites = np.log(
+                np.maximum(multipliers[order[:self.n_elites]], 1e-3))
+            mu, sigma = elites.mean(axis=0), elites.std(axis=0) + 0.05
+
+            if deadline is not None and 2 * time.perf_counter(
+            ) - iteration_start > deadline:
+                # the next iteration is not expected to fit
+                break
+
+        self.last_decision_time = time.perf_counter() - start
+        logger.debug('MPC cost {} after {} iterations'.format(
+            best_cost, iteration + 1))
+        # shift the warm start by the part of the plan that will be spent
+        shift = min(int(self.replan_interval // self.block_minutes),
+                    self.n_blocks)
+        mu = np.concatenate([mu[shift:], np.zeros(shift)])
+        return best_rates, mu
+
+    def _rates(self, block_rates, basal):
+        """
+        Per-minute insulin rates over the horizon of block rates of shape
+        (N, n_blocks).
+        """
+        rates = np.full((len(block_rates), self.horizon), basal)
+        planned = self.block_minutes * self.n_blocks
+        rates[:, :planned] = np.repeat(block_rates, self.block_minutes, axis=1)
+        return rates
+
+    def reset(self):
+        self.random_gen = np.random.RandomState(self.seed)
+        self._plans = {}
+        self.n_rollouts = 0
+        self.last_decision_time = None
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ObservationBuffer(object):
+    """
+    Fixed-capacity, time-indexed ring buffer of observation rows. Appending
+    is O(1) and only the last `capacity` rows are kept. Rows are only turned
+    into a pandas DataFrame on demand with to_frame().
+    """
+    def __init__(self, capacity, columns, index_name='date'):
+        self.capacity = int(capacity)
+        self.columns = list(columns)
+        self.index_name = index_name
+        self._times = np.empty(self.capacity, dtype='datetime64[ns]')
+        self._values = np.full((self.capacity, len(self.columns)), np.nan)
+        self.clear()
+
+    def __len__(self):
+        return self._size
+
+    def append(self, time, values):
+        """
+        Add a row at time. Appending at the time of the last row overwrites
+        that row. Times must not go backwards.
+        """
+        t = pd.Timestamp(time).to_datetime64().astype('datetime64[ns]')
+        if self._size and t == self.last_time:
+            pos = (self._start + self._size - 1) % self.capacity
+        elif self._size and t < self.last_time:
+            raise ValueError('Observation at {} is older than the last one '
+                             'at {}.'.format(time, self.last_time))
+        elif self._size < self.capacity:
+            pos = (self._start + self._size) % self.capacity
+            self._size += 1
+        else:
+            pos = self._start
+            self._start = (self._start + 1) % self.capacity
+        self._times[pos] = t
+        self._values[pos] = values
+
+    @property
+    def last_time(self):
+        if not self._size:
+            return None
+        return self._times[(self._start + self._size - 1) % self.capacity]
+
+    def to_frame(self):
+        """
+        The buffered rows, oldest first, as a DataFrame indexed by time.
+        """
+        idx = (self._start + np.arange(self._size)) % self.capacity
+        return pd.DataFrame(self._values[idx],
+                            index=pd.DatetimeIndex(self._times[idx],
+                                                   name=self.index_name),
+                            columns=self.columns)
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
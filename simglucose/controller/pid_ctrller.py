@@ -1,5 +1,6 @@
 from simglucose.controller.basal_bolus_ctrller import BBController
 from .base import Action
+import numpy as np
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,6 +16,9 @@ class PIDController(BBController):
         self.integrated_state = 0
         self.prev_state = 0
         self.is_fully_automated = is_fully_automated
+        self._batch_integrated_state = None
+        self._batch_prev_state = None
+        self._batch_names = None
 
     def policy(self, observation, reward, done, **kwargs):
         sample_time = kwargs.get('sample_time')
@@ -42,6 +46,54 @@ class PIDController(BBController):
             action = Action(basal=bb_action.basal, bolus=bb_action.bolus)
             return action
 
+    def policy_batch(self, observations, infos, rewards=None, dones=None):
+        """
+        Vectorized policy. The integrator and derivative states of every
+        patient in the batch are kept in arrays, in the order of the
+        patient_name of the infos. Patients new to the batch start from a
+        zero state, the states of the ones that left it are dropped.
+        """
+        bg = np.array([obs.CGM for obs in observations], dtype=float)
+        sample_time = np.array([info.get('sample_time') for info in infos],
+                               dtype=float)
+        names = tuple(info.get('patient_name') for info in infos)
+        if names != self._batch_names:
+            self._align_batch_state(names)
+
+        control_input = self.P * (bg - self.target) + \
+            self.I * self._batch_integrated_state + \
+            self.D * (bg - self._batch_prev_state) / sample_time
+
+        # update the states
+        self._batch_prev_state = bg
+        self._batch_integrated_state = self._batch_integrated_state + \
+            (bg - self.target) * sample_time
+
+        if self.is_fully_automated:
+            return Action(basal=control_input, bolus=np.zeros(len(bg)))
+        return super(PIDController, self).policy_batch(observations, infos,
+                                                       rewards, dones)
+
+    def _align_batch_state(self, names):
+        if len(set(names)) < len(names):
+            raise ValueError('Every patient can only appear once in a batch, '
+                             'got {}.'.format(names))
+        integrated_state = np.zeros(len(names))
+        prev_state = np.zeros(len(names))
+        if self._batch_names is not None:
+            previous = {name: k for k, name in enumerate(self._batch_names)}
+            for i, name in enumerate(names):
+                if name in previous:
+                    integrated_state[i] = \
+                        self._batch_integrated_state[previous[name]]
+                    prev_state[i] = self._batch_prev_state[previous[name]]
+        self._batch_integrated_state = integrated_state
+        self._batch_prev_state = prev_state
+        self._batch_names = names
+
     def reset(self):
         self.integrated_state = 0
         self.prev_state = 0
+        self._batch_integrated_state = None
+        self._batch_prev_state = None
+        self._batch_names = None
@@ -0,0 +1,301 @@
+from simglucose.controller.pid_ctrller import PIDController
+from simglucose.simulation.env import T1DSimEnv
+from simglucose.patient.t1dpatient import T1DPatient
+from simglucose.sensor.cgm import CGMSensor
+from simglucose.actuator.pump import InsulinPump
+from simglucose.simulation.fingerprint import fingerprint
+from collections import namedtuple
+import itertools
+import numpy as np
+import pandas as pd
+import copy
+import json
+import logging
+import os
+
+pathos = True
+try:
+    from pathos.multiprocessing import ProcessPool as Pool
+except ImportError:
+    pathos = False
+
+logger = logging.getLogger(__name__)
+
+MAX_RISK = 100.0
+# Default search bounds of (P, I, D). A lower bound of 0 makes the gain
+# searched on a linear scale, otherwise it is searched on a log scale.
+GAIN_BOUNDS = ((1e-7, 1e-2), (1e-10, 1e-5), (0, 1e-2))
+
+# gains  - (P, I, D)
+# cost   - mean risk index over all the runs, steps after a run was stopped
+#          count as MAX_RISK
+# n_runs - number of runs simulated before the candidate was pruned
+# pruned - whether the candidate was pruned before finishing all the runs,
+#          in which case cost is a lower bound
+GainResult = namedtuple('gain_result', ['gains', 'cost', 'n_runs', 'pruned'])
+
+
+class PIDGainSearch(object):
+    """
+    Tunes the (P, I, D) gains of PIDController against a cohort of patients
+    and a set of scenarios. Candidates are evaluated in parallel with pathos,
+    each candidate running all the (patient, scenario) pairs. A run stops as
+    soon as the glucose leaves bg_bounds, and a candidate stops once its cost
+    can no longer beat the best one found so far. Results are cached per
+    candidate, optionally in a JSON file so that searches can be resumed.
+    The file keeps the results of every search configuration apart.
+
+        search = PIDGainSearch(['adult#001', 'adult#002'], scenarios,
+                               timedelta(days=1))
+        search.random(50, seed=1)
+        search.cma(n_generations=5, seed=1)
+        search.best
+    """
+    def __init__(self,
+                 patient_names,
+                 scenarios,
+                 sim_time,
+                 sensor_name='Dexcom',
+                 pump_name='Insulet',
+                 sensor_seed=1,
+                 target=140,
+                 is_fully_automated=True,
+                 bg_bounds=(40, 400),
+                 parallel=True,
+                 cache_path=None):
+        '''
+        patient_names - names of the virtual patients.
+        scenarios     - scenarios, every patient runs every scenario from a
+                        copy.
+        sim_time      - a datetime.timedelta object, duration of a run.
+        bg_bounds     - (low, high) glucose (mg/dL), a run is stopped as a
+                        failure when the glucose leaves them.
+        cache_path    - optional JSON file the results are cached in, under
+                        the fingerprint of the search configuration.
+        '''
+        self.patient_names = list(patient_names)
+        self.scenarios = list(scenarios)
+        self.sim_time = sim_time
+        self.sensor_name = sensor_name
+        self.pump_name = pump_name
+        self.sensor_seed = sensor_seed
+        self.target = target
+        self.is_fully_automated = is_fully_automated
+        self.bg_bounds = bg_bounds
+        self.parallel = parallel
+        self.cache_path = cache_path
+        self._cache = {}
+        for key, value in self._load_cache_file().get(self.config_key,
+                                                      {}).items():
+            self._cache[key] = GainResult(tuple(value[0]), *value[1:])
+
+    @property
+    def config_key(self):
+        """
+        Fingerprint of everything but the gains that the costs depend on.
+        """
+        return fingerprint([
+            self.patient_names, self.scenarios, self.sim_time,
+            self.sensor_name, self.pump_name, self.sensor_seed, self.target,
+            self.is_fully_automated, self.bg_bounds, MAX_RISK
+        ])
+
+    @property
+    def runs(self):
+        return list(itertools.product(self.patient_names, self.scenarios))
+
+    @property
+    def best(self):
+        """
+        The best fully evaluated candidate so far, or None.
+        """
+        finished = [r for r in self._cache.values() if not r.pruned]
+        if not finished:
+            return None
+        return min(finished, key=lambda r: r.cost)
+
+    def evaluate(self, candidates):
+        """
+        Evaluate (P, I, D) candidates, in parallel if enabled. Candidates
+        that are already cached are not simulated again.
+        ----
+        Output:
+        a list of GainResult, one per candidate.
+        """
+        candidates = [tuple(float(g) for g in c) for c in candidates]
+        todo = list({_key(c): c for c in candidates
+                     if _key(c) not in self._cache}.values())
+        best = self.best
+        cutoff = best.cost if best is not None else np.inf
+        logger.info('Evaluating {} candidates ({} cached), cutoff {}'.format(
+            len(todo), len(candidates) - len(todo), cutoff))
+
+        if todo:
+            args = [(c, cutoff) for c in todo]
+            if self.parallel and pathos:
+                with Pool() as p:
+                    results = p.map(self._evaluate_one, args)
+            else:
+                results = [self._evaluate_one(a) for a in args]
+            for result in results:
+                self._cache[_key(result.gains)] = result
+            self._save()
+        return [self._cache[_key(c)] for c in candidates]
+
+    def grid(self, P_values, I_values, D_values):
+        """
+        Evaluate every combination of the given gains.
+        """
+        return self.evaluate(itertools.product(P_values, I_values, D_values))
+
+    def random(self, n_candidates, bounds=GAIN_BOUNDS, seed=None):
+        """
+        Evaluate n_candidates gains drawn uniformly within bounds, on a log
+        scale unless a lower bound is 0.
+        """
+        random_gen = np.random.RandomState(seed)
+        u = random_gen.uniform(size=(n_candidates, 3))
+        return self.evaluate(_to_gains(u, bounds))
+
+    def cma(self,
+            n_generations=10,
+            population_size=16,
+            bounds=GAIN_BOUNDS,
+            seed=None,
+            mean=None,
+            sigma=0.3):
+        """
+        CMA-ES style search: a Gaussian over the gains (normalized within
+        bounds, see random) is sampled, and its mean and covariance are
+        refit to the best half of every generation.
+        ----
+        Inputs:
+        mean  - optional initial gains, the best candidate so far or the
+                center of the bounds by default.
+        sigma - initial step size, in units of the normalized bounds.
+        """
+        random_gen = np.random.RandomState(seed)
+        if mean is None:
+            mean = self.best.gains if self.best is not None else None
+        m = np.full(3, 0.5) if mean is None else _from_gains(mean, bounds)
+        cov = np.eye(3) * sigma**2
+        n_elites = max(population_size // 2, 1)
+        weights = np.log(n_elites + 0.5) - np.log(np.arange(1, n_elites + 1))
+        weights /= weights.sum()
+
+        results = []
+        for generation in range(n_generations):
+            u = np.clip(
+                random_gen.multivariate_normal(m, cov, size=population_size),
+                0, 1)
+            generation_results = self.evaluate(_to_gains(u, bounds))
+            results += generation_results
+
+            # pruned candidates have a lower bound cost, they rank last
+            order = np.argsort([np.inf if r.pruned else r.cost
+                                for r in generation_results])
+            elites = u[order[:n_elites]]
+            diff = elites - m
+            m = weights @ elites
+            cov = 0.5 * cov + 0.5 * (weights[:, None] * diff).T @ diff
+            cov += np.eye(3) * 1e-6
+            logger.info('Generation {}: best cost {}'.format(
+                generation, generation_results[order[0]].cost))
+        return results
+
+    def to_frame(self):
+        """
+        All the evaluated candidates, best first.
+        """
+        df = pd.DataFrame([
+            dict(P=r.gains[0], I=r.gains[1], D=r.gains[2], cost=r.cost,
+                 n_runs=r.n_runs, pruned=r.pruned)
+            for r in self._cache.values()
+        ], columns=['P', 'I', 'D', 'cost', 'n_runs', 'pruned'])
+        return df.sort_values(['pruned', 'cost']).reset_index(drop=True)
+
+    def _evaluate_one(self, args):
+        gains, cutoff = args
+        runs = self.runs
+        total = 0.0
+        for k, (name, scenario) in enumerate(runs):
+            total += self._run(gains, name, scenario)
+            # costs are non-negative, so total / len(runs) is a lower bound
+            if k + 1 < len(runs) and total / len(runs) > cutoff:
+                return GainResult(gains, total / len(runs), k + 1, True)
+        return GainResult(gains, total / len(runs), len(runs), False)
+
+    def _run(self, gains, name, scenario):
+        """
+        Mean risk of one closed loop run.
+        """
+        P, I, D = gains
+        controller = PIDController(P=P, I=I, D=D, target=self.target,
+                                   is_fully_automated=self.is_fully_automated)
+        env = T1DSimEnv(T1DPatient.withName(name),
+                        CGMSensor.withName(self.sensor_name,
+                                           seed=self.sensor_seed),
+                        InsulinPump.withName(self.pump_name),
+                        copy.deepcopy(scenario))
+        n_steps = int(self.sim_time.total_seconds() / 60 / env.sample_time)
+
+        obs, reward, done, info = env.reset()
+        total_risk = 0.0
+        for k in range(n_steps):
+            action = controller.policy(obs, reward, done, **info)
+            obs, reward, done, info = env.step(action)
+            total_risk += info['risk']
+            if not self.bg_bounds[0] <= info['bg'] <= self.bg_bounds[1]:
+                logger.debug('{} with gains {} stopped at step {}'.format(
+                    name, gains, k))
+                total_risk += MAX_RISK * (n_steps - k - 1)
+                break
+        return total_risk / n_steps
+
+    def _load_cache_file(self):
+        if self.cache_path is None or not os.path.exists(self.cache_path):
+            return {}
+        with open(self.cache_path) as f:
+            return json.load(f)
+
+    def _save(self):
+        if self.cache_path is None:
+            return
+        # keep the results of the other configurations
+        configs = self._load_cache_file()
+        configs[self.config_key] = {k: list(r) for k, r in self._cache.items()}
+        with open(self.cache_path, 'w') as f:
+            json.dump(configs, f)
+
+    def __getstate__(self):
+        # workers do not need the results of the other candidates
+        state = self.__dict__.copy()
+        state['_cache'] = {}
+        return state
+
+
+def _key(gains):
+    return ','.join('{:.6g}'.format(g) for g in gains)
+
+
+def _to_gains(u, bounds):
+    """
+    Map points of the unit cube to gains within bounds.
+    """
+    gains = np.empty_like(u, dtype=float)
+    for j, (lo, hi) in enumerate(bounds):
+        if lo > 0:
+            gains[:, j] = lo * (hi / lo)**u[:, j]
+        else:
+            gains[:, j] = lo + (hi - lo) * u[:, j]
+    return gains
+
+
+def _from_gains(gains, bounds):
+    u = np.empty(len(bounds))
+    for j, (lo, hi) in enumerate(bounds):
+        if lo > 0:
+            u[j] = np.log(max(gains[j], lo) / lo) / np.log(hi / lo)
+        else:
+            u[j] = (gains[j] - lo) / (hi - lo)
+    return np.clip(u, 0, 1)
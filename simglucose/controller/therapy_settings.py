@@ -0,0 +1,67 @@
+from collections import namedtuple
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+# basal     - basal rate (U/min)
+# basal_hr  - basal rate (U/hr)
+# isf       - insulin sensitivity factor, a.k.a. correction factor (mg/dL/U)
+# cr        - carbohydrate ratio (g/U)
+TherapySettings = namedtuple('therapy_settings',
+                             ['basal', 'basal_hr', 'isf', 'cr'])
+
+
+class TherapySettingsCache(object):
+    """
+    Resolves the therapy settings of a patient from the Quest and patient
+    parameter tables once, and serves them as plain floats afterwards.
+    """
+    def __init__(self, quest, patient_params):
+        self.quest = quest
+        self.patient_params = patient_params
+        self._settings = {}
+
+    def get(self, name, from_tdd=None):
+        '''
+        name     - patient name.
+        from_tdd - None to use the patient's basal (u2ss), CR and CF, or a
+                   function mapping the total daily dose to (basal in U/hr,
+                   ISF, CR), e.g. Controller.get_therapy_settings_from_tdd.
+        '''
+        key = (name, from_tdd is not None)
+        if key not in self._settings:
+            self._settings[key] = self._resolve(name, from_tdd)
+        return self._settings[key]
+
+    def _resolve(self, name, from_tdd):
+        if any(self.quest.Name.str.match(name)):
+            quest = self.quest[self.quest.Name.str.match(name)]
+            params = self.patient_params[self.patient_params.Name.str.match(
+                name)]
+            u2ss = params.u2ss.values.item()  # unit: pmol/(L*kg)
+            BW = params.BW.values.item()  # unit: kg
+            TDD = quest.TDI.values[0]
+        else:
+            quest = pd.DataFrame([['Average', 1 / 15, 1 / 50, 50, 30]],
+                                 columns=['Name', 'CR', 'CF', 'TDI', 'Age'])
+            u2ss = 1.43  # unit: pmol/(L*kg)
+            BW = 57.0  # unit: kg
+            TDD = 50
+
+        if from_tdd is not None:
+            basal_hr, isf, cr = from_tdd(TDD)
+            basal = basal_hr / 60  # unit: U/min
+        else:
+            basal = u2ss * BW / 6000  # unit: U/min
+            basal_hr = basal * 60  # unit: U/hr
+            cr = quest.CR.values[0]
+            isf = quest.CF.values[0]
+
+        logger.debug('Therapy settings of {}: basal={} U/min, isf={}, '
+                     'cr={}'.format(name, basal, isf, cr))
+        return TherapySettings(basal=float(basal), basal_hr=float(basal_hr),
+                               isf=float(isf), cr=float(cr))
+
+    def clear(self):
+        self._settings = {}
@@ -4,6 +4,8 @@ from simglucose.sensor.cgm import CGMSensor
 from simglucose.actuator.pump import InsulinPump
 from simglucose.simulation.scenario_gen import RandomScenario
 from simglucose.controller.base import Action
+from simglucose.simulation.features import FeatureEngine
+from simglucose.simulation.seeding import run_seeds
 import numpy as np
 import pkg_resources
 import gym
@@ -29,11 +31,16 @@ class T1DSimEnv(gym.Env):
     INSULIN_PUMP_HARDWARE = "Insulet"
 
     def __init__(
-        self, patient_name=None, custom_scenario=None, reward_fun=None, seed=None
+        self, patient_name=None, custom_scenario=None, reward_fun=None, seed=None,
+        history_length=1,
     ):
         """
         patient_name must be 'adolescent#001' to 'adolescent#010',
         or 'adult#001' to 'adult#010', or 'child#001' to 'child#010'
+        history_length is the number of CGM samples stacked in an
+        observation, oldest first. With more than one sample, a
+        simglucose.simulation.features.FeatureEngine keeps the window and
+        is also available as info["features"].
         """
         # have to hard code the patient_name, gym has some interesting
         # error when choosing the patient
@@ -41,6 +48,7 @@ class T1DSimEnv(gym.Env):
             patient_name = ["adolescent#001"]
 
         self.patient_name = patient_name
+        self.history_length = history_length
         self.reward_fun = reward_fun
         self.np_random, _ = seeding.np_random(seed=seed)
         self.custom_scenario = custom_scenario
@@ -56,12 +64,18 @@ class T1DSimEnv(gym.Env):
             obs, reward, done, info = self.env.step(act, reward_fun=self.reward_fun)
 
         # Convert observation to numpy array
-        obs_array = np.array([obs.CGM])
+        obs_array = self._observation(obs)
         obs_array = obs_array.reshape(1, -1)  # shape (1, 1) -> adds batch dimension
 
         truncated = False
         return obs_array, reward, done, truncated, info
 
+    def _observation(self, obs):
+        if self.env.features is None:
+            return np.array([obs.CGM])
+        # copy, the window view changes with the next step
+        return np.array(self.env.features.cgm_window)
+
     def _raw_reset(self):
         return self.env.reset()
 
@@ -69,23 +83,16 @@ class T1DSimEnv(gym.Env):
         self.np_random = np.random.default_rng(seed)
         self.env, seed2, seed3, seed4 = self._create_env()
         step = self.env.reset()
-        obs_array = np.array(step.observation.CGM)
+        obs_array = self._observation(step.observation)
         obs_array = obs_array.reshape(1, -1)  # shape (1, 1) -> adds batch dimension
         return obs_array, {"seeds": [seed, seed2, seed3, seed4]}
 
     def _create_env(self):
-        # Derive a random seed. This gets passed as a uint, but gets
-        # checked as an int elsewhere, so we need to keep it below
-        # 2**31.
-        base_seed = int(self.np_random.integers(0, 1000))
-
-        # Step 2: deterministically derive seeds from one another
-        def derive_seed(x):
-            return abs(hash(int(x))) % (2 ** 31)
-
-        seed2 = derive_seed(base_seed)
-        seed3 = derive_seed(seed2 + 1)
-        seed4 = derive_seed(seed3 + 1)
+        # Independent seeds of the sensor, scenario and patient, spawned
+        # from a root seed drawn from np_random. They are below 2**32 as
+        # RandomState requires.
+        seeds = run_seeds(int(self.np_random.integers(0, 2**63)), 0)
+        seed2, seed3, seed4 = seeds.sensor, seeds.scenario, seeds.patient
 
         hour = self.np_random.integers(low=0, high=24)
         start_time = datetime(2018, 1, 1, hour, 0, 0)
@@ -109,7 +116,13 @@ class T1DSimEnv(gym.Env):
 
         sensor = CGMSensor.withName(self.SENSOR_HARDWARE, seed=seed2)
         pump = InsulinPump.withName(self.INSULIN_PUMP_HARDWARE)
-        env = _T1DSimEnv(patient, sensor, pump, scenario)
+        features = None
+        if self.history_length > 1:
+            features = FeatureEngine(
+                window_size=self.history_length,
+                trend_size=min(5, self.history_length - 1),
+            )
+        env = _T1DSimEnv(patient, sensor, pump, scenario, features=features)
         return env, seed2, seed3, seed4
 
     def render(self):
@@ -127,7 +140,7 @@ class T1DSimEnv(gym.Env):
 
     @property
     def observation_space(self):
-        return spaces.Box(low=0, high=1000, shape=(1,))
+        return spaces.Box(low=0, high=1000, shape=(self.history_length,))
 
     @property
     def max_basal(self):
@@ -145,6 +158,7 @@ class T1DSimGymnaisumEnv(gymnasium.Env):
         reward_fun=None,
         seed=None,
         render_mode='human',
+        history_length=1,
     ) -> None:
         super().__init__()
         self.render_mode = render_mode
@@ -153,9 +167,10 @@ class T1DSimGymnaisumEnv(gymnasium.Env):
             custom_scenario=custom_scenario,
             reward_fun=reward_fun,
             seed=seed,
+            history_length=history_length,
         )
         self.observation_space = gymnasium.spaces.Box(
-            low=0, high=self.MAX_BG, shape=(1,), dtype=np.float32
+            low=0, high=self.MAX_BG, shape=(history_length,), dtype=np.float32
         )
         self.action_space = gymnasium.spaces.Box(
             low=0, high=self.env.max_basal, shape=(1,), dtype=np.float32
@@ -167,7 +182,7 @@ class T1DSimGymnaisumEnv(gymnasium.Env):
     def reset(self, seed=None, options=None):
         super().reset(seed=seed)
         obs, _, _, info = self.env._raw_reset()
-        return np.array([obs.CGM], dtype=np.float32), info
+        return self.env._observation(obs).astype(np.float32), info
 
     def render(self):
         if self.render_mode == "human":
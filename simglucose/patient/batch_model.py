@@ -0,0 +1,161 @@
+from .t1dpatient import T1DPatient, PATIENT_PARA_FILE
+import numpy as np
+import pandas as pd
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+MODEL_PARAMS = [
+    'BW', 'kabs', 'kmax', 'kmin', 'b', 'd', 'f', 'kp1', 'kp2', 'kp3', 'Fsnc',
+    'ke1', 'ke2', 'k1', 'k2', 'Vm0', 'Vmx', 'Km0', 'm1', 'm2', 'm4', 'm30',
+    'ka1', 'ka2', 'kd', 'Vi', 'p2u', 'Ib', 'ki', 'ksc', 'Vg', 'u2ss'
+]
+
+
+class BatchT1DModel(object):
+    """
+    The T1DPatient model of a single patient, evaluated for many copies of
+    its state at once. A rollout integrates N insulin sequences from the same
+    snapshot with a fixed step Runge-Kutta scheme, which is what makes
+    evaluating hundreds of candidate doses per control decision affordable.
+
+    States are kept as arrays of shape (13, N).
+    """
+    def __init__(self, params, dt=1):
+        '''
+        params - the patient parameters, a pandas sequence as used by
+                 T1DPatient.
+        dt     - integration step (min). T1DPatient.SAMPLE_TIME must be a
+                 multiple of it.
+        '''
+        self.name = params.Name
+        self.p = {k: float(params[k]) for k in MODEL_PARAMS}
+        self.dt = dt
+        self.n_substeps = int(round(T1DPatient.SAMPLE_TIME / dt))
+        if self.n_substeps < 1 or not np.isclose(
+                self.n_substeps * dt, T1DPatient.SAMPLE_TIME):
+            raise ValueError('The sample time {} min is not a multiple of '
+                             'dt={}.'.format(T1DPatient.SAMPLE_TIME, dt))
+
+    @classmethod
+    def withName(cls, name, **kwargs):
+        patient_params = pd.read_csv(PATIENT_PARA_FILE)
+        params = patient_params.loc[patient_params.Name == name].squeeze()
+        return cls(params, **kwargs)
+
+    def derivative(self, x, CHO, insulin, last_Qsto, last_foodtaken):
+        """
+        Vectorized T1DPatient.model.
+        ----
+        Inputs:
+        x              - states, shape (13, N).
+        CHO            - carbs eaten (g/min), a scalar.
+        insulin        - insulin (U/min), shape (N, ).
+        last_Qsto      - stomach content when the meal started (mg), (N, ).
+        last_foodtaken - carbs eaten since the meal started (g), a scalar.
+        """
+        p = self.p
+        dxdt = np.empty_like(x)
+        d = CHO * 1000  # g -> mg
+        insulin = insulin * 6000 / p['BW']  # U/min -> pmol/kg/min
+
+        qsto = x[0] + x[1]
+        Dbar = last_Qsto + last_foodtaken * 1000  # unit: mg
+        has_meal = Dbar > 0
+        Dbar = np.where(has_meal, Dbar, 1.0)
+        aa = 5 / (2 * Dbar * (1 - p['b']))
+        cc = 5 / (2 * Dbar * p['d'])
+        kgut = np.where(
+            has_meal, p['kmin'] + (p['kmax'] - p['kmin']) / 2 *
+            (np.tanh(aa * (qsto - p['b'] * Dbar)) -
+             np.tanh(cc * (qsto - p['d'] * Dbar)) + 2), p['kmax'])
+
+        dxdt[0] = -p['kmax'] * x[0] + d
+        dxdt[1] = p['kmax'] * x[0] - x[1] * kgut
+        dxdt[2] = kgut * x[1] - p['kabs'] * x[2]
+
+        Rat = p['f'] * p['kabs'] * x[2] / p['BW']
+        EGPt = p['kp1'] - p['kp2'] * x[3] - p['kp3'] * x[8]
+        Et = np.where(x[3] > p['ke2'], p['ke1'] * (x[3] - p['ke2']), 0)
+        dxdt[3] = (np.maximum(EGPt, 0) + Rat - p['Fsnc'] - Et -
+                   p['k1'] * x[3] + p['k2'] * x[4]) * (x[3] >= 0)
+
+        Uidt = (p['Vm0'] + p['Vmx'] * x[6]) * x[4] / (p['Km0'] + x[4])
+        dxdt[4] = (-Uidt + p['k1'] * x[3] - p['k2'] * x[4]) * (x[4] >= 0)
+
+        dxdt[5] = (-(p['m2'] + p['m4']) * x[5] + p['m1'] * x[9] +
+                   p['ka1'] * x[10] + p['ka2'] * x[11]) * (x[5] >= 0)
+        It = x[5] / p['Vi']
+        dxdt[6] = -p['p2u'] * x[6] + p['p2u'] * (It - p['Ib'])
+        dxdt[7] = -p['ki'] * (x[7] - It)
+        dxdt[8] = -p['ki'] * (x[8] - x[7])
+        dxdt[9] = (-(p['m1'] + p['m30']) * x[9] + p['m2'] * x[5]) * (x[9] >=
+                                                                     0)
+        dxdt[10] = (insulin - (p['ka1'] + p['kd']) * x[10]) * (x[10] >= 0)
+        dxdt[11] = (p['kd'] * x[10] - p['ka2'] * x[11]) * (x[11] >= 0)
+        dxdt[12] = (-p['ksc'] * x[12] + p['ksc'] * x[3]) * (x[12] >= 0)
+        return dxdt
+
+    def rollout(self, snapshot, insulin, meals=None, deadline=None):
+        """
+        Simulate N insulin sequences from the same patient snapshot.
+        ----
+        Inputs:
+        snapshot - a simglucose.patient.t1dpatient.PatientSnapshot.
+        insulin  - insulin rates (U/min), shape (N, T), one entry per minute.
+        meals    - optional announced meals (g), shape (T, ), like the CHO
+                   passed to T1DPatient.step. The meal the patient is eating
+                   at the snapshot is finished in any case.
+        deadline - optional time.perf_counter() value. The rollout stops at
+                   the first minute simulated past it.
+        ----
+        Output:
+        Subcutaneous glucose (mg/dL) after every minute, shape (N, T), or
+        (N, T') with 1 <= T' < T when stopped by the deadline.
+        """
+        insulin = np.atleast_2d(np.asarray(insulin, dtype=float))
+        n, horizon = insulin.shape
+        meals = np.zeros(horizon) if meals is None else meals
+
+        x = np.repeat(np.asarray(snapshot.state, dtype=float)[:, None], n, 1)
+        planned_meal = snapshot.planned_meal
+        is_eating = snapshot.is_eating
+        last_Qsto = np.full(n, float(snapshot.last_Qsto))
+        last_foodtaken = snapshot.last_foodtaken
+        last_CHO = snapshot.last_CHO
+
+        glucose = np.empty((n, horizon))
+        for k in range(horizon):
+            # Same eating bookkeeping as T1DPatient.step
+            planned_meal += meals[k]
+            CHO = min(T1DPatient.EAT_RATE, planned_meal)
+            planned_meal = max(0, planned_meal - CHO)
+            if CHO > 0 and last_CHO <= 0:
+                last_Qsto = x[0] + x[1]
+                last_foodtaken = 0
+                is_eating = True
+            if is_eating:
+                last_foodtaken += CHO
+            if CHO <= 0 and last_CHO > 0:
+                is_eating = False
+            last_CHO = CHO
+
+            x = self._rk4(x, CHO, insulin[:, k], last_Qsto, last_foodtaken)
+            glucose[:, k] = x[12] / self.p['Vg']
+            if deadline is not None and time.perf_counter() > deadline:
+                return glucose[:, :k + 1]
+        return glucose
+
+    def _rk4(self, x, CHO, insulin, last_Qsto, last_foodtaken):
+        h = self.dt
+        for _ in range(self.n_substeps):
+            k1 = self.derivative(x, CHO, insulin, last_Qsto, last_foodtaken)
+            k2 = self.derivative(x + h / 2 * k1, CHO, insulin, last_Qsto,
+                                 last_foodtaken)
+            k3 = self.derivative(x + h / 2 * k2, CHO, insulin, last_Qsto,
+                                 last_foodtaken)
+            k4 = self.derivative(x + h * k3, CHO, insulin, last_Qsto,
+                                 last_foodtaken)
+            x = x + h / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+        return x
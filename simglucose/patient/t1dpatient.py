@@ -10,6 +10,12 @@ logger = logging.getLogger(__name__)
 
 Action = namedtuple("patient_action", ["CHO", "insulin"])
 Observation = namedtuple("observation", ["Gsub"])
+# Everything T1DPatient.step depends on, see T1DPatient.snapshot
+PatientSnapshot = namedtuple(
+    "patient_snapshot",
+    ["t", "state", "planned_meal", "is_eating", "last_Qsto", "last_foodtaken",
+     "last_CHO"],
+)
 
 PATIENT_PARA_FILE = pkg_resources.resource_filename(
     "simglucose", "params/vpatient_params.csv"
@@ -20,7 +26,8 @@ class T1DPatient(Patient):
     SAMPLE_TIME = 1  # min
     EAT_RATE = 5  # g/min CHO
 
-    def __init__(self, params, init_state=None, random_init_bg=False, seed=None, t0=0):
+    def __init__(self, params, init_state=None, random_init_bg=False, seed=None, t0=0,
+                 init_bg_noise=None):
         """
         T1DPatient constructor.
         Inputs:
@@ -29,10 +36,14 @@ class T1DPatient(Patient):
               If not specified, load the default initial state in
               params.iloc[2:15]
             - t0: simulation start time, it is 0 by default
+            - init_bg_noise: optional 3 standard normal draws (e.g. from an
+              InputTape) used instead of the seeded random generator to
+              perturb the initial glucose states x4, x5 and x13
         """
         self._params = params
         self._init_state = init_state
         self.random_init_bg = random_init_bg
+        self.init_bg_noise = init_bg_noise
         self._seed = seed
         self.t0 = t0
         self.reset()
@@ -109,7 +120,9 @@ class T1DPatient(Patient):
             self._odesolver.integrate(self._odesolver.t + self.sample_time)
         else:
             logger.error("ODE solver failed!!")
-            raise
+            raise RuntimeError(
+                "ODE solver failed at t = {} for {}".format(self.t, self.name)
+            )
 
     @staticmethod
     def model(t, x, action, params, last_Qsto, last_foodtaken):
@@ -219,6 +232,33 @@ class T1DPatient(Patient):
         observation = Observation(Gsub=Gsub)
         return observation
 
+    def snapshot(self):
+        """
+        A copy of the patient's dynamic state: the ODE state and the eating
+        bookkeeping. It can be restored with restore(), or rolled out with
+        simglucose.patient.batch_model.BatchT1DModel.
+        """
+        return PatientSnapshot(
+            t=self.t,
+            state=np.copy(self.state),
+            planned_meal=self.planned_meal,
+            is_eating=self.is_eating,
+            last_Qsto=self._last_Qsto,
+            last_foodtaken=self._last_foodtaken,
+            last_CHO=self._last_action.CHO,
+        )
+
+    def restore(self, snapshot):
+        """
+        Return the patient to a state taken with snapshot().
+        """
+        self._odesolver.set_initial_value(np.copy(snapshot.state), snapshot.t)
+        self.planned_meal = snapshot.planned_meal
+        self.is_eating = snapshot.is_eating
+        self._last_Qsto = snapshot.last_Qsto
+        self._last_foodtaken = snapshot.last_foodtaken
+        self._last_action = Action(CHO=snapshot.last_CHO, insulin=0)
+
     def _announce_meal(self, meal):
         """
         patient announces meal.
@@ -254,7 +294,7 @@ class T1DPatient(Patient):
             self.init_state = self._init_state
 
         self.random_state = np.random.RandomState(self.seed)
-        if self.random_init_bg:
+        if self.random_init_bg or self.init_bg_noise is not None:
             # Only randomize glucose related states, x4, x5, and x13
             mean = [
                 1.0 * self.init_state[3],
@@ -268,7 +308,10 @@ class T1DPatient(Patient):
                     0.1 * self.init_state[12],
                 ]
             )
-            bg_init = self.random_state.multivariate_normal(mean, cov)
+            if self.init_bg_noise is None:
+                bg_init = self.random_state.multivariate_normal(mean, cov)
+            else:
+                bg_init = mean + np.sqrt(np.diag(cov)) * self.init_bg_noise
             self.init_state[3] = 1.0 * bg_init[0]
             self.init_state[4] = 1.0 * bg_init[1]
             self.init_state[12] = 1.0 * bg_init[2]
@@ -10,10 +10,16 @@ SENSOR_PARA_FILE = pkg_resources.resource_filename(
 
 
 class CGMSensor(object):
-    def __init__(self, params, seed=None):
+    def __init__(self, params, seed=None, noise=None):
+        '''
+        noise - optional pre-drawn noise sequence (e.g. InputTape.cgm_noise),
+                one value per sensor sample. It replaces the random noise
+                generator when given.
+        '''
         self._params = params
         self.name = params.Name
         self.sample_time = params.sample_time
+        self.noise = noise
         self.seed = seed
         self._last_CGM = 0
 
@@ -42,11 +48,24 @@ class CGMSensor(object):
     @seed.setter
     def seed(self, seed):
         self._seed = seed
-        self._noise_generator = CGMNoise(self._params, seed=seed)
+        self._noise_generator = self._create_noise_generator()
+
+    def _create_noise_generator(self):
+        if self.noise is not None:
+            return self._replay_noise(self.noise)
+        return CGMNoise(self._params, seed=self.seed)
+
+    @staticmethod
+    def _replay_noise(noise):
+        for value in noise:
+            yield value
+        raise ValueError(
+            'The pre-drawn noise has {} samples, the run needs more: draw it '
+            'for a longer sim_time.'.format(len(noise)))
 
     def reset(self):
         logger.debug('Resetting CGM sensor ...')
-        self._noise_generator = CGMNoise(self._params, seed=self.seed)
+        self._noise_generator = self._create_noise_generator()
         self._last_CGM = 0
 
 
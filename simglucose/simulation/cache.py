@@ -0,0 +1,153 @@
+"""
+A disk cache of simulation results, addressed by the content of the run:
+the fingerprint of the SimObj (patient, sensor and pump parameters, seeds,
+scenario, controller class and state, sim_time) and the simglucose version.
+Identical runs are simulated once, and the least recently used results are
+evicted past max_bytes.
+
+    cache = ResultCache('~/.cache/simglucose')
+    results = batch_sim(sim_instances, parallel=True, cache=cache)
+"""
+from simglucose.simulation.sim_engine import sim
+from simglucose.simulation.fingerprint import fingerprint
+from simglucose.simulation.fingerprint import is_reproducible
+from simglucose.simulation.sinks import NPZSink
+from importlib import metadata
+from collections import OrderedDict
+import glob
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    VERSION = metadata.version('simglucose')
+except metadata.PackageNotFoundError:
+    VERSION = 'unknown'
+
+# puts after which the size index is rebuilt from the folder, to account for
+# the results written by other processes
+RESCAN_INTERVAL = 64
+
+
+class ResultCache(object):
+    def __init__(self, path, max_bytes=2**30):
+        '''
+        path      - folder of the cache, created if needed.
+        max_bytes - size of the cache on disk past which the least recently
+                    used results are deleted.
+        '''
+        self.path = os.path.expanduser(path)
+        self.max_bytes = max_bytes
+        self.sink = NPZSink(self.path)
+        self.hits = 0
+        self.misses = 0
+        # key -> size of the results on disk, least recently used first.
+        # Built by _scan on first use, kept up to date by this process.
+        self._index = None
+        self._puts = 0
+
+    def key(self, sim_object):
+        return fingerprint([VERSION, sim_object])
+
+    def get(self, key):
+        """
+        The cached results of key, or None.
+        """
+        filename = self.sink.filename(key)
+        try:
+            df = self.sink.read(key)
+            # the modification time orders the entries for eviction
+            os.utime(filename)
+        except (IOError, OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self._index is not None and key in self._index:
+            self._index.move_to_end(key)
+        return df
+
+    def put(self, key, df):
+        # written under a temporary name and renamed, so that concurrent
+        # workers never read a partial file
+        tmp_name = '{}.tmp{}'.format(key, os.getpid())
+        self.sink.write(tmp_name, df)
+        filename = self.sink.filename(key)
+        os.replace(self.sink.filename(tmp_name), filename)
+        self._puts += 1
+        if self._index is None or self._puts >= RESCAN_INTERVAL:
+            self._scan()
+        else:
+            self._index[key] = os.path.getsize(filename)
+            self._index.move_to_end(key)
+        self.evict()
+
+    def evict(self):
+        """
+        Delete the least recently used results until the cache fits in
+        max_bytes.
+        """
+        if self._index is None:
+            self._scan()
+        size = sum(self._index.values())
+        while size > self.max_bytes and self._index:
+            key, entry_size = self._index.popitem(last=False)
+            try:
+                os.remove(self.sink.filename(key))
+            except OSError:
+                pass
+            size -= entry_size
+
+    def _scan(self):
+        """
+        Rebuild the size index from the files in the folder, ordered by
+        modification time.
+        """
+        entries = []
+        for filename in glob.glob(self.sink.filename('*')):
+            if '.tmp' in os.path.basename(filename):
+                continue
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            key = os.path.splitext(os.path.basename(filename))[0]
+            entries.append((stat.st_mtime, key, stat.st_size))
+        self._index = OrderedDict(
+            (key, size) for _, key, size in sorted(entries))
+        self._puts = 0
+
+    def clear(self):
+        for filename in glob.glob(self.sink.filename('*')):
+            os.remove(filename)
+        self._index = None
+
+    def sim(self, sim_object):
+        """
+        sim_engine.sim, returning the cached results of an identical run if
+        there are some.
+        """
+        if hasattr(sim_object, 'build'):
+            sim_object = sim_object.build()
+        if not is_reproducible(sim_object):
+            logger.warning('Run of {} is not seeded, not cached.'.format(
+                sim_object.env.patient.name))
+            return sim(sim_object)
+
+        key = self.key(sim_object)
+        df = self.get(key)
+        if df is None:
+            df = sim(sim_object)
+            self.put(key, df)
+        elif sim_object.path is not None or sim_object.sink is not None:
+            sim_object.save_results(df)
+        return df
+
+    def __getstate__(self):
+        # hit counts and the size index are per process
+        state = self.__dict__.copy()
+        state['hits'] = state['misses'] = 0
+        state['_index'] = None
+        state['_puts'] = 0
+        return state
+
@@ -0,0 +1,393 @@
+"""
+Batch simulation over several machines. A coordinator serves chunks of runs
+over a TCP (host, port) or Unix socket address, and workers started on any
+host pull chunks, run them and push the results back. Workers send
+heartbeats while they run; the chunk of a worker that goes silent or
+disconnects is given to another worker.
+
+On the machine running the batch:
+
+    with DistributedExecutor(('0.0.0.0', 6000), authkey=b'secret') as ex:
+        results = batch_sim(specs, executor=ex)
+
+On every other machine, one worker per core, with the authkey in the
+environment rather than on the command line:
+
+    SIMGLUCOSE_AUTHKEY=secret python -m simglucose.simulation.distributed \\
+        HOST:6000 --processes 8
+
+Items and results are serialized with dill when it is installed (it comes
+with pathos), so SimObj instances can be sent. Sending RunSpec instances is
+much cheaper. Loading them runs code, so connections are authenticated:
+without an authkey, the coordinator generates one and only listens on the
+loopback interface or a Unix socket.
+"""
+from simglucose.simulation.executors import Executor, RunFailure, _run_chunk
+from multiprocessing.connection import Listener, Client
+from collections import deque
+from queue import Queue, Empty
+import multiprocessing
+import threading
+import argparse
+import ipaddress
+import secrets
+import traceback
+import os
+import time
+import logging
+
+try:
+    import dill as serializer
+except ImportError:
+    import pickle as serializer
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 0.05  # sec
+AUTHKEY_VARIABLE = 'SIMGLUCOSE_AUTHKEY'
+
+
+def _send(conn, message):
+    conn.send_bytes(serializer.dumps(message))
+
+
+def _recv(conn):
+    return serializer.loads(conn.recv_bytes())
+
+
+class DistributedExecutor(Executor):
+    """
+    Coordinator of remote workers, see run_worker. It serves until close(),
+    so the same workers run every batch and every retry. A worker runs one
+    chunk at a time: start one worker process per core.
+    """
+    def __init__(self,
+                 address=('localhost', 0),
+                 authkey=None,
+                 n_local_workers=0,
+                 heartbeat_timeout=30,
+                 chunksize=1,
+                 timeout=None,
+                 retries=0):
+        '''
+        address           - (host, port) to listen on, port 0 for any free
+                            port, or the path of a Unix socket. The actual
+                            address is self.address once started.
+        authkey           - bytes shared with the workers, needed to listen
+                            on an interface other than the loopback. A
+                            random key (self.authkey) by default.
+        n_local_workers   - number of worker processes to start on this
+                            machine, e.g. for testing.
+        heartbeat_timeout - a worker silent for that long (s) is lost, and
+                            its chunk is given to another worker. Workers
+                            send a heartbeat every third of it.
+        timeout           - optional time limit per item (s). A worker that
+                            exceeds it gets its next chunk once it is done,
+                            and its late results are dropped.
+        '''
+        super(DistributedExecutor, self).__init__(max_workers=1,
+                                                  chunksize=chunksize,
+                                                  timeout=timeout,
+                                                  retries=retries)
+        if authkey is None:
+            if not _is_local(address):
+                raise ValueError(
+                    'Listening on {} needs an authkey shared with the '
+                    'workers.'.format(address))
+            authkey = secrets.token_hex(16).encode()
+            logger.info('Workers connect with --authkey {}.'.format(
+                authkey.decode()))
+        self.address = address
+        self.authkey = authkey
+        self.n_local_workers = n_local_workers
+        self.heartbeat_timeout = heartbeat_timeout
+        self._listener = None
+        self._processes = []
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._tasks = {}
+        self._next_task_id = 0
+        self._n_workers = 0
+        self._closed = threading.Event()
+
+    @property
+    def n_workers(self):
+        """
+        Number of connected workers.
+        """
+        return self._n_workers
+
+    def start(self):
+        if self._listener is not None:
+            return self
+        self._listener = Listener(self.address, authkey=self.authkey)
+        self.address = self._listener.address
+        threading.Thread(target=self._accept, daemon=True).start()
+        logger.info('Coordinator listening on {}.'.format(self.address))
+        for _ in range(self.n_local_workers):
+            process = multiprocessing.Process(target=run_worker,
+                                              args=(self.address,
+                                                    self.authkey),
+                                              daemon=True)
+            process.start()
+            self._processes.append(process)
+        return self
+
+    def close(self):
+        if self._listener is None:
+            return
+        self._closed.set()
+        self._listener.close()
+        self._listener = None
+        for process in self._processes:
+            process.join(timeout=2 * POLL_INTERVAL + 1)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _accept(self):
+        while not self._closed.is_set():
+            try:
+                conn = self._listener.accept()
+            except Exception as e:
+                if not self._closed.is_set():
+                    logger.warning('Worker connection failed: {!r}'.format(e))
+                    continue
+                return
+            threading.Thread(target=self._serve, args=(conn, ),
+                             daemon=True).start()
+
+    def _iter_run(self, fn, items, chunks):
+        self.start()
+        results = Queue()
+        with self._lock:
+            task_ids = []
+            for k, chunk in enumerate(chunks):
+                task_id = self._next_task_id
+                self._next_task_id += 1
+                self._tasks[task_id] = (k, fn, [items[i] for i in chunk],
+                                        results)
+                self._pending.append(task_id)
+                task_ids.append(task_id)
+        remaining = set(task_ids)
+        last_warning = time.monotonic()
+        try:
+            while remaining:
+                try:
+                    task_id, chunk_results = results.get(timeout=1)
+                except Empty:
+                    if self._n_workers == 0 and \
+                            time.monotonic() - last_warning > 30:
+                        logger.warning('No worker connected to {}.'.format(
+                            self.address))
+                        last_warning = time.monotonic()
+                    continue
+                if task_id not in remaining:
+                    # also run by a worker it was reassigned from
+                    continue
+                remaining.discard(task_id)
+                yield self._tasks[task_id][0], chunk_results
+        finally:
+            with self._lock:
+                for task_id in task_ids:
+                    self._tasks.pop(task_id, None)
+                self._pending = deque(t for t in self._pending
+                                      if t in self._tasks)
+
+    def _take(self):
+        with self._lock:
+            while self._pending:
+                task_id = self._pending.popleft()
+                if task_id in self._tasks:
+                    return task_id
+        return None
+
+    def _requeue(self, task_id):
+        with self._lock:
+            if task_id in self._tasks:
+                self._pending.appendleft(task_id)
+
+    def _complete(self, task_id, chunk_results):
+        with self._lock:
+            task = self._tasks.get(task_id)
+        if task is not None:
+            task[3].put((task_id, chunk_results))
+
+    def _serve(self, conn):
+        """
+        Hand out chunks to a worker and collect its results.
+        """
+        with self._lock:
+            self._n_workers += 1
+        current = None
+        # a timed out chunk the worker is still running, its results are
+        # dropped
+        abandoned = None
+        last_seen = started = time.monotonic()
+        try:
+            _send(conn, ('heartbeat_interval', self.heartbeat_timeout / 3))
+            while not self._closed.is_set():
+                if current is None and abandoned is None:
+                    current = self._take()
+                    if current is not None:
+                        with self._lock:
+                            task = self._tasks.get(current)
+                        if task is None:
+                            current = None
+                            continue
+                        # fn and items are loaded by the worker, which
+                        # reports the chunk as failed if it cannot
+                        _send(conn, ('task', current, len(task[2]),
+                                     serializer.dumps((task[1], task[2]))))
+                        started = time.monotonic()
+                if conn.poll(POLL_INTERVAL):
+                    message = _recv(conn)
+                    last_seen = time.monotonic()
+                    if message[0] == 'result':
+                        if message[1] == current:
+                            self._complete(current, message[2])
+                            current = None
+                        elif message[1] == abandoned:
+                            abandoned = None
+                    continue
+                now = time.monotonic()
+                if now - last_seen > self.heartbeat_timeout:
+                    logger.warning('Lost a worker, no heartbeat for {} s.'
+                                   .format(self.heartbeat_timeout))
+                    return
+                if current is not None and self.timeout is not None:
+                    with self._lock:
+                        task = self._tasks.get(current)
+                    if task is not None and \
+                            now - started > self.timeout * len(task[2]):
+                        logger.warning('A chunk of {} runs timed out.'.format(
+                            len(task[2])))
+                        error = repr(TimeoutError(
+                            'Run exceeded {} s.'.format(self.timeout)))
+                        self._complete(current,
+                                       [RunFailure(error, '', 1)] *
+                                       len(task[2]))
+                        abandoned, current = current, None
+            _send(conn, ('stop', ))
+        except (EOFError, OSError) as e:
+            logger.warning('Lost a worker: {!r}'.format(e))
+        except Exception:
+            logger.exception('Worker connection failed.')
+        finally:
+            if current is not None:
+                self._requeue(current)
+            with self._lock:
+                self._n_workers -= 1
+            conn.close()
+
+
+def _is_local(address):
+    """
+    Whether address is a Unix socket or on the loopback interface.
+    """
+    if not isinstance(address, tuple):
+        return True
+    host = address[0]
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def run_worker(address, authkey):
+    """
+    Connect to a DistributedExecutor at address, and run the chunks it
+    sends until it stops or the connection is lost.
+    authkey - bytes, the authkey of the DistributedExecutor.
+    """
+    conn = Client(address, authkey=authkey)
+    _, heartbeat_interval = _recv(conn)
+    lock = threading.Lock()
+    stopped = threading.Event()
+
+    def heartbeat():
+        while not stopped.wait(heartbeat_interval):
+            try:
+                with lock:
+                    _send(conn, ('heartbeat', ))
+            except (EOFError, OSError):
+                return
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+    n_chunks = 0
+    try:
+        while True:
+            try:
+                message = _recv(conn)
+            except (EOFError, OSError):
+                break
+            if message[0] == 'stop':
+                break
+            _, task_id, n_items, payload = message
+            try:
+                fn, chunk = serializer.loads(payload)
+            except Exception as e:
+                chunk_results = [
+                    RunFailure(repr(e), traceback.format_exc(), 1)
+                ] * n_items
+            else:
+                chunk_results = _run_chunk(fn, chunk)
+            n_chunks += 1
+            try:
+                with lock:
+                    _send(conn, ('result', task_id, chunk_results))
+            except (EOFError, OSError):
+                break
+    finally:
+        stopped.set()
+        conn.close()
+    logger.info('Worker ran {} chunks.'.format(n_chunks))
+
+
+def parse_address(text):
+    """
+    'host:port' as a (host, port) tuple, anything else as a Unix socket.
+    """
+    host, sep, port = text.rpartition(':')
+    if sep and port.isdigit():
+        return (host, int(port))
+    return text
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Run simglucose simulations for a DistributedExecutor.')
+    parser.add_argument('address', help='host:port or Unix socket path')
+    parser.add_argument('--authkey',
+                        default=os.environ.get(AUTHKEY_VARIABLE),
+                        help='authkey of the coordinator, ${} by '
+                        'default'.format(AUTHKEY_VARIABLE))
+    parser.add_argument('--processes', type=int, default=1)
+    args = parser.parse_args(args)
+    if args.authkey is None:
+        parser.error('the authkey of the coordinator is needed, give '
+                     '--authkey or set ${}'.format(AUTHKEY_VARIABLE))
+
+    logging.basicConfig(level=logging.INFO)
+    address = parse_address(args.address)
+    authkey = args.authkey.encode()
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(address, authkey))
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == '__main__':
+    main()
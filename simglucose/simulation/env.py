@@ -34,7 +34,27 @@ def risk_diff(BG_last_hour):
 
 
 class T1DSimEnv(object):
-    def __init__(self, patient, sensor, pump, scenario):
+    def __init__(self, patient, sensor, pump, scenario=None, tape=None,
+                 features=None, snapshots=False):
+        """
+        tape     - an optional simglucose.simulation.input_tape.InputTape.
+                   When given, the meals, sensor noise and initial glucose
+                   are replayed from the tape and scenario is ignored.
+                   The env then simulates copies of patient and sensor.
+        features - an optional simglucose.simulation.features.FeatureEngine,
+                   updated every step and passed as info['features'].
+        snapshots - pass a T1DPatient.snapshot() as info['patient_snapshot'],
+                   for controllers planning with the patient model. SimObj
+                   turns it on for controllers with needs_patient_snapshot.
+        """
+        self.tape = tape
+        self.features = features
+        self.snapshots = snapshots
+        # an optional simglucose.simulation.profiler.LatencyProfiler, set by
+        # SimObj when profiling
+        self.profiler = None
+        if tape is not None:
+            patient, sensor, scenario = tape.apply(patient, sensor)
         self.patient = patient
         self.sensor = sensor
         self.pump = pump
@@ -55,7 +75,11 @@ class T1DSimEnv(object):
         patient_mdl_act = Action(insulin=insulin, CHO=CHO)
 
         # State update
-        self.patient.step(patient_mdl_act)
+        if self.profiler is None:
+            self.patient.step(patient_mdl_act)
+        else:
+            with self.profiler.time('patient.step'):
+                self.patient.step(patient_mdl_act)
 
         # next observation
         BG = self.patient.observation.Gsub
@@ -108,6 +132,8 @@ class T1DSimEnv(object):
         reward = reward_fun(BG_last_hour)
         done = BG < 10 or BG > 600
         obs = Observation(CGM=CGM)
+        if self.features is not None:
+            self.features.update(CGM, insulin, CHO, self.patient.t)
 
         return Step(
             observation=obs,
@@ -122,8 +148,17 @@ class T1DSimEnv(object):
             lbgi=LBGI,
             hbgi=HBGI,
             risk=risk,
+            **self._optional_info()
         )
 
+    def _optional_info(self):
+        info = {}
+        if self.features is not None:
+            info['features'] = self.features
+        if self.snapshots:
+            info['patient_snapshot'] = self.patient.snapshot()
+        return info
+
     def _reset(self):
         self.sample_time = self.sensor.sample_time
         self.viewer = None
@@ -142,6 +177,11 @@ class T1DSimEnv(object):
         self.basal_hist = []
         self.bolus_hist = []
         self.insulin_hist = []
+        self._reset_features(CGM)
+
+    def _reset_features(self, CGM):
+        if self.features is not None:
+            self.features.reset(CGM, self.sample_time, t=self.patient.t)
 
     def reset(self):
         self.patient.reset()
@@ -150,6 +190,7 @@ class T1DSimEnv(object):
         self.scenario.reset()
         self._reset()
         CGM = self.sensor.measure(self.patient)
+        self._reset_features(CGM)
         obs = Observation(CGM=CGM)
         return Step(
             observation=obs,
@@ -164,6 +205,7 @@ class T1DSimEnv(object):
             lbgi=self.LBGI_hist[0],
             hbgi=self.HBGI_hist[0],
             risk=self.risk_hist[0],
+            **self._optional_info()
         )
 
     def render(self, close=False):
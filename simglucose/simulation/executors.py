@@ -0,0 +1,324 @@
+"""
+Executors run a function over many items (e.g. simglucose.simulation.
+sim_engine.sim over SimObj instances) and isolate failures: a run that
+raises or times out yields a RunFailure in its place instead of aborting
+the whole batch.
+
+    executor = ProcessExecutor(max_workers=8, chunksize=4, timeout=600,
+                               retries=1)
+    results = executor.map(sim, sim_instances)
+"""
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures import wait, FIRST_COMPLETED
+from collections import namedtuple
+import itertools
+import os
+import time
+import traceback
+import logging
+
+pathos = True
+try:
+    from pathos.multiprocessing import ProcessPool as Pool
+except ImportError:
+    pathos = False
+
+logger = logging.getLogger(__name__)
+
+_pool_ids = itertools.count()
+
+# error     - repr of the exception, or of the TimeoutError of a timed out run
+# traceback - formatted traceback of the exception, '' for a timeout
+# attempts  - number of times the run was tried
+class RunFailure(namedtuple('run_failure', ['error', 'traceback',
+                                           'attempts'])):
+    # a module level class, so that failures can be pickled back from the
+    # workers by reference
+    __slots__ = ()
+
+
+def is_failure(result):
+    return isinstance(result, RunFailure)
+
+
+def _run_chunk(fn, chunk):
+    """
+    Run fn on every item of a chunk, capturing exceptions. Executed in the
+    workers.
+    """
+    results = []
+    for item in chunk:
+        try:
+            results.append(fn(item))
+        except Exception as e:
+            results.append(RunFailure(repr(e), traceback.format_exc(), 1))
+    return results
+
+
+class Executor(object):
+    """
+    Base executor, runs in the calling thread.
+    """
+    def __init__(self, max_workers=None, chunksize=1, timeout=None,
+                 retries=0):
+        '''
+        max_workers - number of workers, the number of CPUs by default.
+        chunksize   - number of items sent to a worker at a time.
+        timeout     - optional time limit per item (s). A chunk may run for
+                      timeout * chunksize. Not enforced by SerialExecutor.
+        retries     - number of times failed items are tried again.
+        '''
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunksize = max(int(chunksize), 1)
+        self.timeout = timeout
+        self.retries = retries
+
+    def map(self, fn, items):
+        """
+        fn applied to every item, in order. Failed items are RunFailure.
+        """
+        items = list(items)
+        results = [None] * len(items)
+        for i, result in self.imap(fn, items):
+            results[i] = result
+        return results
+
+    def imap(self, fn, items, order=None):
+        """
+        (index, fn(item)) of every item as soon as it completes, failed
+        items are RunFailure after their last attempt.
+        order - optional list of the item indices in the order they are
+                dispatched in.
+        """
+        items = list(items)
+        pending = list(range(len(items))) if order is None else list(order)
+        for attempt in range(1, self.retries + 2):
+            chunks = [
+                pending[k:k + self.chunksize]
+                for k in range(0, len(pending), self.chunksize)
+            ]
+            failed = set()
+            for k, chunk_results in self._iter_run(fn, items, chunks):
+                for i, result in zip(chunks[k], chunk_results):
+                    if is_failure(result):
+                        result = result._replace(attempts=attempt)
+                        if attempt <= self.retries:
+                            failed.add(i)
+                            continue
+                    yield i, result
+            # retried in the same order
+            pending = [i for i in pending if i in failed]
+            if not pending:
+                break
+            logger.warning('{} of {} runs failed (attempt {}).'.format(
+                len(pending), len(items), attempt))
+
+    def _iter_run(self, fn, items, chunks):
+        """
+        (k, results of chunk k) for every chunk of item indices, as they
+        complete.
+        """
+        for k, chunk in enumerate(chunks):
+            yield k, _run_chunk(fn, [items[i] for i in chunk])
+
+
+class SerialExecutor(Executor):
+    pass
+
+
+class _PoolExecutor(Executor):
+    """
+    Keeps at most max_workers chunks in flight, so the time a chunk has
+    been submitted for is the time it has been running for. Chunks that
+    time out keep their worker busy until they finish, unless the executor
+    can terminate its workers (see terminates).
+    """
+    # whether timed out workers are terminated. Workers cannot be stopped
+    # one by one, so a pool with a timed out worker takes no new chunks, and
+    # is terminated once its other chunks have finished. New chunks go to a
+    # new pool meanwhile.
+    terminates = False
+
+    def _iter_run(self, fn, items, chunks):
+        queue = list(range(len(chunks)))[::-1]
+        running = {}
+        # timed out chunks that are still running and hold a worker
+        abandoned = set()
+        # the pool every chunk in flight was submitted to
+        pools = {}
+        # pools with timed out workers, waiting for their other chunks
+        retiring = []
+        pool = self._open()
+        try:
+            while queue or running:
+                while queue and len(running) + len(abandoned) < \
+                        self.max_workers:
+                    k = queue.pop()
+                    handle = self._submit(pool, fn,
+                                          [items[i] for i in chunks[k]])
+                    running[handle] = (k, time.monotonic())
+                    pools[handle] = pool
+                self._wait(list(running) + list(abandoned),
+                           self._next_deadline(running, chunks))
+                abandoned = set(h for h in abandoned if not self._done(h))
+                now = time.monotonic()
+                for handle, (k, start) in list(running.items()):
+                    if self._done(handle):
+                        del running[handle]
+                        yield k, self._result(handle, len(chunks[k]))
+                    elif self.timeout is not None and now - start > \
+                            self.timeout * len(chunks[k]):
+                        logger.warning('A chunk of {} runs timed out.'.format(
+                            len(chunks[k])))
+                        error = repr(TimeoutError(
+                            'Run exceeded {} s.'.format(self.timeout)))
+                        del running[handle]
+                        abandoned.add(handle)
+                        if self.terminates and pools[handle] is pool:
+                            retiring.append(pool)
+                            pool = self._open()
+                        yield k, [RunFailure(error, '', 1)] * len(chunks[k])
+                for old in list(retiring):
+                    if not any(pools[h] is old for h in running):
+                        self._close(old, True)
+                        retiring.remove(old)
+                        abandoned = set(h for h in abandoned
+                                        if pools[h] is not old)
+                pools = dict(
+                    (h, pools[h]) for h in list(running) + list(abandoned))
+        finally:
+            # also when the caller stops iterating early
+            for old in retiring:
+                self._close(old, True)
+            self._close(pool, any(pools.get(h) is pool
+                                  for h in list(running) + list(abandoned)))
+
+    def _next_deadline(self, running, chunks):
+        if self.timeout is None or not running:
+            return None
+        now = time.monotonic()
+        return max(
+            min(start + self.timeout * len(chunks[k]) - now
+                for k, start in running.values()), 0)
+
+    def _result(self, handle, n):
+        try:
+            return self._get(handle)
+        except Exception as e:
+            # e.g. the chunk could not be pickled or the worker died
+            return [RunFailure(repr(e), traceback.format_exc(), 1)] * n
+
+
+class _FuturesExecutor(_PoolExecutor):
+    def _submit(self, pool, fn, chunk):
+        return pool.submit(_run_chunk, fn, chunk)
+
+    def _wait(self, handles, timeout):
+        wait(handles, timeout=timeout, return_when=FIRST_COMPLETED)
+
+    def _done(self, handle):
+        return handle.done()
+
+    def _get(self, handle):
+        return handle.result()
+
+    def _close(self, pool, abandoned):
+        pool.shutdown(wait=not abandoned, cancel_futures=True)
+
+
+class ThreadExecutor(_FuturesExecutor):
+    """
+    Runs in threads. Threads that time out cannot be stopped: the next
+    chunks wait for them to finish, and they are left to finish in the
+    background at the end of the batch.
+    """
+    def _open(self):
+        return ThreadPoolExecutor(max_workers=self.max_workers)
+
+
+class ProcessExecutor(_FuturesExecutor):
+    """
+    Runs in processes of the standard library, items and results are
+    pickled. Workers that time out are terminated.
+    """
+    terminates = True
+
+    def __init__(self, max_workers=None, chunksize=1, timeout=None,
+                 retries=0, mp_context=None):
+        super(ProcessExecutor, self).__init__(max_workers, chunksize,
+                                              timeout, retries)
+        self.mp_context = mp_context
+
+    def _open(self):
+        return ProcessPoolExecutor(max_workers=self.max_workers,
+                                   mp_context=self.mp_context)
+
+    def _close(self, pool, abandoned):
+        processes = list((getattr(pool, '_processes', None) or {}).values())
+        super(ProcessExecutor, self)._close(pool, abandoned)
+        if abandoned:
+            for process in processes:
+                process.terminate()
+
+
+class PathosExecutor(_PoolExecutor):
+    """
+    Runs in a pathos ProcessPool, which serializes with dill and can ship
+    objects the standard pickle cannot, such as SimObj instances. Workers
+    that time out are terminated.
+    """
+    terminates = True
+    POLL_INTERVAL = 0.01  # sec
+
+    def __init__(self, *args, **kwargs):
+        if not pathos:
+            raise ImportError('PathosExecutor needs pathos.')
+        super(PathosExecutor, self).__init__(*args, **kwargs)
+
+    def _open(self):
+        # a new pool, not the one pathos caches for max_workers nodes that
+        # other code may be using
+        return Pool(nodes=self.max_workers,
+                    id='{}-{}'.format(__name__, next(_pool_ids)))
+
+    def _submit(self, pool, fn, chunk):
+        return pool.apipe(_run_chunk, fn, chunk)
+
+    def _wait(self, handles, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not any(h.ready() for h in handles):
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            time.sleep(self.POLL_INTERVAL)
+
+    def _done(self, handle):
+        return handle.ready()
+
+    def _get(self, handle):
+        return handle.get()
+
+    def _close(self, pool, abandoned):
+        if abandoned:
+            pool.terminate()
+        else:
+            pool.close()
+            pool.join()
+        pool.clear()
+
+
+EXECUTORS = {
+    'serial': SerialExecutor,
+    'thread': ThreadExecutor,
+    'process': ProcessExecutor,
+    'pathos': PathosExecutor,
+}
+
+
+def get_executor(name='serial', **kwargs):
+    """
+    An executor by name: 'serial', 'thread', 'process' or 'pathos'.
+    """
+    if name not in EXECUTORS:
+        raise ValueError('Unknown executor {}, choose one of {}.'.format(
+            name, sorted(EXECUTORS)))
+    return EXECUTORS[name](**kwargs)
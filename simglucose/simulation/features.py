@@ -0,0 +1,160 @@
+from simglucose.analysis.glucose_effects import ExponentialInsulinCurve
+from simglucose.analysis.glucose_effects import LinearCarbCurve
+from simglucose.analysis.glucose_effects import InsulinOnBoard, CarbsOnBoard
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+FEATURE_NAMES = ['CGM', 'CGM_mean', 'CGM_roc', 'IOB', 'COB']
+
+
+class RollingWindow(object):
+    """
+    The last `size` values of a stream, updated in O(1). Values are written
+    twice into a buffer of 2 * size, so the window is always available as a
+    contiguous view of the buffer, without copying.
+    """
+    def __init__(self, size, fill=0.0):
+        self.size = int(size)
+        self._buffer = np.empty(2 * self.size)
+        self.reset(fill)
+
+    def reset(self, fill=0.0):
+        self._buffer[:] = fill
+        self._pos = 0
+        self._sum = fill * self.size
+        self._n_updates = 0
+
+    def append(self, value):
+        old = self._buffer[self._pos]
+        self._buffer[self._pos] = value
+        self._buffer[self._pos + self.size] = value
+        self._pos = (self._pos + 1) % self.size
+        self._n_updates += 1
+        if self._n_updates % self.size == 0:
+            # recompute to keep rounding errors from accumulating
+            self._sum = self.view.sum()
+        else:
+            self._sum += value - old
+
+    @property
+    def view(self):
+        """
+        Read-only view of the window, oldest value first.
+        """
+        view = self._buffer[self._pos:self._pos + self.size]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def last(self):
+        return self._buffer[self._pos + self.size - 1]
+
+    def __getitem__(self, k):
+        return self.view[k]
+
+    @property
+    def mean(self):
+        return self._sum / self.size
+
+
+class FeatureEngine(object):
+    """
+    Controller input features maintained incrementally as the simulation
+    steps, so that controllers and agents do not recompute them from the
+    history: a window of the last CGM samples, its mean, the CGM rate of
+    change, insulin on board and carbs on board. Every update is O(1).
+
+    Attach it to simglucose.simulation.env.T1DSimEnv(..., features=engine),
+    the env resets and updates it, and passes it as info['features'].
+    """
+    def __init__(self, window_size=20, trend_size=5, insulin_type='novolog',
+                 basal=0.0):
+        '''
+        window_size  - number of CGM samples kept in the window.
+        trend_size   - number of samples the rate of change is taken over,
+                       less than window_size.
+        insulin_type - insulin model of the insulin on board, see
+                       simglucose.analysis.glucose_effects.INSULIN_MODELS.
+        basal        - insulin rate (U/min) not counted in the insulin on
+                       board, e.g. the scheduled basal. 0 counts all insulin.
+        '''
+        if not 0 < trend_size < window_size:
+            raise ValueError('trend_size must be between 0 and window_size.')
+        self.window_size = window_size
+        self.trend_size = trend_size
+        self.basal = basal
+        self.cgm = RollingWindow(window_size)
+        self.iob = InsulinOnBoard(
+            ExponentialInsulinCurve.withName(insulin_type))
+        self.cob = CarbsOnBoard(LinearCarbCurve())
+        self.sample_time = 1
+        self.t = 0
+
+    def reset(self, CGM, sample_time, t=0):
+        """
+        Start over from a CGM reading, the window is filled with it.
+        """
+        self.sample_time = sample_time
+        self.t = t
+        self.cgm.reset(CGM)
+        self.iob.reset()
+        self.cob.reset()
+        self._iob = 0.0
+        self._cob = 0.0
+
+    def update(self, CGM, insulin, CHO, t):
+        """
+        Add a step of the simulation.
+        ----
+        Inputs:
+        CGM     - CGM reading at the end of the step (mg/dL).
+        insulin - mean insulin rate over the step (U/min).
+        CHO     - mean carbs intake over the step (g/min).
+        t       - time at the end of the step (min).
+        """
+        duration = t - self.t
+        self.iob.add(self.t, (insulin - self.basal) * duration)
+        self.cob.add(self.t, CHO * duration)
+        self.t = t
+        self.cgm.append(CGM)
+        self._iob = self.iob.value(t)
+        self._cob = self.cob.value(t)
+
+    @property
+    def cgm_window(self):
+        """
+        Read-only view of the last window_size CGM samples, oldest first.
+        """
+        return self.cgm.view
+
+    @property
+    def cgm_mean(self):
+        return self.cgm.mean
+
+    @property
+    def cgm_roc(self):
+        """
+        CGM rate of change (mg/dL/min) over the last trend_size samples.
+        """
+        view = self.cgm.view
+        return (view[-1] - view[-1 - self.trend_size]) / (self.trend_size *
+                                                          self.sample_time)
+
+    @property
+    def insulin_on_board(self):
+        return self._iob
+
+    @property
+    def carbs_on_board(self):
+        return self._cob
+
+    @property
+    def features(self):
+        """
+        The features in the order of FEATURE_NAMES.
+        """
+        return np.array([
+            self.cgm.last, self.cgm_mean, self.cgm_roc, self._iob, self._cob
+        ])
@@ -0,0 +1,151 @@
+"""
+Stable fingerprints of simulation runs, the same in every process and
+session for runs that are configured the same way: a hash of the SimObj or
+RunSpec attributes, recursively, down to patient, sensor and pump
+parameters, seeds, scenario content, controller settings and sim_time.
+"""
+from concurrent.futures import Executor
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import hashlib
+import json
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Attributes that do not change the results of a run: outputs, caches,
+# rendering and solver objects, state rebuilt from a seed on reset, and the
+# runtime state of controllers (memoized recommendations, thread pools,
+# locks, and what reset() clears before every run)
+SKIP_ATTRIBUTES = {
+    'path', 'sink', 'run_id', 'animate', 'viewer', 'profiler', '_odesolver',
+    '_noise_generator', '_last_CGM', 'random_state', 'random_gen',
+    'therapy_settings', '_cohort_settings', 'termination_reason', '_cache',
+    '_executor', '_max_workers', 'lock', '_lock', 'observations',
+    'integrated_state', 'prev_state', '_batch_integrated_state',
+    '_batch_prev_state', '_batch_names', '_plans', '_models', 'n_rollouts',
+    'last_decision_time', '_rows', '_names', '_episodes', '_episode'
+}
+# Values that only exist at runtime, skipped whatever their attribute name
+RUNTIME_TYPES = (type(threading.Lock()), type(threading.RLock()),
+                 threading.Thread, threading.Event, Executor)
+
+
+def fingerprint(obj):
+    """
+    Hex digest identifying obj, e.g. a SimObj or RunSpec before it is run.
+    """
+    text = json.dumps(canonical(obj), separators=(',', ':'))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def is_reproducible(sim_object):
+    """
+    Whether a SimObj or RunSpec is seeded, i.e. gives the same results every
+    time.
+    """
+    if hasattr(sim_object, 'build'):
+        return _is_reproducible_spec(sim_object)
+    env = sim_object.env
+    if env.sensor.noise is None and env.sensor.seed is None:
+        return False
+    if getattr(env.scenario, '_seed', 0) is None:
+        return False
+    patient = env.patient
+    if patient.random_init_bg and patient._seed is None:
+        return False
+    return True
+
+
+def _is_reproducible_spec(spec):
+    # without building the SimObj, see RunSpec.build
+    if spec.sensor_seed is None:
+        return False
+    if spec.scenario is None:
+        if spec.scenario_seed is None:
+            return False
+    elif getattr(spec.scenario, '_seed', 0) is None:
+        return False
+    patient_kwargs = spec.patient_kwargs or {}
+    if patient_kwargs.get('random_init_bg') and \
+            patient_kwargs.get('seed') is None:
+        return False
+    return True
+
+
+def canonical(obj, _seen=None):
+    """
+    obj as nested lists and builtin scalars that json can dump, without
+    memory addresses or other values that change from one process to
+    another.
+    """
+    if obj is None or isinstance(obj, (bool, str)):
+        return obj
+    if isinstance(obj, (int, np.integer)):
+        return int(obj)
+    if isinstance(obj, (float, np.floating)):
+        return repr(float(obj))
+    if isinstance(obj, (datetime, timedelta, np.datetime64, pd.Timestamp)):
+        return [type(obj).__name__, str(obj)]
+    if isinstance(obj, type) or callable(obj) and hasattr(obj, '__qualname__'):
+        return ['callable', _qualname(obj)]
+    if isinstance(obj, np.ndarray):
+        return ['ndarray', str(obj.dtype), list(obj.shape), _digest(obj)]
+    if isinstance(obj, (pd.Series, pd.DataFrame)):
+        columns = list(obj.columns) if isinstance(obj, pd.DataFrame) else [
+            obj.name
+        ]
+        return [
+            type(obj).__name__,
+            canonical(columns),
+            _digest(pd.util.hash_pandas_object(obj, index=True).to_numpy())
+        ]
+    if isinstance(obj, np.random.RandomState):
+        return ['RandomState', canonical(obj.get_state())]
+
+    _seen = set() if _seen is None else _seen
+    if id(obj) in _seen:
+        return ['cycle', _qualname(type(obj))]
+    _seen = _seen | {id(obj)}
+    if isinstance(obj, tuple) and hasattr(obj, '_fields'):
+        return [
+            _qualname(type(obj)),
+            _canonical_attributes(obj._asdict(), _seen)
+        ]
+    if isinstance(obj, (list, tuple)):
+        return [canonical(x, _seen) for x in obj]
+    if isinstance(obj, (set, frozenset)):
+        return sorted(canonical(x, _seen) for x in obj)
+    if isinstance(obj, dict):
+        return [
+            'dict',
+            sorted([str(k), canonical(v, _seen)] for k, v in obj.items())
+        ]
+    if hasattr(obj, '__dict__'):
+        return [_qualname(type(obj)), _canonical_attributes(vars(obj), _seen)]
+    text = repr(obj)
+    if ' at 0x' in text:
+        # default repr, only the type is reproducible
+        return [_qualname(type(obj))]
+    return [_qualname(type(obj)), text]
+
+
+def _canonical_attributes(attributes, _seen):
+    return [[k, canonical(v, _seen)] for k, v in sorted(attributes.items())
+            if k not in SKIP_ATTRIBUTES and not k.endswith('_hist') and
+            not isinstance(v, RUNTIME_TYPES)]
+
+
+def _qualname(obj):
+    return '{}.{}'.format(getattr(obj, '__module__', None),
+                          getattr(obj, '__qualname__', repr(obj)))
+
+
+def _digest(array):
+    array = np.ascontiguousarray(array)
+    if array.dtype == object:
+        return hashlib.sha256(json.dumps(
+            [canonical(x) for x in array.ravel()]).encode()).hexdigest()
+    return hashlib.sha256(array.tobytes()).hexdigest()
@@ -0,0 +1,137 @@
+from simglucose.simulation.scenario import CustomScenario
+from simglucose.simulation.scenario_gen import create_meal_vectors
+from simglucose.sensor.cgm import CGMSensor
+from simglucose.sensor.noise_gen import CGMNoise
+from datetime import datetime
+from datetime import timedelta
+import numpy as np
+import copy
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class InputTape(object):
+    """
+    All the randomness of a simulation run drawn ahead of time: the meal
+    schedule, the CGM sensor noise and the initial glucose perturbation.
+
+    Replaying the same tape (T1DSimEnv(..., tape=tape)) gives every
+    controller identical inputs without regenerating them, and the arrays
+    can be fed directly to batched engines.
+    """
+    def __init__(self, start_time, sample_time, meals, cgm_noise,
+                 init_bg_noise=None, sensor_name=None):
+        '''
+        start_time    - a datetime.datetime object.
+        sample_time   - sensor sample time (min) the noise was drawn for.
+        meals         - per-minute meal vector (g) starting at start_time.
+        cgm_noise     - CGM noise, one value per sensor sample.
+        init_bg_noise - 3 standard normal draws for the initial glucose
+                        states, or None to keep the default initial state.
+        sensor_name   - name of the sensor the noise was drawn for.
+        '''
+        self.start_time = start_time
+        self.sample_time = sample_time
+        self.meals = np.asarray(meals, dtype=float)
+        self.cgm_noise = np.asarray(cgm_noise, dtype=float)
+        self.init_bg_noise = (np.asarray(init_bg_noise, dtype=float)
+                              if init_bg_noise is not None else None)
+        self.sensor_name = sensor_name
+
+    @classmethod
+    def generate(cls, start_time, sim_time, sensor_name, seed=None,
+                 random_init_bg=True, scenario=None):
+        """
+        Draw a tape covering sim_time.
+        ----
+        Inputs:
+        start_time     - a datetime.datetime object.
+        sim_time       - a datetime.timedelta object.
+        sensor_name    - name of the CGM sensor, e.g. 'Dexcom'.
+        seed           - root seed, the meal, noise and initial glucose
+                         streams are derived from it.
+        random_init_bg - draw the initial glucose perturbation.
+        scenario       - optional scenario with a meal_vector method (e.g. a
+                         CustomScenario) to record instead of random meals.
+        """
+        horizon = sim_time.total_seconds() / 60.0
+        scenario_seed, sensor_seed, patient_seed = np.random.RandomState(
+            seed).randint(2**31, size=3)
+
+        if scenario is None:
+            meals = create_meal_vectors(start_time, sim_time,
+                                        seed=scenario_seed)[0]
+        else:
+            meals = scenario.meal_vector(horizon)
+
+        sensor_params = CGMSensor.withName(sensor_name)._params
+        sample_time = sensor_params.sample_time
+        # The sensor samples once per sample time, plus twice at time zero
+        # (when the environment is built and when it is reset).
+        n_samples = int(np.ceil(horizon / sample_time)) + 3
+        noise_gen = CGMNoise(sensor_params, seed=sensor_seed)
+        cgm_noise = np.array([next(noise_gen) for _ in range(n_samples)])
+
+        init_bg_noise = None
+        if random_init_bg:
+            init_bg_noise = np.random.RandomState(
+                patient_seed).standard_normal(3)
+
+        return cls(start_time, sample_time, meals, cgm_noise,
+                   init_bg_noise=init_bg_noise, sensor_name=sensor_name)
+
+    @property
+    def horizon(self):
+        return timedelta(minutes=len(self.meals))
+
+    def scenario(self):
+        """
+        The recorded meals as a CustomScenario.
+        """
+        return CustomScenario(
+            start_time=self.start_time,
+            scenario=[(timedelta(minutes=int(k)), self.meals[k])
+                      for k in np.flatnonzero(self.meals)])
+
+    def apply(self, patient, sensor):
+        """
+        Copies of patient and sensor that replay the tape, and the scenario
+        of the tape. patient and sensor are not modified.
+        """
+        if sensor.sample_time != self.sample_time:
+            raise ValueError(
+                'The tape was drawn for a sample time of {} min, the sensor '
+                'samples every {} min.'.format(self.sample_time,
+                                               sensor.sample_time))
+        # reset() gives the copies their own solver and noise generator
+        patient = copy.copy(patient)
+        patient.init_bg_noise = self.init_bg_noise
+        patient.reset()
+        sensor = copy.copy(sensor)
+        sensor.noise = self.cgm_noise
+        sensor.reset()
+        return patient, sensor, self.scenario()
+
+    def save(self, filename):
+        np.savez_compressed(
+            filename,
+            start_time=self.start_time.isoformat(),
+            sample_time=self.sample_time,
+            meals=self.meals,
+            cgm_noise=self.cgm_noise,
+            init_bg_noise=(self.init_bg_noise if self.init_bg_noise
+                           is not None else np.zeros(0)),
+            sensor_name=self.sensor_name or '')
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            init_bg_noise = data['init_bg_noise']
+            return cls(datetime.fromisoformat(str(data['start_time'])),
+                       data['sample_time'].item(),
+                       data['meals'],
+                       data['cgm_noise'],
+                       init_bg_noise=(init_bg_noise
+                                      if len(init_bg_noise) else None),
+                       sensor_name=str(data['sensor_name']) or None)
@@ -0,0 +1,159 @@
+"""
+Resumable batch runs. Every run of a journaled batch saves its results and
+appends a line to a manifest as soon as it completes, so a batch that is
+interrupted can be started again and only runs what is missing.
+
+    journal = RunJournal('results/cohort')
+    results = batch_sim(sim_instances, parallel=True, journal=journal)
+"""
+from simglucose.simulation.sim_engine import sim
+from simglucose.simulation.executors import SerialExecutor, RunFailure
+from simglucose.simulation.executors import is_failure
+from simglucose.simulation.fingerprint import fingerprint, is_reproducible
+from simglucose.simulation.sinks import NPZSink
+import json
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RunJournal(object):
+    """
+    A folder with the manifest of the completed runs, manifest.jsonl, and
+    their results, written with a sink under the run id. The run id is the
+    fingerprint of the SimObj or RunSpec, see simglucose.simulation.
+    fingerprint. Runs that are not seeded are replicates rather than
+    duplicates: their id also has their index in the batch.
+    """
+    MANIFEST = 'manifest.jsonl'
+
+    def __init__(self, path, sink=None):
+        '''
+        path - folder of the journal, created if needed.
+        sink - picklable sink the results are written to, an NPZSink in
+               path/results by default.
+        '''
+        self.path = path
+        self.sink = sink if sink is not None else NPZSink(
+            os.path.join(path, 'results'))
+        os.makedirs(path, exist_ok=True)
+
+    @property
+    def manifest(self):
+        return os.path.join(self.path, self.MANIFEST)
+
+    def completed(self):
+        """
+        Dict mapping the ids of the completed runs to their manifest record.
+        """
+        records = {}
+        if not os.path.exists(self.manifest):
+            return records
+        with open(self.manifest) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # a line cut short when the batch was killed
+                    continue
+                records[record['id']] = record
+        return records
+
+    def record(self, run_id, **fields):
+        """
+        Mark a run as completed. One short line appended at once, so that
+        workers can record concurrently.
+        """
+        line = json.dumps(dict(id=run_id, **fields)) + '\n'
+        fd = os.open(self.manifest, os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                     0o644)
+        try:
+            os.write(fd, line.encode())
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _terminate_last_line(self):
+        # so that a line cut short does not swallow the next record
+        if not os.path.exists(self.manifest):
+            return
+        with open(self.manifest, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                f.write(b'\n')
+
+    def load(self, run_id):
+        return self.sink.read(run_id)
+
+    def run(self, sim_instances, executor=None):
+        """
+        Run the SimObj or RunSpec instances that are not completed yet, and
+        return the results of all of them in order, like sim_engine.
+        batch_sim. Failed runs are RunFailure and are tried again by the
+        next call.
+        """
+        sim_instances = list(sim_instances)
+        executor = executor or SerialExecutor()
+        ids = [journal_id(s, index) for index, s in enumerate(sim_instances)]
+        self._terminate_last_line()
+        completed = self.completed()
+        pending = {}
+        for run_id, s in zip(ids, sim_instances):
+            if run_id not in completed and run_id not in pending:
+                pending[run_id] = s
+        logger.info('{} of {} runs already completed, running {}.'.format(
+            len(sim_instances) - len(pending), len(sim_instances),
+            len(pending)))
+
+        statuses = executor.map(_journaled_sim,
+                                [(s, run_id, self)
+                                 for run_id, s in pending.items()])
+        failures = {
+            run_id: status
+            for run_id, status in zip(pending, statuses) if is_failure(status)
+        }
+        if failures:
+            logger.error('{} of {} simulations failed.'.format(
+                len(failures), len(pending)))
+
+        results = []
+        for run_id in ids:
+            if run_id in failures:
+                results.append(failures[run_id])
+                continue
+            try:
+                results.append(self.load(run_id))
+            except Exception as e:
+                results.append(RunFailure(repr(e), '', 0))
+        return results
+
+
+def journal_id(sim_object, index):
+    """
+    Journal id of run number index of a batch.
+    """
+    if is_reproducible(sim_object):
+        return fingerprint(sim_object)
+    return '{}_{}'.format(fingerprint(sim_object), index)
+
+
+def _journaled_sim(args):
+    """
+    Run, save and record a run. Executed in the workers.
+    """
+    sim_object, run_id, journal = args
+    if hasattr(sim_object, 'build'):
+        sim_object = sim_object.build()
+    tic = time.time()
+    df = sim(sim_object)
+    journal.sink.write(run_id, df)
+    journal.record(run_id,
+                   patient_name=str(sim_object.env.patient.name),
+                   elapsed=time.time() - tic,
+                   pid=os.getpid())
+    return run_id
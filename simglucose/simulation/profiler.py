@@ -0,0 +1,107 @@
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 1440
+
+
+@contextmanager
+def no_timer(name):
+    """
+    Stands in for LatencyProfiler.time when a simulation is not profiled.
+    """
+    yield
+
+
+class LatencyProfiler(object):
+    """
+    Collects the wall time of every call of named sections of a simulation,
+    e.g. the controller policy or the patient ODE, and summarizes them as
+    latency percentiles, calls per simulated day and share of the run's
+    wall time.
+
+        profiler = LatencyProfiler()
+        with profiler.time('policy'):
+            controller.policy(...)
+        print(profiler)
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._durations = {}
+        self.wall_time = 0.0
+        self.sim_minutes = 0.0
+
+    def record(self, name, seconds):
+        if name not in self._durations:
+            self._durations[name] = []
+        self._durations[name].append(seconds)
+
+    @contextmanager
+    def time(self, name):
+        tic = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - tic)
+
+    def durations(self, name):
+        """
+        The recorded durations (s) of a section, as an array.
+        """
+        return np.asarray(self._durations.get(name, []))
+
+    def histogram(self, name, bins=20):
+        """
+        Latency histogram of a section: counts and bin edges (ms), on a log
+        scale since latencies are heavy tailed. A section without samples
+        has zero counts and no edges.
+        """
+        d = self.durations(name) * 1000  # unit: ms
+        if len(d) == 0:
+            return np.zeros(bins, dtype=int), np.array([])
+        low = max(d.min(), 1e-6)
+        edges = np.geomspace(low, max(d.max(), low) * (1 + 1e-9), bins + 1)
+        return np.histogram(np.maximum(d, low), bins=edges)
+
+    def summary(self):
+        """
+        A DataFrame indexed by section with the number of calls, the p50, p99
+        and max latency (ms), calls per simulated day, total time (s) and
+        share of the wall time of the run.
+        """
+        rows = []
+        for name, durations in self._durations.items():
+            d = np.asarray(durations) * 1000  # unit: ms
+            total = d.sum() / 1000
+            rows.append({
+                'section': name,
+                'calls': len(d),
+                'p50_ms': np.percentile(d, 50),
+                'p99_ms': np.percentile(d, 99),
+                'max_ms': d.max(),
+                'calls_per_day': (len(d) * MINUTES_PER_DAY / self.sim_minutes
+                                  if self.sim_minutes else np.nan),
+                'total_s': total,
+                'wall_share': (total / self.wall_time
+                               if self.wall_time else np.nan),
+            })
+        columns = [
+            'section', 'calls', 'p50_ms', 'p99_ms', 'max_ms', 'calls_per_day',
+            'total_s', 'wall_share'
+        ]
+        return pd.DataFrame(rows, columns=columns).set_index('section')
+
+    def __str__(self):
+        header = 'Latency over {:.3f} s wall time, {:.1f} simulated min'.format(
+            self.wall_time, self.sim_minutes)
+        return header + '\n' + self.summary().to_string(
+            float_format='{:.4g}'.format)
+
+    def save(self, filename):
+        self.summary().to_csv(filename)
@@ -0,0 +1,126 @@
+from simglucose.simulation.sim_engine import SimObj
+from simglucose.simulation.env import T1DSimEnv
+from simglucose.simulation.scenario_gen import RandomScenario
+from simglucose.simulation.scenario_bank import ScenarioBank
+from simglucose.patient.t1dpatient import T1DPatient, PATIENT_PARA_FILE
+from simglucose.sensor.cgm import CGMSensor, SENSOR_PARA_FILE
+from simglucose.actuator.pump import InsulinPump, INSULIN_PUMP_PARA_FILE
+from collections import namedtuple
+from datetime import datetime
+from functools import lru_cache
+import copy
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_START_TIME = datetime(2018, 1, 1, 0, 0, 0)
+
+
+class BankScenario(namedtuple('bank_scenario', ['path', 'index'])):
+    """
+    Scenario index of a simglucose.simulation.scenario_bank.ScenarioBank.
+    """
+    __slots__ = ()
+
+
+class RunSpec(
+        namedtuple('run_spec', [
+            'patient_name', 'sim_time', 'controller', 'controller_kwargs',
+            'start_time', 'scenario', 'scenario_seed', 'sensor_name',
+            'sensor_seed', 'pump_name', 'patient_params', 'patient_kwargs',
+            'path', 'sink', 'run_id', 'stop'
+        ], defaults=(None, None, None, None, 'Dexcom', None, 'Insulet', None,
+                     None, None, None, None, None))):
+    """
+    A lightweight description of a simulation run, cheap to send to a worker
+    which builds the SimObj locally with build(). Parameter tables are read
+    once per worker process.
+
+    patient_name      - name of the virtual patient.
+    sim_time          - a datetime.timedelta object.
+    controller        - controller class, or a module level function
+                        returning a controller.
+    controller_kwargs - optional dict of keyword arguments of controller.
+    start_time        - a datetime.datetime object, 2018-01-01 by default.
+    scenario          - None for a RandomScenario seeded with scenario_seed,
+                        a BankScenario, or a (small) scenario object that is
+                        copied.
+    sensor_name, sensor_seed, pump_name - CGM sensor and insulin pump.
+    patient_params    - optional dict of patient parameters, overriding the
+                        ones of patient_name, or a full parameter row for a
+                        patient that is not in the table.
+    patient_kwargs    - optional dict of T1DPatient keyword arguments, e.g.
+                        random_init_bg and seed.
+    path              - folder the results are saved to, not saved if None.
+    sink, run_id      - see SimObj, the sink must be picklable to be sent to
+                        a worker (not a BackgroundWriter).
+    stop              - see SimObj, copied for every build.
+    """
+    __slots__ = ()
+
+    def build(self):
+        start_time = self.start_time or DEFAULT_START_TIME
+        patient = T1DPatient(_patient_params(self.patient_name,
+                                             self.patient_params),
+                             **(self.patient_kwargs or {}))
+        sensor = CGMSensor(_sensor_params(self.sensor_name),
+                           seed=self.sensor_seed)
+        pump = InsulinPump(_pump_params(self.pump_name))
+
+        if self.scenario is None:
+            scenario = RandomScenario(start_time=start_time,
+                                      seed=self.scenario_seed)
+        elif isinstance(self.scenario, BankScenario):
+            scenario = _scenario_bank(self.scenario.path).scenario(
+                self.scenario.index, start_time)
+        else:
+            scenario = copy.deepcopy(self.scenario)
+
+        env = T1DSimEnv(patient, sensor, pump, scenario)
+        controller = self.controller(**(self.controller_kwargs or {}))
+        return SimObj(env, controller, self.sim_time, animate=False,
+                      path=self.path, sink=self.sink, run_id=self.run_id,
+                      stop=copy.deepcopy(self.stop))
+
+
+# Parameter tables are cached per process, so a worker reads every file once
+@lru_cache(maxsize=None)
+def _table(filename):
+    return pd.read_csv(filename)
+
+
+@lru_cache(maxsize=None)
+def _row(filename, name):
+    table = _table(filename)
+    rows = table.loc[table.Name == name]
+    if rows.empty:
+        return None
+    return rows.iloc[0]
+
+
+def _patient_params(name, overrides=None):
+    params = _row(PATIENT_PARA_FILE, name)
+    if overrides is None:
+        if params is None:
+            raise ValueError('Unknown patient {}.'.format(name))
+        return params
+    if params is None:
+        return pd.Series(overrides)
+    params = params.copy()
+    for key, value in overrides.items():
+        params[key] = value
+    return params
+
+
+def _sensor_params(name):
+    return _row(SENSOR_PARA_FILE, name)
+
+
+def _pump_params(name):
+    return _row(INSULIN_PUMP_PARA_FILE, name)
+
+
+@lru_cache(maxsize=None)
+def _scenario_bank(path):
+    return ScenarioBank(path)
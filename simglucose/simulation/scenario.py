@@ -1,4 +1,5 @@
 import logging
+import numpy as np
 from collections import namedtuple
 from datetime import datetime
 from datetime import timedelta
@@ -30,19 +31,54 @@ class CustomScenario(Scenario):
         Scenario.__init__(self, start_time=start_time)
         self.scenario = scenario
 
+    @property
+    def scenario(self):
+        return self._scenario
+
+    @scenario.setter
+    def scenario(self, scenario):
+        self._scenario = scenario
+        self._compile()
+
+    def _compile(self):
+        """
+        Parse the meal times once and index the meals by their absolute time,
+        so that get_action is a dictionary lookup instead of a scan over the
+        whole scenario. Meals that share a time are added up, like in
+        ScenarioBank and StreamScenario.
+        """
+        self._meals = {}
+        for time, action in self.scenario or []:
+            t = parseTime(time, self.start_time)
+            self._meals[t] = self._meals.get(t, 0) + action
+
     def get_action(self, t):
-        if not self.scenario:
-            return Action(meal=0)
-        else:
-            times, actions = tuple(zip(*self.scenario))
-            times2compare = [parseTime(time, self.start_time) for time in times]
-            if t in times2compare:
-                idx = times2compare.index(t)
-                return Action(meal=actions[idx])
-            return Action(meal=0)
+        return Action(meal=self._meals.get(t, 0))
+
+    def meal_vector(self, horizon, sample_time=1):
+        """
+        Dense meal vector over the horizon starting at start_time.
+        ----
+        Inputs:
+        horizon     - a datetime.timedelta or the number of minutes to cover.
+        sample_time - minutes per entry of the vector.
+        ----
+        Output:
+        meals - a numpy array, meals[k] is the meal returned by get_action at
+                start_time + k * sample_time. Meals off that grid are dropped.
+        """
+        if isinstance(horizon, timedelta):
+            horizon = horizon.total_seconds() / 60.0
+        meals = np.zeros(int(np.ceil(horizon / sample_time)))
+        step = timedelta(minutes=sample_time)
+        for t, meal in self._meals.items():
+            k, rest = divmod(t - self.start_time, step)
+            if not rest and 0 <= k < len(meals):
+                meals[k] = meal
+        return meals
 
     def reset(self):
-        pass
+        self._compile()
 
 
 def parseTime(time, start_time):
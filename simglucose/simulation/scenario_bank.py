@@ -0,0 +1,204 @@
+"""
+A scenario bank stores a large number of pre-generated meal schedules on disk.
+
+A bank is a directory with four files:
+    meta.json   - number of scenarios, horizon (minutes) and start time
+    offsets.bin - int64, scenario i owns meals offsets[i]:offsets[i + 1]
+    times.bin   - int32, meal times in minutes since the scenario start
+    amounts.bin - float32, meal sizes in grams
+
+The binary files are memory-mapped when the bank is opened, so workers can
+read any scenario by index without loading or regenerating the whole bank.
+Pickling a ScenarioBank only ships its path.
+"""
+from simglucose.simulation.scenario import CustomScenario
+from simglucose.simulation.scenario_gen import create_meal_vectors
+from datetime import datetime
+from datetime import timedelta
+import numpy as np
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+BANK_VERSION = 1
+TIME_DTYPE = np.int32
+AMOUNT_DTYPE = np.float32
+OFFSET_DTYPE = np.int64
+
+
+class ScenarioBankWriter(object):
+    """
+    Append meal schedules to a new scenario bank. Use as a context manager,
+    the bank is only readable after close().
+    """
+    def __init__(self, path, horizon=None, start_time=None):
+        '''
+        path       - directory of the bank, created if it does not exist.
+        horizon    - length of every scenario, a datetime.timedelta or minutes.
+        start_time - a datetime.datetime, the time of day the meal times are
+                     aligned to. Only recorded in the metadata.
+        '''
+        if isinstance(horizon, timedelta):
+            horizon = horizon.total_seconds() / 60.0
+        self.path = path
+        self.horizon = horizon
+        self.start_time = start_time
+        os.makedirs(path, exist_ok=True)
+        self._times = open(os.path.join(path, 'times.bin'), 'wb')
+        self._amounts = open(os.path.join(path, 'amounts.bin'), 'wb')
+        self._offsets = [0]
+
+    def add(self, times, amounts):
+        """
+        Add one scenario. times are minutes since the scenario start, amounts
+        are the meal sizes in grams.
+        """
+        times = np.asarray(times, dtype=TIME_DTYPE)
+        amounts = np.asarray(amounts, dtype=AMOUNT_DTYPE)
+        if times.shape != amounts.shape:
+            raise ValueError('times and amounts must have the same length')
+        order = np.argsort(times, kind='stable')
+        self._times.write(times[order].tobytes())
+        self._amounts.write(amounts[order].tobytes())
+        self._offsets.append(self._offsets[-1] + len(times))
+
+    def add_meal_vectors(self, meals):
+        """
+        Add dense per-minute meal vectors, one scenario per row.
+        """
+        for row in np.atleast_2d(meals):
+            times = np.flatnonzero(row)
+            self.add(times, row[times])
+
+    def add_scenario(self, scenario):
+        """
+        Add a scenario object that implements meal_vector, e.g. a
+        CustomScenario built from real meal data. Needs the bank horizon.
+        """
+        if self.horizon is None:
+            raise ValueError('Adding scenario objects requires a horizon.')
+        self.add_meal_vectors(scenario.meal_vector(self.horizon))
+
+    def close(self):
+        self._times.close()
+        self._amounts.close()
+        np.asarray(self._offsets, dtype=OFFSET_DTYPE).tofile(
+            os.path.join(self.path, 'offsets.bin'))
+        meta = {
+            'version': BANK_VERSION,
+            'n_scenarios': len(self._offsets) - 1,
+            'horizon': self.horizon,
+            'start_time': (self.start_time.isoformat()
+                           if self.start_time is not None else None),
+        }
+        with open(os.path.join(self.path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        logger.info('Wrote {} scenarios to {}'.format(meta['n_scenarios'],
+                                                      self.path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ScenarioBank(object):
+    """
+    Read-only, memory-mapped view of a scenario bank.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._open()
+
+    def _open(self):
+        with open(os.path.join(self.path, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta['version'] != BANK_VERSION:
+            raise ValueError('Unsupported scenario bank version {}'.format(
+                meta['version']))
+        self.horizon = meta['horizon']
+        self.start_time = (datetime.fromisoformat(meta['start_time'])
+                           if meta['start_time'] is not None else None)
+        self._offsets = _memmap(self.path, 'offsets.bin', OFFSET_DTYPE)
+        self._times = _memmap(self.path, 'times.bin', TIME_DTYPE)
+        self._amounts = _memmap(self.path, 'amounts.bin', AMOUNT_DTYPE)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        """
+        Meal times (minutes since start) and amounts (g) of scenario i.
+        """
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('scenario index out of range')
+        lo, hi = self._offsets[i], self._offsets[i + 1]
+        return self._times[lo:hi], self._amounts[lo:hi]
+
+    def meal_vector(self, i, horizon=None):
+        """
+        Dense per-minute meal vector of scenario i. Meals that share a
+        minute are added up.
+        """
+        if horizon is None:
+            horizon = self.horizon
+        if isinstance(horizon, timedelta):
+            horizon = horizon.total_seconds() / 60.0
+        times, amounts = self[i]
+        meals = np.zeros(int(np.ceil(horizon)))
+        keep = times < len(meals)
+        np.add.at(meals, times[keep], amounts[keep])
+        return meals
+
+    def scenario(self, i, start_time=None):
+        """
+        Scenario i as a CustomScenario starting at start_time (defaults to
+        the start time recorded in the bank).
+        """
+        if start_time is None:
+            start_time = self.start_time
+        if start_time is None:
+            raise ValueError('The bank has no start time, pass start_time.')
+        times, amounts = self[i]
+        return CustomScenario(
+            start_time=start_time,
+            scenario=[(timedelta(minutes=int(t)), float(m))
+                      for t, m in zip(times, amounts)])
+
+    @classmethod
+    def from_random(cls, path, n_scenarios, start_time, sim_time, seed=None,
+                    chunk_size=1000):
+        """
+        Fill a new bank with RandomScenario meals, generated chunk by chunk
+        with create_meal_vectors. The bank only depends on seed and
+        chunk_size.
+        """
+        n_chunks = int(np.ceil(n_scenarios / chunk_size))
+        seeds = np.random.RandomState(seed).randint(2**31, size=n_chunks)
+        with ScenarioBankWriter(path, horizon=sim_time,
+                                start_time=start_time) as writer:
+            for k, chunk_seed in enumerate(seeds):
+                n = min(chunk_size, n_scenarios - k * chunk_size)
+                writer.add_meal_vectors(
+                    create_meal_vectors(start_time, sim_time, n_patients=n,
+                                        seed=chunk_seed))
+        return cls(path)
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.path = state['path']
+        self._open()
+
+
+def _memmap(path, filename, dtype):
+    filename = os.path.join(path, filename)
+    if os.path.getsize(filename) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(filename, dtype=dtype, mode='r')
@@ -2,18 +2,48 @@ from simglucose.simulation.scenario import Action, Scenario
 import numpy as np
 from scipy.stats import truncnorm
 from datetime import datetime
+from datetime import timedelta
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Probability of taking each meal
+# [breakfast, snack1, lunch, snack2, dinner, snack3]
+MEAL_PROB = np.array([0.95, 0.3, 0.95, 0.3, 0.95, 0.3])
+MEAL_TIME_LB = np.array([5, 9, 10, 14, 16, 20]) * 60
+MEAL_TIME_UB = np.array([9, 10, 14, 16, 20, 23]) * 60
+MEAL_TIME_MU = np.array([7, 9.5, 12, 15, 18, 21.5]) * 60
+MEAL_TIME_SIGMA = np.array([60, 30, 60, 30, 60, 30])
+# This is the baseline amounts of carbs for each meal
+MEAL_AMOUNT_MU = np.array([45, 10, 70, 10, 80, 10])
+# This is the std amounts for carbs for each meal. We try to increase the
+# stdDev to get higher variation
+MEAL_AMOUNT_SIGMA = np.array([10, 5, 10, 5, 10, 5])
+# MEAL_AMOUNT_SIGMA = np.array([30, 30, 50, 30, 60, 30])
+
+MINUTES_PER_DAY = 24 * 60
+
 
 class RandomScenario(Scenario):
-    def __init__(self, start_time, seed=None):
+    def __init__(self, start_time, seed=None, sim_time=None):
+        '''
+        start_time - a datetime.datetime object.
+        seed       - random seed of the meal generator.
+        sim_time   - a datetime.timedelta. If given, the meals of the whole
+                     horizon are drawn at once in reset (see
+                     create_meal_vectors) and get_action becomes an array
+                     lookup. If None (default), a new one day scenario is
+                     drawn every midnight.
+        '''
         Scenario.__init__(self, start_time=start_time)
+        self.sim_time = sim_time
         self.seed = seed
 
     def get_action(self, t):
         # t must be datetime.datetime object
+        if self.sim_time is not None:
+            return self._get_vectorized_action(t)
+
         delta_t = t - datetime.combine(t.date(), datetime.min.time())
         t_sec = delta_t.total_seconds()
 
@@ -30,25 +60,18 @@ class RandomScenario(Scenario):
         else:
             return Action(meal=0)
 
+    def _get_vectorized_action(self, t):
+        k = int((t - self.start_time).total_seconds() // 60)
+        if 0 <= k < len(self.meals):
+            return Action(meal=self.meals[k])
+        return Action(meal=0)
+
     def create_scenario(self):
         scenario = {'meal': {'time': [], 'amount': []}}
 
-        # Probability of taking each meal
-        # [breakfast, snack1, lunch, snack2, dinner, snack3]
-        prob = [0.95, 0.3, 0.95, 0.3, 0.95, 0.3]
-        time_lb = np.array([5, 9, 10, 14, 16, 20]) * 60
-        time_ub = np.array([9, 10, 14, 16, 20, 23]) * 60
-        time_mu = np.array([7, 9.5, 12, 15, 18, 21.5]) * 60
-        time_sigma = np.array([60, 30, 60, 30, 60, 30])
-        amount_mu = [45, 10, 70, 10, 80, 10]  # This is the baseline amounts of carbs for each meal
-
-        # This is the std amounts for carbs for each meal. We try to increase the stdDev to get higher variation
-        amount_sigma = [10, 5, 10, 5, 10, 5]
-        # amount_sigma = [30, 30, 50, 30, 60, 30]
-
-        for p, tlb, tub, tbar, tsd, mbar, msd in zip(prob, time_lb, time_ub,
-                                                     time_mu, time_sigma,
-                                                     amount_mu, amount_sigma):
+        for p, tlb, tub, tbar, tsd, mbar, msd in zip(
+                MEAL_PROB, MEAL_TIME_LB, MEAL_TIME_UB, MEAL_TIME_MU,
+                MEAL_TIME_SIGMA, MEAL_AMOUNT_MU, MEAL_AMOUNT_SIGMA):
             if self.random_gen.rand() < p:
                 tmeal = np.round(
                     truncnorm.rvs(a=(tlb - tbar) / tsd,
@@ -62,7 +85,26 @@ class RandomScenario(Scenario):
 
         return scenario
 
+    def meal_vector(self, horizon, sample_time=1):
+        """
+        Dense meal vector over the horizon starting at start_time. Only
+        available when sim_time is given.
+        """
+        if self.sim_time is None:
+            raise ValueError('meal_vector requires RandomScenario(sim_time=...)')
+        if isinstance(horizon, timedelta):
+            horizon = horizon.total_seconds() / 60.0
+        n = int(np.ceil(horizon / sample_time))
+        meals = np.zeros(n)
+        grid = self.meals[::int(sample_time)][:n]
+        meals[:len(grid)] = grid
+        return meals
+
     def reset(self):
+        if self.sim_time is not None:
+            self.meals = create_meal_vectors(self.start_time, self.sim_time,
+                                             seed=self.seed)[0]
+            return
         self.random_gen = np.random.RandomState(self.seed)
         self.scenario = self.create_scenario()
 
@@ -76,9 +118,74 @@ class RandomScenario(Scenario):
         self.reset()
 
 
+def sample_meals(random_gen, size=()):
+    """
+    Draw the meals of many days in one go.
+    ----
+    Inputs:
+    random_gen - a numpy.random.RandomState.
+    size       - leading shape of the draw, e.g. (n_patients, n_days).
+    ----
+    Outputs:
+    taken  - boolean array of shape size + (6,), whether each meal is taken.
+    time   - meal time in minutes since midnight, same shape.
+    amount - meal size in grams, same shape.
+    """
+    shape = tuple(size) + (len(MEAL_PROB), )
+    taken = random_gen.rand(*shape) < MEAL_PROB
+    time = np.round(
+        truncnorm.rvs(a=(MEAL_TIME_LB - MEAL_TIME_MU) / MEAL_TIME_SIGMA,
+                      b=(MEAL_TIME_UB - MEAL_TIME_MU) / MEAL_TIME_SIGMA,
+                      loc=MEAL_TIME_MU,
+                      scale=MEAL_TIME_SIGMA,
+                      size=shape,
+                      random_state=random_gen))
+    amount = np.maximum(
+        np.round(random_gen.normal(MEAL_AMOUNT_MU, MEAL_AMOUNT_SIGMA,
+                                   size=shape)), 0)
+    return taken, time, amount
+
+
+def create_meal_vectors(start_time, sim_time, n_patients=1, seed=None):
+    """
+    Generate random meal scenarios for several patients and days with one
+    vectorized draw. The meal distribution is the one of RandomScenario, but
+    the random stream differs from the one day at a time generation.
+    ----
+    Inputs:
+    start_time - a datetime.datetime object.
+    sim_time   - a datetime.timedelta object, or the horizon in minutes.
+    n_patients - number of independent scenarios.
+    seed       - random seed. The same seed always gives the same meals.
+    ----
+    Output:
+    meals - array of shape (n_patients, minutes), meals[p, k] is the meal (g)
+            of patient p at start_time + k minutes.
+    """
+    if isinstance(sim_time, timedelta):
+        sim_time = sim_time.total_seconds() / 60.0
+    horizon = int(np.ceil(sim_time))
+    midnight = datetime.combine(start_time.date(), datetime.min.time())
+    start_min = int((start_time - midnight).total_seconds() // 60)
+    n_days = int(np.ceil((start_min + horizon) / MINUTES_PER_DAY))
+
+    random_gen = np.random.RandomState(seed)
+    taken, time, amount = sample_meals(random_gen, (n_patients, n_days))
+    offset = (time + MINUTES_PER_DAY * np.arange(n_days)[:, None] -
+              start_min).astype(int)
+
+    meals = np.zeros((n_patients, horizon))
+    # Walk the meal slots backwards so that, like RandomScenario, the first
+    # meal wins when two meals fall on the same minute.
+    for k in reversed(range(len(MEAL_PROB))):
+        mask = taken[..., k] & (offset[..., k] >= 0) & (offset[..., k] < horizon)
+        p, d = np.nonzero(mask)
+        meals[p, offset[p, d, k]] = amount[p, d, k]
+    return meals
+
+
 if __name__ == '__main__':
     from datetime import time
-    from datetime import timedelta
     import copy
     now = datetime.now()
     t0 = datetime.combine(now.date(), time(6, 0, 0, 0))
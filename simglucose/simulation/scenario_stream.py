@@ -0,0 +1,129 @@
+from simglucose.simulation.scenario import Action, Scenario
+from collections import deque
+import numpy as np
+import pandas as pd
+import logging
+import os
+
+parquet = True
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    parquet = False
+
+logger = logging.getLogger(__name__)
+
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+
+
+class StreamScenario(Scenario):
+    """
+    A scenario that streams meals from a large CSV or Parquet file in time
+    order, so that multi-year meal logs can drive a simulation without being
+    loaded into memory. At most chunksize meals are buffered at a time.
+    """
+    def __init__(self, start_time, path, time_col='time', meal_col='meal',
+                 chunksize=10000):
+        '''
+        start_time - a datetime.datetime object.
+        path       - a CSV file, or a Parquet file (.parquet/.pq, needs
+                     pyarrow).
+        time_col   - column with the meal times. Datetimes (or strings parsed
+                     as datetimes) are absolute times, numbers are hours
+                     since start_time like in CustomScenario. Times are
+                     rounded to the minute and must be non-decreasing.
+        meal_col   - column with the meal sizes (g). Meals falling on the
+                     same minute are added up.
+        chunksize  - number of rows read from the file at a time.
+        '''
+        Scenario.__init__(self, start_time=start_time)
+        self.path = path
+        self.time_col = time_col
+        self.meal_col = meal_col
+        self.chunksize = chunksize
+        self.reset()
+
+    def get_action(self, t):
+        t_min = (t - self.start_time).total_seconds() / 60.0
+        while True:
+            if not self._buffer and not self._fill():
+                return Action(meal=0)
+            meal_min, meal = self._buffer[0]
+            if meal_min < t_min:
+                # the simulation has moved past this meal
+                self._buffer.popleft()
+                continue
+            if meal_min == t_min:
+                return Action(meal=meal)
+            return Action(meal=0)
+
+    def _fill(self):
+        """
+        Read chunks until the buffer has a meal or the file is exhausted.
+        The last meal read is held back until a later minute is read, as the
+        next chunk may add to it.
+        """
+        for chunk in self._reader:
+            minutes, meals = self._parse_chunk(chunk)
+            for t_min, meal in zip(minutes, meals):
+                if self._last_meal is not None and \
+                        self._last_meal[0] == t_min:
+                    self._last_meal = (t_min, self._last_meal[1] + meal)
+                    continue
+                if self._last_meal is not None:
+                    self._buffer.append(self._last_meal)
+                self._last_meal = (t_min, meal)
+            if self._buffer:
+                return True
+        if self._last_meal is not None:
+            self._buffer.append(self._last_meal)
+            self._last_meal = None
+            return True
+        return False
+
+    def _parse_chunk(self, chunk):
+        times = chunk[self.time_col]
+        if pd.api.types.is_numeric_dtype(times):
+            minutes = np.round(times.to_numpy(dtype=float) * 60.0)
+        else:
+            delta = pd.to_datetime(times) - pd.Timestamp(self.start_time)
+            minutes = np.round(delta / pd.Timedelta(minutes=1)).to_numpy()
+        meals = chunk[self.meal_col].to_numpy(dtype=float)
+
+        keep = meals > 0
+        minutes, meals = minutes[keep], meals[keep]
+        if len(minutes) == 0:
+            return minutes, meals
+        if np.any(np.diff(minutes) < 0) or minutes[0] < self._last_minute:
+            raise ValueError('Meals in {} are not in time order.'.format(
+                self.path))
+        self._last_minute = minutes[-1]
+        return minutes, meals
+
+    def _open_reader(self):
+        columns = [self.time_col, self.meal_col]
+        if os.path.splitext(self.path)[1].lower() in PARQUET_EXTENSIONS:
+            if not parquet:
+                raise ImportError('Reading Parquet meal logs needs pyarrow.')
+            batches = pq.ParquetFile(self.path).iter_batches(
+                batch_size=self.chunksize, columns=columns)
+            return (batch.to_pandas() for batch in batches)
+        return pd.read_csv(self.path, usecols=columns,
+                           chunksize=self.chunksize)
+
+    def reset(self):
+        self._reader = iter(self._open_reader())
+        self._buffer = deque()
+        self._last_meal = None
+        self._last_minute = -np.inf
+
+    def __getstate__(self):
+        # Open file readers cannot be pickled, a copy restarts the stream.
+        state = self.__dict__.copy()
+        for key in ('_reader', '_buffer', '_last_meal', '_last_minute'):
+            state.pop(key)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.reset()
@@ -0,0 +1,184 @@
+"""
+Cost-aware scheduling of heterogeneous batches. Runs are dispatched longest
+first from a shared queue that idle workers pull from, so that the slowest
+runs start early and do not leave the other workers idle at the end of the
+batch. Results stream back as runs complete, and their timings refine the
+cost estimates of the next runs and batches.
+
+    scheduler = CostAwareScheduler(ProcessExecutor(max_workers=8))
+    for i, results in scheduler.imap(sim_instances):
+        ...
+"""
+from simglucose.simulation.sim_engine import sim
+from simglucose.simulation.executors import SerialExecutor, is_failure
+import pandas as pd
+import json
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Wall time per simulated minute (s) of one run on one core, a rough prior
+# until runs of the controller are timed
+DEFAULT_RATES = {
+    'BBController': 0.006,
+    'PIDController': 0.008,
+    'DistilledController': 0.01,
+    'LoopController': 0.1,
+    'MPCController': 0.08,
+}
+DEFAULT_RATE = 0.01
+
+
+class CostModel(object):
+    """
+    Estimates the wall time of a run as its simulated minutes times the
+    rate of its controller class. Rates are an exponential moving average
+    of the observed rates, starting from DEFAULT_RATES.
+    """
+    def __init__(self, rates=None, default_rate=DEFAULT_RATE, smoothing=0.3,
+                 path=None):
+        '''
+        rates        - dict mapping controller class names to the wall time
+                       per simulated minute (s), updating DEFAULT_RATES.
+        default_rate - rate of the other controllers.
+        smoothing    - weight of a new observation in the moving average.
+        path         - optional JSON file the rates are loaded from and saved
+                       to, to carry them over from batch to batch.
+        '''
+        self.rates = dict(DEFAULT_RATES)
+        self.rates.update(rates or {})
+        self.default_rate = default_rate
+        self.smoothing = smoothing
+        self.path = path
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                self.rates.update(json.load(f))
+
+    @staticmethod
+    def controller_name(sim_object):
+        if hasattr(sim_object, 'build'):
+            # a RunSpec, controller is a class or a factory
+            return getattr(sim_object.controller, '__name__',
+                           type(sim_object.controller).__name__)
+        return type(sim_object.controller).__name__
+
+    @staticmethod
+    def sim_minutes(sim_object):
+        return sim_object.sim_time.total_seconds() / 60
+
+    def rate(self, sim_object):
+        return self.rates.get(self.controller_name(sim_object),
+                              self.default_rate)
+
+    def estimate(self, sim_object):
+        """
+        Estimated wall time of the run (s).
+        """
+        return self.rate(sim_object) * self.sim_minutes(sim_object)
+
+    def observe(self, sim_object, seconds, minutes=None):
+        """
+        Refine the rate of the controller of a run that took seconds.
+        minutes - the minutes actually simulated, less than the sim_time of
+                  a run ended early by a stop condition. The sim_time by
+                  default.
+        """
+        if minutes is None:
+            minutes = self.sim_minutes(sim_object)
+        if minutes <= 0:
+            return
+        name = self.controller_name(sim_object)
+        observed = seconds / minutes
+        if name in self.rates:
+            observed = (self.smoothing * observed +
+                        (1 - self.smoothing) * self.rates[name])
+        self.rates[name] = observed
+
+    def save(self):
+        with open(self.path, 'w') as f:
+            json.dump(self.rates, f, indent=2, sort_keys=True)
+
+
+class CostAwareScheduler(object):
+    def __init__(self, executor=None, cost_model=None):
+        '''
+        executor   - a simglucose.simulation.executors.Executor, a
+                     SerialExecutor by default. Use chunksize=1 for the
+                     runs to be pulled one at a time.
+        cost_model - a CostModel, refined with the timings of the runs.
+        '''
+        self.executor = executor or SerialExecutor()
+        self.cost_model = cost_model or CostModel()
+
+    def order(self, sim_instances):
+        """
+        Indices of the runs, longest estimated first.
+        """
+        costs = [self.cost_model.estimate(s) for s in sim_instances]
+        return sorted(range(len(costs)), key=lambda i: -costs[i])
+
+    def imap(self, sim_instances, fn=sim):
+        """
+        (index, results) of every run as soon as it completes. Failed runs
+        are RunFailure.
+        """
+        sim_instances = list(sim_instances)
+        order = self.order(sim_instances)
+        tic = time.time()
+        for i, result in self.executor.imap(_Timed(fn), sim_instances, order):
+            if is_failure(result):
+                yield i, result
+                continue
+            result, seconds = result
+            if seconds is not None:
+                self.cost_model.observe(sim_instances[i], seconds,
+                                        _simulated_minutes(result))
+            yield i, result
+        logger.info('Batch of {} runs took {} seconds.'.format(
+            len(sim_instances), time.time() - tic))
+        if self.cost_model.path is not None:
+            self.cost_model.save()
+
+    def map(self, sim_instances, fn=sim):
+        """
+        The results of the runs, in order, like sim_engine.batch_sim.
+        """
+        sim_instances = list(sim_instances)
+        results = [None] * len(sim_instances)
+        for i, result in self.imap(sim_instances, fn):
+            results[i] = result
+        return results
+
+
+class _Timed(object):
+    """
+    fn returning its result and its wall time, picklable if fn is. The time
+    is None when fn is ResultCache.sim and the result was cached, as it
+    says nothing about the cost of a run.
+    """
+    def __init__(self, fn):
+        self.fn = fn
+
+    def __call__(self, item):
+        # the cache (if any) counts its hits in this process
+        cache = getattr(self.fn, '__self__', None)
+        hits = getattr(cache, 'hits', None)
+        tic = time.perf_counter()
+        result = self.fn(item)
+        seconds = time.perf_counter() - tic
+        if hits is not None and cache.hits > hits:
+            seconds = None
+        return result, seconds
+
+
+def _simulated_minutes(results):
+    """
+    Minutes covered by the results of a run, None if they are not a time
+    indexed DataFrame (e.g. the results of a custom fn).
+    """
+    index = getattr(results, 'index', None)
+    if not isinstance(index, pd.DatetimeIndex) or len(index) == 0:
+        return None
+    return (index[-1] - index[0]).total_seconds() / 60
@@ -0,0 +1,64 @@
+"""
+Reproducible seeds for batches of runs. Every run gets statistically
+independent seeds for the patient initial state, the sensor noise and the
+scenario, spawned with numpy.random.SeedSequence from one root seed and the
+index of the run. They depend on nothing else, so the results of a run are
+the same whatever the number of workers or the order runs are scheduled in.
+
+    specs = seed_specs([RunSpec(name, sim_time, BBController)
+                        for name in patient_names], root_seed=42)
+
+The components keep their numpy.random.RandomState generators, and are
+given seeds drawn from the spawned sequences.
+"""
+from collections import namedtuple
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+STREAMS = ('patient', 'sensor', 'scenario')
+
+
+class RunSeeds(namedtuple('run_seeds', STREAMS)):
+    """
+    Seeds of the random streams of a run, integers below 2**32 that
+    numpy.random.RandomState accepts.
+    """
+    __slots__ = ()
+
+
+def _seed(seed_sequence):
+    return int(seed_sequence.generate_state(1, dtype=np.uint32)[0])
+
+
+def run_seeds(root_seed, index):
+    """
+    The seeds of run number index of a batch seeded with root_seed. The
+    same as spawn_seeds(root_seed, n)[index] for any n > index.
+    root_seed - an integer, or a sequence of integers.
+    """
+    run_sequence = np.random.SeedSequence(root_seed, spawn_key=(index, ))
+    return RunSeeds(*[_seed(s) for s in run_sequence.spawn(len(STREAMS))])
+
+
+def spawn_seeds(root_seed, n_runs):
+    """
+    The seeds of n_runs runs, see run_seeds.
+    """
+    return [run_seeds(root_seed, index) for index in range(n_runs)]
+
+
+def seed_specs(specs, root_seed):
+    """
+    simglucose.simulation.run_spec.RunSpec instances with the seeds of their
+    index in specs. The patient seed is only used with random_init_bg.
+    """
+    seeded = []
+    for spec, seeds in zip(specs, spawn_seeds(root_seed, len(specs))):
+        patient_kwargs = dict(spec.patient_kwargs or {}, seed=seeds.patient)
+        seeded.append(
+            spec._replace(scenario_seed=seeds.scenario,
+                          sensor_seed=seeds.sensor,
+                          patient_kwargs=patient_kwargs))
+    return seeded
@@ -0,0 +1,170 @@
+from simglucose.simulation.executors import SerialExecutor, is_failure
+from simglucose.simulation.run_spec import _sensor_params
+import numpy as np
+import pandas as pd
+import json
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+RESULT_COLUMNS = [
+    'BG', 'CGM', 'CHO', 'basal', 'bolus', 'insulin', 'LBGI', 'HBGI', 'Risk'
+]
+
+
+class SharedResults(object):
+    """
+    Trajectories of many runs in one preallocated memory-mapped array of
+    shape (n_runs, n_steps, n_columns), in a folder. Workers write their
+    run's rows in place, and the parent reads the whole cohort through the
+    page cache without unpickling or concatenating DataFrames.
+
+    The folder holds meta.json, values.npy (NaN where nothing was written),
+    lengths.npy (rows written per run), start_times.npy (datetime64[ns]) and
+    sample_times.npy.
+    """
+    def __init__(self, path, mode='r'):
+        '''
+        path - folder of the results, see create.
+        mode - 'r' to read, 'r+' to write.
+        '''
+        self.path = path
+        self.mode = mode
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        self.columns = meta['columns']
+        self.keys = meta['keys']
+        self.values = self._load('values.npy')
+        self.lengths = self._load('lengths.npy')
+        self.start_times = self._load('start_times.npy')
+        self.sample_times = self._load('sample_times.npy')
+
+    @classmethod
+    def create(cls, path, n_runs, n_steps, columns=RESULT_COLUMNS,
+               keys=None):
+        """
+        Allocate the arrays of n_runs runs of at most n_steps rows each.
+        keys are optional names of the runs, e.g. patient names.
+        """
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'columns': list(columns),
+                       'keys': list(keys) if keys is not None else None}, f)
+        shapes = {
+            'values.npy': ((n_runs, n_steps, len(columns)), np.float64),
+            'lengths.npy': ((n_runs, ), np.int64),
+            'start_times.npy': ((n_runs, ), 'datetime64[ns]'),
+            'sample_times.npy': ((n_runs, ), np.float64),
+        }
+        for filename, (shape, dtype) in shapes.items():
+            array = np.lib.format.open_memmap(os.path.join(path, filename),
+                                              mode='w+', dtype=dtype,
+                                              shape=shape)
+            array[...] = np.nan if filename == 'values.npy' else 0
+            array.flush()
+            del array
+        return cls(path, mode='r+')
+
+    def _load(self, filename):
+        return np.load(os.path.join(self.path, filename), mmap_mode=self.mode)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def write(self, i, df):
+        """
+        Write the results of run i, a DataFrame indexed by time as returned by
+        SimObj.results().
+        """
+        n = min(len(df), self.values.shape[1])
+        if n < len(df):
+            logger.warning('Run {} has {} rows, only {} fit.'.format(
+                i, len(df), n))
+        self.values[i, :n] = df[self.columns].to_numpy(dtype=float)[:n]
+        index = pd.DatetimeIndex(df.index)
+        self.start_times[i] = index[0].to_datetime64()
+        self.sample_times[i] = (
+            (index[1] - index[0]).total_seconds() / 60 if n > 1 else 0)
+        self.lengths[i] = n
+        for array in (self.values, self.lengths, self.start_times,
+                      self.sample_times):
+            array.flush()
+
+    def column(self, name):
+        """
+        View of a column for all the runs, shape (n_runs, n_steps).
+        """
+        return self.values[:, :, self.columns.index(name)]
+
+    def run(self, i):
+        """
+        Run i as a DataFrame backed by the memory map.
+        """
+        n = self.lengths[i]
+        index = pd.DatetimeIndex(
+            self.start_times[i] + np.arange(n) *
+            np.timedelta64(int(self.sample_times[i] * 60e9), 'ns'),
+            name='Time')
+        return pd.DataFrame(self.values[i, :n], index=index,
+                            columns=self.columns, copy=False)
+
+    def to_frame(self):
+        """
+        All the written runs in one DataFrame keyed like the one
+        user_interface.simulate builds. Unlike column and run, this copies.
+        """
+        runs = [i for i in range(len(self)) if self.lengths[i] > 0]
+        keys = self.keys if self.keys is not None else list(range(len(self)))
+        return pd.concat([self.run(i) for i in runs],
+                         keys=[keys[i] for i in runs])
+
+
+def _sim_into(args):
+    """
+    Run a SimObj or RunSpec and write its results to the shared arrays.
+    Executed in the workers, returns the number of rows written.
+    """
+    sim_object, i, path = args
+    if hasattr(sim_object, 'build'):
+        sim_object = sim_object.build()
+    sim_object.simulate()
+    df = sim_object.results()
+    SharedResults(path, mode='r+').write(i, df)
+    return len(df)
+
+
+def n_steps(sim_object):
+    """
+    Number of result rows of a SimObj or RunSpec, including the initial one.
+    """
+    if hasattr(sim_object, 'build'):
+        sample_time = _sensor_params(sim_object.sensor_name).sample_time
+    else:
+        sample_time = sim_object.env.sample_time
+    minutes = sim_object.sim_time.total_seconds() / 60
+    return int(np.ceil(minutes / sample_time)) + 1
+
+
+def batch_sim_shared(sim_instances, path, executor=None, keys=None):
+    """
+    Like sim_engine.batch_sim, but the runs write their trajectories into
+    SharedResults at path instead of returning DataFrames.
+    ----
+    Output:
+    results  - the SharedResults, read-only.
+    failures - dict mapping the indices of the failed runs to their
+               RunFailure.
+    """
+    sim_instances = list(sim_instances)
+    executor = executor or SerialExecutor()
+    SharedResults.create(path, len(sim_instances),
+                         max(n_steps(s) for s in sim_instances), keys=keys)
+    statuses = executor.map(_sim_into,
+                            [(s, i, path)
+                             for i, s in enumerate(sim_instances)])
+    failures = {i: r for i, r in enumerate(statuses) if is_failure(r)}
+    if failures:
+        logger.error('{} of {} simulations failed.'.format(
+            len(failures), len(sim_instances)))
+    return SharedResults(path), failures
@@ -1,16 +1,24 @@
+from simglucose.simulation.profiler import LatencyProfiler, no_timer
+from simglucose.simulation.sinks import CSVSink
+from simglucose.simulation.stop_conditions import StopCondition, SIM_TIME
+from simglucose.simulation.stop_conditions import check
+from collections import Counter
 import logging
 import time
 import os
 
-pathos = True
-try:
-    from pathos.multiprocessing import ProcessPool as Pool
-except ImportError:
+from simglucose.simulation.executors import PathosExecutor, SerialExecutor
+from simglucose.simulation.executors import is_failure
+from simglucose.simulation.executors import pathos
+
+if not pathos:
     print('You could install pathos to enable parallel simulation.')
-    pathos = False
 
 logger = logging.getLogger(__name__)
 
+# subfolder of the results the latency profiles are saved to
+PROFILE_FOLDER = 'profiles'
+
 
 class SimObj(object):
     def __init__(self,
@@ -18,35 +26,116 @@ class SimObj(object):
                  controller,
                  sim_time,
                  animate=True,
-                 path=None):
+                 path=None,
+                 profile=False,
+                 sink=None,
+                 run_id=None,
+                 stop=None):
+        '''
+        profile - time every controller.policy, env.step and patient ODE
+                  call, see simglucose.simulation.profiler. The summary is
+                  available as self.profiler and saved with the results, as
+                  profiles/<run_name>_latency.csv.
+        sink    - a simglucose.simulation.sinks sink the results are saved
+                  to, a CSVSink writing to path by default.
+        run_id  - optional id appended to the patient name in the saved
+                  file names, e.g. to run a patient on several scenarios.
+                  batch_sim numbers the runs without one that would be
+                  saved under the same name.
+        stop    - a simglucose.simulation.stop_conditions.StopCondition, or a
+                  list of them, ending the simulation before sim_time. The
+                  reason is self.termination_reason and the
+                  'termination_reason' of the attrs of the results.
+        '''
         self.env = env
         self.controller = controller
         self.sim_time = sim_time
         self.animate = animate
         self._ctrller_kwargs = None
         self.path = path
+        self.profiler = LatencyProfiler() if profile else None
+        self.sink = sink
+        self.run_id = run_id
+        if stop is None:
+            stop = []
+        elif isinstance(stop, StopCondition):
+            stop = [stop]
+        self.stop = list(stop)
+        self.termination_reason = None
 
     def simulate(self):
+        if getattr(self.controller, 'needs_patient_snapshot', False):
+            self.env.snapshots = True
         self.controller.reset()
+        for condition in self.stop:
+            condition.reset()
+        self.termination_reason = SIM_TIME
         obs, reward, done, info = self.env.reset()
-        tic = time.time()
-        while self.env.time < self.env.scenario.start_time + self.sim_time:
-            if self.animate:
-                self.env.render()
-            action = self.controller.policy(obs, reward, done, **info)
-            obs, reward, done, info = self.env.step(action)
-        toc = time.time()
-        logger.info('Simulation took {} seconds.'.format(toc - tic))
+        profiler = self.profiler
+        if profiler is None:
+            timer = no_timer
+        else:
+            profiler.reset()
+            self.env.profiler = profiler
+            timer = profiler.time
+        policy_section = '{}.policy'.format(type(self.controller).__name__)
+        step_section = '{}.step'.format(type(self.env).__name__)
+        start_minutes = self.env.patient.t
+        tic = time.perf_counter()
+        try:
+            while self.env.time < self.env.scenario.start_time + self.sim_time:
+                if self.animate:
+                    with timer('render'):
+                        self.env.render()
+                with timer(policy_section):
+                    action = self.controller.policy(obs, reward, done, **info)
+                with timer(step_section):
+                    obs, reward, done, info = self.env.step(action)
+                if self.stop and self._stopped(obs, reward, done, info):
+                    break
+        finally:
+            wall_time = time.perf_counter() - tic
+            if profiler is not None:
+                self.env.profiler = None
+                profiler.wall_time = wall_time
+                profiler.sim_minutes = self.env.patient.t - start_minutes
+        logger.info('Simulation took {} seconds.'.format(wall_time))
+        if profiler is not None:
+            logger.info(str(profiler))
+
+    def _stopped(self, obs, reward, done, info):
+        reason = check(self.stop, obs, reward, done, info)
+        if reason is None:
+            return False
+        self.termination_reason = reason
+        logger.info('Simulation of {} stopped at {}: {}.'.format(
+            self.env.patient.name, self.env.time, reason))
+        return True
 
     def results(self):
-        return self.env.show_history()
+        df = self.env.show_history()
+        df.attrs['termination_reason'] = self.termination_reason
+        return df
 
-    def save_results(self):
-        df = self.results()
-        if not os.path.isdir(self.path):
-            os.makedirs(self.path)
-        filename = os.path.join(self.path, str(self.env.patient.name) + '.csv')
-        df.to_csv(filename)
+    @property
+    def run_name(self):
+        return _run_name(self.env.patient.name, self.run_id)
+
+    def save_results(self, results=None):
+        '''
+        results - results to save instead of the ones of the last simulation,
+                  e.g. cached ones.
+        '''
+        sink = self.sink if self.sink is not None else CSVSink(self.path)
+        sink.write(self.run_name,
+                   self.results() if results is None else results)
+        if self.profiler is not None and results is None:
+            # out of the way of the results globbed as '*#*.csv'
+            folder = os.path.join(sink.path, PROFILE_FOLDER)
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            self.profiler.save(
+                os.path.join(folder, self.run_name + '_latency.csv'))
 
     def reset(self):
         self.env.reset()
@@ -54,23 +143,100 @@ class SimObj(object):
 
 
 def sim(sim_object):
+    '''
+    sim_object - a SimObj, or a simglucose.simulation.run_spec.RunSpec that
+                 is built into one in the current process.
+    '''
+    if hasattr(sim_object, 'build'):
+        sim_object = sim_object.build()
     print("Process ID: {}".format(os.getpid()))
     print('Simulation starts ...')
     sim_object.simulate()
-    sim_object.save_results()
+    if sim_object.path is not None or sim_object.sink is not None:
+        sim_object.save_results()
     print('Simulation Completed!')
     return sim_object.results()
 
 
-def batch_sim(sim_instances, parallel=False):
+def batch_sim(sim_instances,
+              parallel=False,
+              executor=None,
+              journal=None,
+              cache=None,
+              scheduler=None):
+    '''
+    Run every SimObj (or RunSpec) and return their results. A run that fails yields a
+    simglucose.simulation.executors.RunFailure instead of its results.
+
+    executor  - a simglucose.simulation.executors.Executor, to choose the
+                backend, worker count, chunksize, timeout and retries. By
+                default a PathosExecutor when parallel, else a
+                SerialExecutor.
+    journal   - a simglucose.simulation.journal.RunJournal, to record every
+                run as it completes and skip the completed runs when the
+                batch is run again.
+    cache     - a simglucose.simulation.cache.ResultCache, to return the
+                cached results of runs that were simulated before. Cannot be
+                combined with a journal.
+    scheduler - a simglucose.simulation.scheduler.CostAwareScheduler, to
+                dispatch the longest runs first, with the executor of the
+                scheduler. Cannot be combined with executor or a journal.
+    '''
+    if scheduler is not None and executor is not None:
+        raise ValueError('Give the executor to the scheduler, not to '
+                         'batch_sim.')
+    if journal is not None and (scheduler is not None or cache is not None):
+        raise ValueError('A journal cannot be combined with a scheduler or '
+                         'a cache.')
+    sim_instances = _number_same_names(sim_instances)
     tic = time.time()
-    if parallel and pathos:
-        with Pool() as p:
-            results = p.map(sim, sim_instances)
+    if executor is None:
+        if parallel and pathos:
+            executor = PathosExecutor()
+        else:
+            if parallel and not pathos:
+                print('Simulation is using single process even though parallel=True.')
+            executor = SerialExecutor()
+    if journal is not None:
+        results = journal.run(sim_instances, executor)
+    elif scheduler is not None:
+        results = scheduler.map(sim_instances,
+                                cache.sim if cache is not None else sim)
+    elif cache is not None:
+        results = executor.map(cache.sim, sim_instances)
     else:
-        if parallel and not pathos:
-            print('Simulation is using single process even though parallel=True.')
-        results = [sim(s) for s in sim_instances]
+        results = executor.map(sim, sim_instances)
     toc = time.time()
     print('Simulation took {} sec.'.format(toc - tic))
+    failures = [r for r in results if is_failure(r)]
+    if failures:
+        logger.error('{} of {} simulations failed, first error: {}'.format(
+            len(failures), len(results), failures[0].error))
     return results
+
+
+def _run_name(patient_name, run_id):
+    name = str(patient_name)
+    if run_id is not None:
+        name = '{}_{}'.format(name, run_id)
+    return name
+
+
+def _number_same_names(sim_instances):
+    """
+    The runs of a batch. The runs without a run_id that would be saved under
+    the same name as another run get their index in the batch as run_id.
+    """
+    sim_instances = list(sim_instances)
+    names = [
+        _run_name(s.patient_name, s.run_id) if hasattr(s, 'build') else
+        s.run_name for s in sim_instances
+    ]
+    counts = Counter(names)
+    for i, s in enumerate(sim_instances):
+        if counts[names[i]] > 1 and s.run_id is None:
+            if hasattr(s, 'build'):
+                sim_instances[i] = s._replace(run_id=i)
+            else:
+                s.run_id = i
+    return sim_instances
@@ -0,0 +1,233 @@
+"""
+Result sinks store the results of simulation runs, one DataFrame per run
+name. CSVSink writes the files SimObj.save_results always wrote, NPZSink
+and ParquetSink compressed columnar files that are smaller and much faster
+to write and read back. BackgroundWriter takes the writes off the
+simulation thread.
+
+    with BackgroundWriter(NPZSink(path)) as sink:
+        for sim_object in sim_instances:
+            sim_object.sink = sink
+            sim(sim_object)
+    df = NPZSink(path).read(sim_instances[0].run_name)
+"""
+from queue import Queue
+import threading
+import json
+import numpy as np
+import pandas as pd
+import os
+import logging
+
+parquet = True
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    parquet = False
+
+logger = logging.getLogger(__name__)
+
+
+class ResultSink(object):
+    """
+    Base sink, writing a file per run into a folder.
+    """
+    extension = None
+
+    def __init__(self, path):
+        '''
+        path - folder the results are written to, created if needed.
+        '''
+        self.path = path
+
+    def filename(self, name):
+        return os.path.join(self.path, '{}.{}'.format(name, self.extension))
+
+    def write(self, name, df):
+        os.makedirs(self.path, exist_ok=True)
+        self._write(self.filename(name), df)
+
+    def write_many(self, items):
+        """
+        Write a batch of (name, df) pairs.
+        """
+        for name, df in items:
+            self.write(name, df)
+
+    def read(self, name):
+        return self._read(self.filename(name))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CSVSink(ResultSink):
+    extension = 'csv'
+
+    def _write(self, filename, df):
+        df.to_csv(filename)
+
+    def _read(self, filename):
+        return pd.read_csv(filename, index_col=0, parse_dates=True)
+
+
+class NPZSink(ResultSink):
+    """
+    One compressed NumPy archive per run: the index as datetime64[ns], the
+    column names, the values as a single float array and the attrs of the
+    DataFrame as JSON.
+    """
+    extension = 'npz'
+
+    def __init__(self, path, compressed=True):
+        super(NPZSink, self).__init__(path)
+        self.compressed = compressed
+
+    def _write(self, filename, df):
+        save = np.savez_compressed if self.compressed else np.savez
+        save(filename,
+             index=pd.DatetimeIndex(df.index).to_numpy(dtype='datetime64[ns]'),
+             index_name=np.array(df.index.name or ''),
+             columns=np.array(df.columns, dtype=str),
+             values=df.to_numpy(dtype=float),
+             attrs=np.array(json.dumps(df.attrs)))
+
+    def _read(self, filename):
+        with np.load(filename) as data:
+            index = pd.DatetimeIndex(data['index'],
+                                     name=str(data['index_name']) or None)
+            df = pd.DataFrame(data['values'], index=index,
+                              columns=list(data['columns']))
+            if 'attrs' in data:
+                df.attrs = json.loads(str(data['attrs']))
+            return df
+
+
+class ParquetSink(ResultSink):
+    """
+    One Parquet file per run, needs pyarrow.
+    """
+    extension = 'parquet'
+
+    def __init__(self, path, compression='snappy'):
+        if not parquet:
+            raise ImportError('ParquetSink needs pyarrow.')
+        super(ParquetSink, self).__init__(path)
+        self.compression = compression
+
+    def _write(self, filename, df):
+        df.to_parquet(filename, compression=self.compression)
+
+    def _read(self, filename):
+        return pq.read_table(filename).to_pandas()
+
+
+class BackgroundWriter(object):
+    """
+    Wraps a sink and writes in a background thread, in batches of up to
+    batch_size runs. write returns as soon as the results are queued, and
+    blocks only when max_pending runs are waiting. An error of the sink is
+    raised by the next write, flush or close.
+
+    It lives in one process: give workers of a process pool a plain sink.
+    """
+    def __init__(self, sink, batch_size=16, max_pending=256):
+        self.sink = sink
+        self.batch_size = batch_size
+        self._queue = Queue(maxsize=max_pending)
+        self._error = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    @property
+    def path(self):
+        return self.sink.path
+
+    def filename(self, name):
+        return self.sink.filename(name)
+
+    def read(self, name):
+        self.flush()
+        return self.sink.read(name)
+
+    def write(self, name, df):
+        self._raise()
+        if self._closed:
+            raise ValueError('Write to a closed BackgroundWriter.')
+        self._queue.put((name, df))
+
+    def write_many(self, items):
+        for name, df in items:
+            self.write(name, df)
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get())
+            items = [item for item in batch if item is not None]
+            try:
+                if items:
+                    self.sink.write_many(items)
+            except Exception as e:
+                logger.error('Writing results failed: {!r}'.format(e))
+                self._error = e
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if len(items) < len(batch):
+                return
+
+    def _raise(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def flush(self):
+        """
+        Wait until every queued run is written.
+        """
+        self._queue.join()
+        self.sink.flush()
+        self._raise()
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+            self.sink.close()
+        self._raise()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+SINKS = {
+    'csv': CSVSink,
+    'npz': NPZSink,
+    'parquet': ParquetSink,
+}
+
+
+def get_sink(name, path, **kwargs):
+    """
+    A sink by name: 'csv', 'npz' or 'parquet'.
+    """
+    if name not in SINKS:
+        raise ValueError('Unknown sink {}, choose one of {}.'.format(
+            name, sorted(SINKS)))
+    return SINKS[name](path, **kwargs)
@@ -0,0 +1,94 @@
+"""
+Conditions that end a simulation before sim_time, e.g. to drop the runs of
+a controller screening that already failed. A condition is called after
+every step of the env and returns the reason to stop, or None.
+
+    s = SimObj(env, controller, sim_time, animate=False,
+               stop=[DoneStop(), ThresholdStop(low=54, duration=60)])
+    s.simulate()
+    s.results().attrs['termination_reason']  # e.g. 'hypo'
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+SIM_TIME = 'sim_time'
+
+
+class StopCondition(object):
+    def reset(self):
+        pass
+
+    def __call__(self, observation, reward, done, info):
+        raise NotImplementedError
+
+
+class DoneStop(StopCondition):
+    """
+    Stops when the env is done, i.e. BG is out of [10, 600] mg/dL.
+    """
+    def __call__(self, observation, reward, done, info):
+        return 'done' if done else None
+
+
+class ThresholdStop(StopCondition):
+    """
+    Stops when a value of the info of the env, BG by default, stays below
+    low or above high for duration minutes.
+    """
+    def __init__(self, low=None, high=None, duration=0, key='bg'):
+        '''
+        low, high - thresholds (mg/dL for BG), None for no threshold.
+        duration  - minutes the value must stay out of range, 0 stops at
+                    the first sample out of range.
+        key       - key of the info of the env.
+        '''
+        self.low = low
+        self.high = high
+        self.duration = duration
+        self.key = key
+        self.reset()
+
+    def reset(self):
+        self._since = None
+        self._reason = None
+
+    def __call__(self, observation, reward, done, info):
+        value = info[self.key]
+        if self.low is not None and value < self.low:
+            reason = 'hypo'
+        elif self.high is not None and value > self.high:
+            reason = 'hyper'
+        else:
+            reason = None
+        if reason != self._reason:
+            self._since = info['time']
+            self._reason = reason
+        if reason is None:
+            return None
+        minutes = (info['time'] - self._since).total_seconds() / 60
+        return reason if minutes >= self.duration else None
+
+
+class PredicateStop(StopCondition):
+    """
+    Stops when predicate(observation, reward, done, info) is true.
+    """
+    def __init__(self, predicate, reason='predicate'):
+        self.predicate = predicate
+        self.reason = reason
+
+    def __call__(self, observation, reward, done, info):
+        return self.reason if self.predicate(observation, reward, done,
+                                             info) else None
+
+
+def check(conditions, observation, reward, done, info):
+    """
+    The reason of the first condition met, or None.
+    """
+    for condition in conditions:
+        reason = condition(observation, reward, done, info)
+        if reason is not None:
+            return reason
+    return None
@@ -1,4 +1,5 @@
 from simglucose.simulation.sim_engine import SimObj, batch_sim
+from simglucose.simulation.executors import is_failure
 from simglucose.simulation.env import T1DSimEnv
 from simglucose.controller.basal_bolus_ctrller import BBController
 from simglucose.sensor.cgm import CGMSensor
@@ -6,6 +7,7 @@ from simglucose.actuator.pump import InsulinPump
 from simglucose.patient.t1dpatient import T1DPatient
 from simglucose.simulation.scenario_gen import RandomScenario
 from simglucose.simulation.scenario import CustomScenario
+from simglucose.simulation.seeding import run_seeds
 from simglucose.analysis.report import report
 import pandas as pd
 import copy
@@ -330,6 +332,8 @@ def simulate(
                  simglucose.scenario_gen.RandomScenario or
                  simglucose.scenario.CustomScenario to create a scenario object.
     controller - a simglucose.controller.Controller object.
+    cgm_seed   - root seed of the sensor noise, the sensor of every patient
+                 is seeded independently from it.
     start_time - a datetime.datetime object specifying the simulation start time.
     save_path  - a string representing the directory to save simulation results.
     animate    - switch for animation. True/False.
@@ -374,16 +378,19 @@ def simulate(
     if controller is None:
         controller = pick_controller()
 
-    cgm_sensor = CGMSensor.withName(cgm_name, seed=cgm_seed)
-
-    def local_build_env(pname):
+    def local_build_env(k, pname):
         patient = T1DPatient.withName(pname)
+        # every patient has its own sensor, with independent noise seeded
+        # from cgm_seed and the patient's index
+        cgm_sensor = CGMSensor.withName(cgm_name,
+                                        seed=run_seeds(cgm_seed, k).sensor)
         insulin_pump = InsulinPump.withName(insulin_pump_name)
         scen = copy.deepcopy(scenario)
         env = T1DSimEnv(patient, cgm_sensor, insulin_pump, scen)
         return env
 
-    envs = [local_build_env(p) for p in patient_names]
+    envs = [local_build_env(k, p) for k, p in enumerate(patient_names)]
+    cgm_sensor = envs[0].sensor
 
     ctrllers = [copy.deepcopy(controller) for _ in range(len(envs))]
     sim_instances = [
@@ -393,7 +400,15 @@ def simulate(
 
     results = batch_sim(sim_instances, parallel=parallel)
 
-    df = pd.concat(results, keys=[s.env.patient.name for s in sim_instances])
+    # failed runs are logged by batch_sim and left out of the report
+    keys = [s.env.patient.name for s in sim_instances]
+    finished = [(k, r) for k, r in zip(keys, results) if not is_failure(r)]
+    if not finished:
+        failure = results[0]
+        raise RuntimeError('All {} simulations failed, the first one with {}'
+                           '\n{}'.format(len(results), failure.error,
+                                         failure.traceback))
+    df = pd.concat([r for _, r in finished], keys=[k for k, _ in finished])
     results, ri_per_hour, zone_stats, figs, axes = report(df, cgm_sensor, save_path)
 
     return results
@@ -0,0 +1,98 @@
+import unittest
+from simglucose.simulation.cache import ResultCache, is_reproducible
+from simglucose.simulation.run_spec import RunSpec
+from simglucose.simulation.sim_engine import batch_sim, sim
+from simglucose.simulation.executors import ProcessExecutor
+from simglucose.controller.basal_bolus_ctrller import BBController
+from simglucose.controller.pid_ctrller import PIDController
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from pandas.testing import assert_frame_equal
+from datetime import timedelta
+import tempfile
+import threading
+import glob
+import os
+
+sim_time = timedelta(hours=2)
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(self.tmpdir.name)
+        self.spec = RunSpec('adolescent#001', sim_time, BBController,
+                            scenario_seed=1, sensor_seed=1)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_hit(self):
+        expected = sim(self.spec)
+        df = self.cache.sim(self.spec)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 1))
+        df = self.cache.sim(self.spec.build())
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        assert_frame_equal(df, expected, check_freq=False)
+
+        self.cache.sim(self.spec._replace(controller_kwargs={'target': 120}))
+        self.assertEqual(self.cache.misses, 2)
+        self.assertEqual(len(os.listdir(self.tmpdir.name)), 2)
+
+    def test_batch(self):
+        specs = [self.spec, self.spec._replace(sensor_seed=2), self.spec]
+        executor = ProcessExecutor(max_workers=2)
+        first = batch_sim(specs, executor=executor, cache=self.cache)
+        self.assertEqual(len(os.listdir(self.tmpdir.name)), 2)
+        second = batch_sim(specs, executor=executor, cache=self.cache)
+        for a, b in zip(first, second):
+            assert_frame_equal(a, b, check_freq=False)
+
+    def test_not_seeded(self):
+        spec = self.spec._replace(sensor_seed=None)
+        self.assertFalse(is_reproducible(spec.build()))
+        self.cache.sim(spec)
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+    def test_evict(self):
+        self.cache.sim(self.spec)
+        size = os.path.getsize(os.path.join(self.tmpdir.name,
+                                            os.listdir(self.tmpdir.name)[0]))
+        self.cache.max_bytes = int(size * 2.5)
+        for seed in range(2, 5):
+            self.cache.sim(self.spec._replace(sensor_seed=seed))
+        self.assertEqual(len(os.listdir(self.tmpdir.name)), 2)
+        key = self.cache.key(self.spec._replace(sensor_seed=4).build())
+        self.assertIsNotNone(self.cache.get(key))
+
+    def test_size_index(self):
+        # the folder is listed once, not on every write
+        with mock.patch('simglucose.simulation.cache.glob.glob',
+                        wraps=glob.glob) as listing:
+            for seed in range(1, 4):
+                self.cache.sim(self.spec._replace(sensor_seed=seed))
+        self.assertEqual(listing.call_count, 1)
+        self.assertEqual(len(self.cache._index), 3)
+        first = self.cache.key(self.spec.build())
+        self.cache.get(first)
+        self.assertEqual(list(self.cache._index)[-1], first)
+
+        self.cache.max_bytes = sum(self.cache._index.values()) - 1
+        self.cache.evict()
+        self.assertEqual(len(os.listdir(self.tmpdir.name)), 2)
+        self.assertIsNotNone(self.cache.get(first))
+
+    def test_fingerprint_skips_runtime_state(self):
+        spec = self.spec._replace(controller=PIDController)
+        sim_object = spec.build()
+        controller = sim_object.controller
+        key = self.cache.key(controller)
+        controller.lock = threading.Lock()
+        controller._executor = ThreadPoolExecutor(max_workers=1)
+        sim_object.simulate()
+        self.assertEqual(self.cache.key(controller), key)
+        controller._executor.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
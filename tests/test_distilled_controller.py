@@ -0,0 +1,80 @@
+import unittest
+from simglucose.simulation.env import T1DSimEnv
+from simglucose.controller.pid_ctrller import PIDController
+from simglucose.controller.distilled_ctrller import PolicyRecorder
+from simglucose.controller.distilled_ctrller import DistilledController
+from simglucose.controller.distilled_ctrller import LookupTable
+from simglucose.sensor.cgm import CGMSensor
+from simglucose.actuator.pump import InsulinPump
+from simglucose.patient.t1dpatient import T1DPatient
+from simglucose.simulation.scenario_gen import RandomScenario
+from simglucose.simulation.sim_engine import SimObj
+from datetime import datetime, timedelta
+import numpy as np
+
+start_time = datetime(2018, 1, 1, 0, 0, 0)
+
+
+def make_env(seed):
+    return T1DSimEnv(T1DPatient.withName('adult#002'),
+                     CGMSensor.withName('Dexcom', seed=seed),
+                     InsulinPump.withName('Insulet'),
+                     RandomScenario(start_time=start_time, seed=seed))
+
+
+class TestLookupTable(unittest.TestCase):
+    def test_fit_predict(self):
+        X = np.random.RandomState(0).uniform(size=(2000, 2))
+        y = (X[:, 0] > 0.5) + 2.0 * (X[:, 1] > 0.5)
+        table = LookupTable(n_bins=4).fit(X, y)
+        np.testing.assert_allclose(
+            table.predict([[0.1, 0.1], [0.9, 0.1], [0.9, 0.9]]).ravel(),
+            [0, 1, 3])
+
+
+class TestDistilledController(unittest.TestCase):
+    def test_distill_pid(self):
+        teacher = PIDController(P=0.001, I=0.00001, D=0.001)
+        recorder = PolicyRecorder(teacher)
+        for seed in range(3):
+            SimObj(make_env(seed), recorder, timedelta(days=1),
+                   animate=False).simulate()
+        dataset = recorder.dataset()
+        self.assertEqual(len(dataset), 3 * 480)
+        self.assertEqual(set(dataset.patient_name), {'adult#002'})
+        self.assertEqual(list(np.bincount(dataset.episode)), [480] * 3)
+
+        controller = DistilledController.fit(
+            dataset, seed=0, teacher=teacher,
+            validation_envs=[make_env(5)], sim_time=timedelta(hours=12))
+        # a whole held out day, lower than on records of the training days
+        self.assertLess(controller.fidelity.loc['basal', 'mae'],
+                        0.5 * dataset.basal.abs().mean())
+        self.assertAlmostEqual(
+            controller.fidelity.loc['basal', 'total_ratio'], 1, delta=0.2)
+        agreement = controller.agreement.iloc[0]
+        self.assertEqual(agreement.patient_name, 'adult#002')
+        self.assertLess(agreement.bg_mae, 10)
+        self.assertAlmostEqual(agreement.insulin_ratio, 1, delta=0.25)
+
+        s = SimObj(make_env(5), controller, timedelta(hours=12),
+                   animate=False)
+        s.simulate()
+        results = s.results()
+        self.assertTrue(all(results.insulin.dropna() >= 0))
+        self.assertGreater(results.BG.min(), 40)
+
+    def test_holdout_patients(self):
+        recorder = PolicyRecorder(PIDController(P=0.001, I=0.00001, D=0.001))
+        SimObj(make_env(0), recorder, timedelta(hours=6),
+               animate=False).simulate()
+        dataset = recorder.dataset()
+        # a single patient cannot be held out
+        self.assertIsNone(
+            DistilledController.fit(dataset, holdout='patient_name').fidelity)
+        with self.assertRaises(ValueError):
+            DistilledController.fit(dataset.drop(columns='episode'))
+
+
+if __name__ == '__main__':
+    unittest.main()
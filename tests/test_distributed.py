@@ -0,0 +1,128 @@
+import unittest
+from simglucose.simulation.distributed import DistributedExecutor, run_worker
+from simglucose.simulation.distributed import parse_address, _recv
+from simglucose.simulation.executors import RunFailure
+from simglucose.simulation.run_spec import RunSpec
+from simglucose.simulation.sim_engine import batch_sim
+from simglucose.controller.basal_bolus_ctrller import BBController
+from multiprocessing.connection import Client
+from pandas.testing import assert_frame_equal
+from datetime import timedelta
+import multiprocessing
+import threading
+import tempfile
+import time
+import os
+
+AUTHKEY = b'simglucose'
+
+
+def sleep(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def square(x):
+    if x == 3:
+        raise ValueError('bad run')
+    return x * x
+
+
+class Unloadable(object):
+    # e.g. a function of a module missing on the worker's host
+    def __call__(self, x):
+        return x
+
+    def __reduce__(self):
+        return (_fail_to_load, ())
+
+
+def _fail_to_load():
+    raise ImportError('cannot be loaded')
+
+
+class TestDistributedExecutor(unittest.TestCase):
+    def test_local_workers(self):
+        with DistributedExecutor(authkey=AUTHKEY,
+                                 n_local_workers=2) as executor:
+            results = executor.map(square, range(6))
+            self.assertEqual(results[:3], [0, 1, 4])
+            self.assertIsInstance(results[3], RunFailure)
+
+            specs = [
+                RunSpec(name, timedelta(hours=2), BBController,
+                        scenario_seed=1, sensor_seed=1)
+                for name in ['adolescent#001', 'child#001']
+            ]
+            for a, b in zip(batch_sim(specs, executor=executor),
+                            batch_sim(specs)):
+                assert_frame_equal(a, b)
+
+    def test_unix_socket(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            address = os.path.join(tmpdir, 'coordinator')
+            with DistributedExecutor(address, n_local_workers=1) as executor:
+                self.assertEqual(executor.map(square, [4, 5]), [16, 25])
+
+    def test_lost_worker(self):
+        executor = DistributedExecutor(authkey=AUTHKEY, heartbeat_timeout=1)
+        executor.start()
+        process = multiprocessing.Process(target=run_worker,
+                                          args=(executor.address, AUTHKEY))
+
+        def silent_worker():
+            # takes a chunk and never answers
+            conn = Client(executor.address, authkey=AUTHKEY)
+            _recv(conn)  # heartbeat interval
+            _recv(conn)  # task
+            process.start()
+            time.sleep(3)
+            conn.close()
+
+        thread = threading.Thread(target=silent_worker)
+        thread.start()
+        try:
+            tic = time.monotonic()
+            self.assertEqual(executor.map(square, [2]), [4])
+            self.assertGreater(time.monotonic() - tic, 1)
+        finally:
+            executor.close()
+            thread.join()
+            process.join()
+
+    def test_timeout_not_last(self):
+        # the worker keeps running the next chunks after a timeout
+        with DistributedExecutor(authkey=AUTHKEY, n_local_workers=1,
+                                 timeout=1) as executor:
+            tic = time.monotonic()
+            results = executor.map(sleep, [3, 0.1, 0.2])
+            self.assertIn('TimeoutError', results[0].error)
+            self.assertEqual(results[1:], [0.1, 0.2])
+            self.assertLess(time.monotonic() - tic, 10)
+            self.assertEqual(executor.n_workers, 1)
+
+    def test_authkey(self):
+        with self.assertRaises(ValueError):
+            DistributedExecutor(('0.0.0.0', 0))
+        DistributedExecutor(('0.0.0.0', 0), authkey=AUTHKEY)
+        executor = DistributedExecutor()
+        self.assertEqual(len(executor.authkey), 32)
+        self.assertNotEqual(DistributedExecutor().authkey, executor.authkey)
+        with executor:
+            with self.assertRaises(multiprocessing.AuthenticationError):
+                Client(executor.address, authkey=b'wrong')
+
+    def test_unloadable_task(self):
+        with DistributedExecutor(n_local_workers=1) as executor:
+            results = executor.map(Unloadable(), [1])
+            self.assertIsInstance(results[0], RunFailure)
+            self.assertIn('cannot be loaded', results[0].error)
+            self.assertEqual(executor.map(square, [2]), [4])
+
+    def test_parse_address(self):
+        self.assertEqual(parse_address('10.0.0.1:6000'), ('10.0.0.1', 6000))
+        self.assertEqual(parse_address('/tmp/socket'), '/tmp/socket')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import unittest
+from simglucose.simulation.executors import SerialExecutor, ThreadExecutor
+from simglucose.simulation.executors import ProcessExecutor, PathosExecutor
+from simglucose.simulation.executors import RunFailure, is_failure
+from simglucose.simulation.executors import get_executor
+import pathos.multiprocessing
+import tempfile
+import shutil
+import time
+import os
+
+
+def square(x):
+    if x == 3:
+        raise ValueError('bad run')
+    if x == 5:
+        time.sleep(3)
+    return x * x
+
+
+def sleep(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def logged_sleep(args):
+    folder, seconds = args
+    with open(os.path.join(folder, str(seconds)), 'a') as f:
+        f.write('run\n')
+    return sleep(seconds)
+
+
+class Flaky(object):
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, x):
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError('first call fails')
+        return x
+
+
+class TestExecutors(unittest.TestCase):
+    def check_failures(self, executor, items=range(5)):
+        results = executor.map(square, items)
+        self.assertEqual(results[:3], [0, 1, 4])
+        self.assertIsInstance(results[3], RunFailure)
+        self.assertIn('bad run', results[3].error)
+        self.assertIn('ValueError', results[3].traceback)
+        return results
+
+    def test_serial(self):
+        self.check_failures(SerialExecutor())
+
+    def test_retries(self):
+        results = SerialExecutor(retries=1).map(Flaky(), [1, 2])
+        self.assertEqual(results, [1, 2])
+        results = SerialExecutor().map(Flaky(), [1, 2])
+        self.assertTrue(is_failure(results[0]))
+        self.assertEqual(results[0].attempts, 1)
+
+    def test_thread_timeout(self):
+        tic = time.time()
+        results = self.check_failures(
+            ThreadExecutor(max_workers=2, timeout=0.5), range(6))
+        self.assertIn('TimeoutError', results[5].error)
+        self.assertLess(time.time() - tic, 10)
+
+    def test_process(self):
+        tic = time.time()
+        results = self.check_failures(
+            ProcessExecutor(max_workers=2, chunksize=2, timeout=1),
+            range(7))
+        self.assertIn('TimeoutError', results[5].error)
+        self.assertEqual(results[6], 36)
+        self.assertLess(time.time() - tic, 10)
+
+    def test_timeout_not_last(self):
+        # the runs after a timed out one get their full time limit
+        for executor in [ThreadExecutor(max_workers=1, timeout=1),
+                         ProcessExecutor(max_workers=1, timeout=1),
+                         PathosExecutor(max_workers=1, timeout=1)]:
+            tic = time.time()
+            results = executor.map(sleep, [3, 0.5, 0.2])
+            self.assertIn('TimeoutError', results[0].error)
+            self.assertEqual(results[1:], [0.5, 0.2])
+            self.assertLess(time.time() - tic, 10)
+
+    def test_timeout_keeps_healthy_chunks(self):
+        # 0.9 is running when 3 times out, it finishes and is not run again
+        folder = tempfile.mkdtemp()
+        try:
+            for executor in [ProcessExecutor(max_workers=2, timeout=1),
+                             PathosExecutor(max_workers=2, timeout=1)]:
+                items = [(folder, seconds) for seconds in [3, 0.5, 0.9, 0.1]]
+                results = executor.map(logged_sleep, items)
+                self.assertIn('TimeoutError', results[0].error)
+                self.assertEqual(results[1:], [0.5, 0.9, 0.1])
+                for seconds in [0.5, 0.9, 0.1]:
+                    with open(os.path.join(folder, str(seconds))) as f:
+                        self.assertEqual(f.read(), 'run\n')
+                    os.remove(os.path.join(folder, str(seconds)))
+        finally:
+            shutil.rmtree(folder)
+
+    def test_pathos_pool_untouched(self):
+        # the pool pathos caches for other code is not restarted or closed
+        pool = pathos.multiprocessing.ProcessPool(nodes=2)
+        served = pool._serve()
+        PathosExecutor(max_workers=2, timeout=1).map(sleep, [3, 0.1])
+        self.assertIs(pool._serve(), served)
+        self.assertEqual(pool.map(abs, [-1, -2]), [1, 2])
+        pool.close()
+        pool.join()
+        pool.clear()
+
+    def test_unpicklable(self):
+        results = ProcessExecutor(max_workers=1).map(lambda x: x, [1])
+        self.assertTrue(is_failure(results[0]))
+
+    def test_pathos(self):
+        self.check_failures(PathosExecutor(max_workers=2, chunksize=2))
+
+    def test_get_executor(self):
+        self.assertIsInstance(get_executor('thread', max_workers=3),
+                              ThreadExecutor)
+        with self.assertRaises(ValueError):
+            get_executor('mpi')
+
+
+if __name__ == '__main__':
+    unittest.main()
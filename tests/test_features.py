@@ -0,0 +1,79 @@
+import unittest
+from simglucose.simulation.env import T1DSimEnv
+from simglucose.simulation.features import RollingWindow, FeatureEngine
+from simglucose.analysis.glucose_effects import ExponentialInsulinCurve
+from simglucose.analysis.glucose_effects import LinearCarbCurve
+from simglucose.controller.basal_bolus_ctrller import BBController
+from simglucose.sensor.cgm import CGMSensor
+from simglucose.actuator.pump import InsulinPump
+from simglucose.patient.t1dpatient import T1DPatient
+from simglucose.simulation.scenario import CustomScenario
+from simglucose.envs import T1DSimGymnaisumEnv
+from datetime import datetime
+import numpy as np
+
+
+class TestRollingWindow(unittest.TestCase):
+    def test_window(self):
+        window = RollingWindow(4, fill=1.0)
+        np.testing.assert_array_equal(window.view, [1, 1, 1, 1])
+        for value in range(2, 9):
+            window.append(value)
+        np.testing.assert_array_equal(window.view, [5, 6, 7, 8])
+        self.assertEqual(window.last, 8)
+        self.assertAlmostEqual(window.mean, 6.5)
+        self.assertFalse(window.view.flags.writeable)
+        self.assertFalse(window.view.flags.owndata)
+
+
+class TestFeatureEngine(unittest.TestCase):
+    def test_env_features(self):
+        start_time = datetime(2018, 1, 1, 0, 0, 0)
+        features = FeatureEngine(window_size=10, trend_size=3)
+        env = T1DSimEnv(T1DPatient.withName('adult#001'),
+                        CGMSensor.withName('Dexcom', seed=1),
+                        InsulinPump.withName('Insulet'),
+                        CustomScenario(start_time=start_time,
+                                       scenario=[(0.5, 50)]),
+                        features=features)
+        controller = BBController()
+        obs, reward, done, info = env.reset()
+        for _ in range(60):
+            action = controller.policy(obs, reward, done, **info)
+            obs, reward, done, info = env.step(action)
+        self.assertIs(info['features'], features)
+
+        cgm = np.array(env.CGM_hist[-10:])
+        np.testing.assert_allclose(features.cgm_window, cgm)
+        self.assertAlmostEqual(features.cgm_mean, cgm.mean())
+        self.assertAlmostEqual(features.cgm_roc, (cgm[-1] - cgm[-4]) / 9)
+
+        # insulin on board from scratch
+        curve = ExponentialInsulinCurve.withName('novolog')
+        t = np.arange(len(env.insulin_hist)) * 3
+        iob = np.sum(
+            np.array(env.insulin_hist) * 3 *
+            curve.percent_effect_remaining(env.patient.t - t))
+        self.assertAlmostEqual(features.insulin_on_board, iob)
+        cob = np.sum(
+            np.array(env.CHO_hist) * 3 *
+            LinearCarbCurve().percent_effect_remaining(env.patient.t - t))
+        self.assertGreater(cob, 0)
+        self.assertAlmostEqual(features.carbs_on_board, cob)
+        self.assertEqual(len(features.features), 5)
+
+    def test_gymnasium_window(self):
+        env = T1DSimGymnaisumEnv(patient_name='adolescent#002',
+                                 history_length=4, seed=1)
+        self.assertEqual(env.observation_space.shape, (4, ))
+        observation, info = env.reset()
+        self.assertEqual(observation.shape, (4, ))
+        self.assertTrue(np.all(observation == observation[0]))
+        for _ in range(3):
+            observation, _, _, _, info = env.step(np.array([0.01]))
+        window = info['features'].cgm_window
+        np.testing.assert_allclose(observation.ravel(), window)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+import numpy as np
+import pandas as pd
+from simglucose.analysis.glucose_effects import (
+    ExponentialInsulinCurve, LinearCarbCurve, InsulinOnBoard, CarbsOnBoard,
+    on_board, add_insulin_on_board_to_df,
+    add_insulin_counteraction_effect_to_df)
+
+
+class TestGlucoseEffects(unittest.TestCase):
+    def setUp(self):
+        self.curve = ExponentialInsulinCurve.withName('novolog')
+        random_gen = np.random.RandomState(0)
+        self.sample_time = 5
+        n = 2000
+        self.doses = random_gen.exponential(0.1, n) * (random_gen.rand(n) < 0.5)
+        self.carbs = (random_gen.rand(n) < 0.02) * random_gen.uniform(10, 80, n)
+
+    def test_insulin_curve(self):
+        remaining = self.curve.percent_effect_remaining([0, 10, 100, 370, 400])
+        self.assertEqual(remaining[0], 1)
+        self.assertEqual(remaining[1], 1)
+        self.assertTrue(0 < remaining[2] < 1)
+        self.assertEqual(remaining[3], 0)
+        self.assertAlmostEqual(
+            float(self.curve.percent_effect_remaining(369.999)), 0, places=6)
+
+    def test_incremental_matches_vectorized(self):
+        iob = InsulinOnBoard(self.curve)
+        cob = CarbsOnBoard(LinearCarbCurve())
+        iob_inc, cob_inc = [], []
+        for k in range(len(self.doses)):
+            t = k * self.sample_time
+            iob.add(t, self.doses[k])
+            cob.add(t, self.carbs[k])
+            iob_inc.append(iob.value(t))
+            cob_inc.append(cob.value(t))
+        np.testing.assert_allclose(
+            iob_inc, on_board(self.doses, self.sample_time, self.curve),
+            atol=1e-10)
+        np.testing.assert_allclose(
+            cob_inc, on_board(self.carbs, self.sample_time, LinearCarbCurve()),
+            atol=1e-10)
+
+        t = np.arange(len(self.doses)) * self.sample_time
+        brute = np.sum(self.doses *
+                       self.curve.percent_effect_remaining(t[-1] - t))
+        self.assertAlmostEqual(iob_inc[-1], brute)
+
+    def test_doses_in_time_order(self):
+        iob = InsulinOnBoard(self.curve)
+        iob.add(10, 1)
+        iob.value(20)
+        with self.assertRaises(ValueError):
+            iob.add(5, 1)
+
+    def test_dataframe(self):
+        index = pd.date_range('2018-01-01', periods=200, freq='5min')
+        df = pd.DataFrame({'CGM': 120.0, 'basal': 1.0, 'bolus': 0.0},
+                          index=index)
+        df.loc[index[10], 'bolus'] = 2.0
+        add_insulin_on_board_to_df(df, 1.0, 50, 10)
+        add_insulin_counteraction_effect_to_df(df, 1.0, 50, 10)
+        self.assertEqual(df.iob.iloc[0], 0)
+        self.assertEqual(df.iob.iloc[10], 2)
+        self.assertEqual(df.iob.iloc[-1], 0)
+        self.assertTrue(np.isnan(df.ice.iloc[0]))
+        # flat CGM while insulin acts: positive counteraction
+        self.assertTrue((df.ice.iloc[14:70] > 0).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
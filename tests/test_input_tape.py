@@ -0,0 +1,92 @@
+import unittest
+import os
+import shutil
+import numpy as np
+from datetime import datetime, timedelta
+from simglucose.simulation.env import T1DSimEnv
+from simglucose.simulation.input_tape import InputTape
+from simglucose.simulation.sim_engine import SimObj
+from simglucose.controller.basal_bolus_ctrller import BBController
+from simglucose.controller.pid_ctrller import PIDController
+from simglucose.sensor.cgm import CGMSensor
+from simglucose.actuator.pump import InsulinPump
+from simglucose.patient.t1dpatient import T1DPatient
+
+tape_folder = os.path.join(os.path.dirname(__file__), 'tapes')
+
+
+class TestInputTape(unittest.TestCase):
+    def setUp(self):
+        self.start_time = datetime(2018, 1, 1, 6, 0, 0)
+        self.sim_time = timedelta(hours=12)
+        self.tape = InputTape.generate(self.start_time, self.sim_time,
+                                       'Dexcom', seed=1)
+
+    def run_tape(self, tape, controller):
+        env = T1DSimEnv(T1DPatient.withName('adolescent#001'),
+                        CGMSensor.withName('Dexcom'),
+                        InsulinPump.withName('Insulet'),
+                        tape=tape)
+        s = SimObj(env, controller, self.sim_time, animate=False)
+        s.simulate()
+        return s.results()
+
+    def test_generate(self):
+        tape = InputTape.generate(self.start_time, self.sim_time, 'Dexcom',
+                                  seed=1)
+        self.assertEqual(len(tape.meals), 12 * 60)
+        self.assertEqual(tape.horizon, self.sim_time)
+        np.testing.assert_array_equal(tape.meals, self.tape.meals)
+        np.testing.assert_array_equal(tape.cgm_noise, self.tape.cgm_noise)
+        np.testing.assert_array_equal(tape.init_bg_noise,
+                                      self.tape.init_bg_noise)
+
+    def test_save_load(self):
+        os.makedirs(tape_folder, exist_ok=True)
+        filename = os.path.join(tape_folder, 'tape.npz')
+        self.tape.save(filename)
+        tape = InputTape.load(filename)
+        self.assertEqual(tape.start_time, self.start_time)
+        self.assertEqual(tape.sample_time, self.tape.sample_time)
+        self.assertEqual(tape.sensor_name, 'Dexcom')
+        np.testing.assert_array_equal(tape.meals, self.tape.meals)
+        np.testing.assert_array_equal(tape.cgm_noise, self.tape.cgm_noise)
+        np.testing.assert_array_equal(tape.init_bg_noise,
+                                      self.tape.init_bg_noise)
+
+    def test_replay(self):
+        results_bb = self.run_tape(self.tape, BBController())
+        results_pid = self.run_tape(
+            self.tape, PIDController(P=-0.0001, I=0, D=0, target=140))
+        np.testing.assert_array_equal(results_bb.CHO.values,
+                                      results_pid.CHO.values)
+        self.assertEqual(results_bb.BG.iloc[0], results_pid.BG.iloc[0])
+        self.assertAlmostEqual(results_bb.CHO.sum() * 3,
+                               self.tape.meals.sum())
+        for results in (results_bb, results_pid):
+            self.assertAlmostEqual(results.CGM.iloc[0] - results.BG.iloc[0],
+                                   self.tape.cgm_noise[0])
+
+    def test_apply_copies(self):
+        patient = T1DPatient.withName('adolescent#001')
+        sensor = CGMSensor.withName('Dexcom', seed=1)
+        tape_patient, tape_sensor, _ = self.tape.apply(patient, sensor)
+        self.assertIsNone(patient.init_bg_noise)
+        self.assertIsNone(sensor.noise)
+        self.assertIsNot(tape_patient, patient)
+        np.testing.assert_array_equal(tape_sensor.noise, self.tape.cgm_noise)
+        self.assertNotEqual(tape_patient.observation.Gsub,
+                            patient.observation.Gsub)
+
+    def test_past_horizon(self):
+        tape = InputTape.generate(self.start_time, timedelta(hours=1),
+                                  'Dexcom', seed=1)
+        with self.assertRaisesRegex(ValueError, str(len(tape.cgm_noise))):
+            self.run_tape(tape, BBController())
+
+    def tearDown(self):
+        shutil.rmtree(tape_folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+from simglucose.simulation.journal import RunJournal
+from simglucose.simulation.run_spec import RunSpec
+from simglucose.simulation.sim_engine import batch_sim
+from simglucose.simulation.executors import ProcessExecutor, is_failure
+from simglucose.simulation.fingerprint import fingerprint, is_reproducible
+from simglucose.controller.basal_bolus_ctrller import BBController
+from pandas.testing import assert_frame_equal
+from datetime import timedelta
+import tempfile
+
+sim_time = timedelta(hours=2)
+
+
+class TestFingerprint(unittest.TestCase):
+    def test_stable(self):
+        spec = RunSpec('adolescent#001', sim_time, BBController,
+                       scenario_seed=1, sensor_seed=1)
+        self.assertEqual(fingerprint(spec.build()), fingerprint(spec.build()))
+        self.assertEqual(fingerprint(spec), fingerprint(
+            spec._replace(path='results')))
+        self.assertNotEqual(fingerprint(spec.build()),
+                            fingerprint(spec._replace(sensor_seed=2).build()))
+        self.assertNotEqual(
+            fingerprint(spec),
+            fingerprint(spec._replace(controller_kwargs={'target': 120})))
+
+
+class TestRunJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.specs = [
+            RunSpec(name, sim_time, BBController, scenario_seed=1,
+                    sensor_seed=1)
+            for name in ['adolescent#001', 'unknown', 'child#001']
+        ]
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_unseeded_replicates(self):
+        journal = RunJournal(self.tmpdir.name)
+        spec = RunSpec('adolescent#001', sim_time, BBController)
+        self.assertFalse(is_reproducible(spec))
+        self.assertTrue(is_reproducible(self.specs[0]))
+        results = batch_sim([spec] * 3 + self.specs[:1] * 2, journal=journal)
+        # three replicates, and one run of the duplicated seeded spec
+        self.assertEqual(len(journal.completed()), 4)
+        self.assertEqual(len(set(r.CGM.iloc[-1] for r in results[:3])), 3)
+        assert_frame_equal(results[3], results[4])
+
+    def test_resume(self):
+        journal = RunJournal(self.tmpdir.name)
+        results = batch_sim(self.specs[:1], journal=journal)
+        self.assertEqual(len(journal.completed()), 1)
+
+        # simulate a batch killed while writing the manifest
+        with open(journal.manifest, 'a') as f:
+            f.write('{"id": "trunc')
+
+        results = batch_sim(self.specs,
+                            executor=ProcessExecutor(max_workers=2),
+                            journal=journal)
+        records = journal.completed()
+        self.assertEqual(len(records), 2)
+        self.assertTrue(is_failure(results[1]))
+        self.assertEqual(
+            records[fingerprint(self.specs[0])]['patient_name'],
+            'adolescent#001')
+        assert_frame_equal(results[0], journal.load(fingerprint(
+            self.specs[0])))
+
+        # nothing left to run but the failure
+        with open(journal.manifest) as f:
+            n_lines = len(f.readlines())
+        results = RunJournal(self.tmpdir.name).run(self.specs)
+        with open(journal.manifest) as f:
+            self.assertEqual(len(f.readlines()), n_lines)
+        self.assertEqual(len(results[2]), 41)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta
+from simglucose.simulation.env import Observation
+import importlib
+import threading
+import types
+import sys
+
+PATIENTS = ['adolescent#001', 'adult#003', 'child#005']
+SAMPLE_TIME = 3
+
+
+def get_json_loop_prediction_input_from_df(df, basal, isf, cr,
+                                           prediction_start=None,
+                                           insulin_type=None):
+    loop.n_inputs += 1
+    return {'glucose': float(df.CGM.iloc[-1])}
+
+
+class FakeLoop(object):
+    """
+    Stands in for loop_to_python_api.api, counting the Loop calls. The
+    manual bolus recommendation only has the 'manual' entry, so that a
+    request answered out of order fails.
+    """
+    def __init__(self):
+        self.calls = []
+        self.n_inputs = 0
+        self.lock = threading.Lock()
+
+    def get_dose_recommendations(self, json_data):
+        with self.lock:
+            self.calls.append(json_data)
+        glucose = json_data['glucose']
+        if json_data.get('recommendationType') == 'manualBolus':
+            return {'manual': {'amount': glucose / 10}}
+        return {'automatic': {'basalAdjustment': {'unitsPerHour': glucose / 100}}}
+
+
+loop = FakeLoop()
+loop_ctrller = None
+modules = None
+
+
+def setUpModule():
+    global loop_ctrller, modules
+    package = types.ModuleType('loop_to_python_api')
+    api = types.ModuleType('loop_to_python_api.api')
+    api.get_dose_recommendations = loop.get_dose_recommendations
+    helpers = types.ModuleType('loop_to_python_api.helpers')
+    helpers.get_json_loop_prediction_input_from_df = \
+        get_json_loop_prediction_input_from_df
+    package.api = api
+    package.helpers = helpers
+    modules = mock.patch.dict(sys.modules, {
+        'loop_to_python_api': package,
+        'loop_to_python_api.api': api,
+        'loop_to_python_api.helpers': helpers,
+    })
+    modules.start()
+    sys.modules.pop('simglucose.controller.loop_ctrller', None)
+    loop_ctrller = importlib.import_module(
+        'simglucose.controller.loop_ctrller')
+
+
+def tearDownModule():
+    # also drops loop_ctrller, imported with the stubs
+    modules.stop()
+
+
+class TestDoseRecommender(unittest.TestCase):
+    def setUp(self):
+        loop.calls = []
+        loop.n_inputs = 0
+
+    def test_cache_hit(self):
+        recommender = loop_ctrller.DoseRecommender()
+        first = recommender.recommend({'glucose': 120}, key='a')
+        second = recommender.recommend({'glucose': 120}, key='a')
+        self.assertIs(first, second)
+        self.assertEqual(len(loop.calls), 1)
+        recommender.recommend({'glucose': 120})
+        self.assertEqual(len(loop.calls), 2)
+
+    def test_lru_eviction(self):
+        recommender = loop_ctrller.DoseRecommender(cache_size=2)
+        for key in ['a', 'b', 'a', 'c']:
+            recommender.recommend({'glucose': 100}, key=key)
+        self.assertEqual(len(loop.calls), 3)
+        self.assertEqual(list(recommender._cache), ['a', 'c'])
+        recommender.recommend({'glucose': 100}, key='a')
+        self.assertEqual(len(loop.calls), 3)
+        recommender.recommend({'glucose': 100}, key='b')
+        self.assertEqual(len(loop.calls), 4)
+
+    def test_recommend_many(self):
+        recommender = loop_ctrller.DoseRecommender()
+        recommender.recommend({'glucose': 50}, key='cached')
+        requests = [({'glucose': 100}, 'x'), ({'glucose': 200}, 'y'),
+                    ({'glucose': 100}, 'x'), ({'glucose': 50}, 'cached'),
+                    ({'glucose': 300}, None), ({'glucose': 300}, None)]
+        recommendations = recommender.recommend_many(requests, max_workers=2)
+        self.assertEqual(
+            [r['automatic']['basalAdjustment']['unitsPerHour']
+             for r in recommendations], [1, 2, 1, 0.5, 3, 3])
+        # x once, y once and both unkeyed requests
+        self.assertEqual(len(loop.calls), 1 + 4)
+        recommender.recommend_many(requests[:2])
+        self.assertEqual(len(loop.calls), 5)
+
+    def test_no_cache(self):
+        recommender = loop_ctrller.DoseRecommender(cache_size=0)
+        recommender.recommend({'glucose': 100}, key='a')
+        recommender.recommend({'glucose': 100}, key='a')
+        self.assertEqual(len(loop.calls), 2)
+        recommendations = recommender.recommend_many([({'glucose': 100}, 'a'),
+                                                      ({'glucose': 100}, 'a')])
+        self.assertEqual(len(loop.calls), 3)
+        self.assertIs(recommendations[0], recommendations[1])
+        self.assertEqual(len(recommender._cache), 0)
+
+
+class TestLoopPolicyBatch(unittest.TestCase):
+    def setUp(self):
+        loop.calls = []
+        loop.n_inputs = 0
+        self.start_time = datetime(2018, 1, 1, 0, 0, 0)
+
+    def steps(self, n):
+        for k in range(n):
+            time = self.start_time + timedelta(minutes=SAMPLE_TIME * k)
+            glucose = [100 + 10 * i + k for i in range(len(PATIENTS))]
+            # the first patient eats at the last steps, with a manual bolus
+            meals = [2 if k >= n - 2 else 0, 0, 0]
+            observations = [Observation(CGM=g) for g in glucose]
+            infos = [{'patient_name': name, 'meal': meal,
+                      'sample_time': SAMPLE_TIME, 'time': time}
+                     for name, meal in zip(PATIENTS, meals)]
+            yield observations, infos
+
+    def test_matches_policy(self):
+        n_steps = loop_ctrller.WARMUP_MINUTES // SAMPLE_TIME + 3
+        batch_ctrller = loop_ctrller.LoopController()
+        ctrllers = [loop_ctrller.LoopController() for _ in PATIENTS]
+        executors = set()
+        for observations, infos in self.steps(n_steps):
+            action = batch_ctrller.policy_batch(observations, infos)
+            if batch_ctrller.recommender._executor is not None:
+                executors.add(batch_ctrller.recommender._executor)
+            for i, ctrller in enumerate(ctrllers):
+                expected = ctrller.policy(observations[i], 0, False,
+                                          **infos[i])
+                self.assertAlmostEqual(action.basal[i], expected.basal)
+                self.assertAlmostEqual(action.bolus[i], expected.bolus)
+        self.assertGreater(action.bolus[0], 0)
+        self.assertEqual(len(executors), 1)
+        batch_ctrller.recommender.close()
+
+    def test_cache_hit_skips_input(self):
+        ctrller = loop_ctrller.LoopController()
+        n_steps = loop_ctrller.WARMUP_MINUTES // SAMPLE_TIME + 5
+        for _ in range(2):
+            # the second run only hits the cache
+            ctrller.reset()
+            for observations, infos in self.steps(n_steps):
+                ctrller.policy(observations[0], 0, False, **infos[0])
+            # one input per Loop step, shared by the manual bolus request
+            self.assertEqual(loop.n_inputs, 6)
+            self.assertEqual(len(loop.calls), 8)
+
+    def test_duplicate_patients(self):
+        ctrller = loop_ctrller.LoopController()
+        observations, infos = next(self.steps(1))
+        infos[1] = dict(infos[1], patient_name=PATIENTS[0])
+        with self.assertRaises(ValueError):
+            ctrller.policy_batch(observations, infos)
+        self.assertEqual(ctrller.observations, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+from datetime import datetime, timedelta
+from simglucose.patient.t1dpatient import T1DPatient, Action
+from simglucose.patient.batch_model import BatchT1DModel
+from simglucose.controller.mpc_ctrller import MPCController
+from simglucose.controller.base import Action as CtrlAction
+from simglucose.simulation.env import T1DSimEnv
+from simglucose.sensor.cgm import CGMSensor
+from simglucose.actuator.pump import InsulinPump
+from simglucose.simulation.scenario import CustomScenario
+from simglucose.simulation.sim_engine import SimObj
+import numpy as np
+import shutil
+import os
+
+output_folder = os.path.join(os.path.dirname(__file__), 'results')
+
+
+class TestBatchModel(unittest.TestCase):
+    def test_snapshot_restore(self):
+        patient = T1DPatient.withName('adult#002')
+        patient.step(Action(CHO=40, insulin=0.02))
+        snapshot = patient.snapshot()
+        patient.step(Action(CHO=0, insulin=0.02))
+        expected = patient.state.copy()
+
+        patient.restore(snapshot)
+        patient.step(Action(CHO=0, insulin=0.02))
+        np.testing.assert_allclose(patient.state, expected)
+
+    def test_rollout_matches_patient(self):
+        patient = T1DPatient.withName('child#003')
+        patient.step(Action(CHO=50, insulin=0.02))
+        snapshot = patient.snapshot()
+
+        insulin = np.full((2, 120), 0.02)
+        insulin[1, :10] = 0.3
+        glucose = BatchT1DModel.withName('child#003').rollout(
+            snapshot, insulin)
+        for row in range(2):
+            patient.restore(snapshot)
+            expected = []
+            for rate in insulin[row]:
+                patient.step(Action(CHO=0, insulin=rate))
+                expected.append(patient.observation.Gsub)
+            np.testing.assert_allclose(glucose[row], expected, rtol=1e-4)
+
+
+class TestMPCController(unittest.TestCase):
+    def test_closed_loop(self):
+        start_time = datetime(2018, 1, 1, 0, 0, 0)
+        scenario = CustomScenario(start_time=start_time,
+                                  scenario=[(0.5, 50)])
+        env = T1DSimEnv(T1DPatient.withName('adolescent#002'),
+                        CGMSensor.withName('Dexcom', seed=1),
+                        InsulinPump.withName('Insulet'), scenario)
+        controller = MPCController(horizon=120,
+                                   n_blocks=2,
+                                   n_candidates=64,
+                                   n_elites=8,
+                                   time_budget=1.0,
+                                   seed=1)
+        sim_obj = SimObj(env, controller, timedelta(hours=3),
+                         animate=False, path=output_folder)
+        sim_obj.simulate()
+        results = sim_obj.results()
+
+        self.assertGreater(controller.n_rollouts, 0)
+        self.assertTrue(all(results.insulin.dropna() >= 0))
+        self.assertGreater(results.BG.min(), 70)
+        self.assertLess(results.BG.max(), 250)
+
+    def test_time_budget(self):
+        patient = T1DPatient.withName('adult#002')
+        patient.step(Action(CHO=40, insulin=0.02))
+        controller = MPCController(time_budget=0.01, seed=1)
+        rates, _ = controller._optimize(controller._model('adult#002'),
+                                        patient.snapshot())
+        self.assertEqual(len(rates), controller.horizon)
+        self.assertTrue(np.all(rates >= 0))
+        self.assertLess(controller.last_decision_time, 0.5)
+
+    def test_snapshot_only_when_asked(self):
+        scenario = CustomScenario(start_time=datetime(2018, 1, 1),
+                                  scenario=[])
+        env = T1DSimEnv(T1DPatient.withName('adult#001'),
+                        CGMSensor.withName('Dexcom', seed=1),
+                        InsulinPump.withName('Insulet'), scenario)
+        info = env.step(CtrlAction(basal=0, bolus=0)).info
+        self.assertNotIn('patient_snapshot', info)
+        self.assertNotIn('features', info)
+        env.snapshots = True
+        info = env.step(CtrlAction(basal=0, bolus=0)).info
+        self.assertEqual(info['patient_snapshot'].t, env.patient.t)
+
+    def test_needs_snapshot(self):
+        with self.assertRaises(ValueError):
+            MPCController().policy(None, 0, False, patient_name='adult#001')
+
+    def tearDown(self):
+        shutil.rmtree(output_folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
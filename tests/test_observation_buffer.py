@@ -0,0 +1,41 @@
+import unittest
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from simglucose.controller.observation_buffer import ObservationBuffer
+
+
+class TestObservationBuffer(unittest.TestCase):
+    def setUp(self):
+        self.start_time = datetime(2018, 1, 1, 0, 0, 0)
+        self.buffer = ObservationBuffer(4, ['CGM', 'carbs'])
+
+    def test_ring(self):
+        for k in range(6):
+            self.buffer.append(self.start_time + timedelta(minutes=5 * k),
+                               [100 + k, np.nan])
+        self.assertEqual(len(self.buffer), 4)
+        df = self.buffer.to_frame()
+        self.assertEqual(list(df.CGM), [102, 103, 104, 105])
+        self.assertEqual(df.index[0], self.start_time + timedelta(minutes=10))
+        self.assertEqual(df.index.name, 'date')
+        self.assertTrue(df.carbs.isnull().all())
+
+    def test_overwrite_last(self):
+        self.buffer.append(self.start_time, [100, np.nan])
+        self.buffer.append(self.start_time, [100, 20])
+        self.assertEqual(len(self.buffer), 1)
+        self.assertEqual(self.buffer.to_frame().carbs.iloc[0], 20)
+        with self.assertRaises(ValueError):
+            self.buffer.append(self.start_time - timedelta(minutes=1),
+                               [90, np.nan])
+
+    def test_empty(self):
+        df = self.buffer.to_frame()
+        self.assertEqual(len(df), 0)
+        self.assertIsInstance(df.index, pd.DatetimeIndex)
+        self.assertIsNone(self.buffer.last_time)
+
+
+if __name__ == '__main__':
+    unittest.main()
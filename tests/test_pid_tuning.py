@@ -0,0 +1,75 @@
+import unittest
+from datetime import datetime, timedelta
+from simglucose.controller.pid_tuning import PIDGainSearch, GAIN_BOUNDS
+from simglucose.controller.pid_tuning import _to_gains, _from_gains
+from simglucose.simulation.scenario import CustomScenario
+from unittest.mock import patch
+import numpy as np
+import tempfile
+import os
+
+start_time = datetime(2018, 1, 1, 0, 0, 0)
+
+
+def make_search(**kwargs):
+    scenarios = [
+        CustomScenario(start_time=start_time, scenario=[(0.2, 40)]),
+        CustomScenario(start_time=start_time, scenario=[(0.5, 60)])
+    ]
+    return PIDGainSearch(['adolescent#001'], scenarios, timedelta(hours=3),
+                         parallel=False, **kwargs)
+
+
+class TestPIDGainSearch(unittest.TestCase):
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_path = os.path.join(tmpdir, 'gains.json')
+            search = make_search(cache_path=cache_path)
+            result, = search.evaluate([(1e-4, 1e-7, 0)])
+            self.assertFalse(result.pruned)
+            self.assertEqual(result.n_runs, 2)
+            self.assertEqual(search.best, result)
+
+            resumed = make_search(cache_path=cache_path)
+            with patch.object(PIDGainSearch, '_run') as run:
+                cached, = resumed.evaluate([(1e-4, 1e-7, 0)])
+                run.assert_not_called()
+            self.assertAlmostEqual(cached.cost, result.cost)
+
+            for changed in [dict(target=120), dict(bg_bounds=(70, 180)),
+                            dict(sensor_name='GuardianRT')]:
+                other = make_search(cache_path=cache_path, **changed)
+                self.assertIsNone(other.best)
+                with patch.object(PIDGainSearch, '_run',
+                                  return_value=1.0) as run:
+                    new, = other.evaluate([(1e-4, 1e-7, 0)])
+                    self.assertEqual(run.call_count, 2)
+                self.assertEqual(new.cost, 1.0)
+
+            # the results of every configuration are kept
+            resumed = make_search(cache_path=cache_path)
+            self.assertAlmostEqual(resumed.best.cost, result.cost)
+            other = make_search(cache_path=cache_path, target=120)
+            self.assertEqual(other.best.cost, 1.0)
+
+    def test_pruning(self):
+        search = make_search()
+        good, = search.evaluate([(1e-4, 1e-7, 0)])
+        # a huge gain sends the patient into hypoglycemia
+        bad, = search.evaluate([(1.0, 0, 0)])
+        self.assertTrue(bad.pruned)
+        self.assertEqual(bad.n_runs, 1)
+        self.assertGreater(bad.cost, good.cost)
+        self.assertEqual(search.best, good)
+        self.assertEqual(len(search.to_frame()), 2)
+
+    def test_gain_scaling(self):
+        u = np.random.RandomState(0).uniform(size=(5, 3))
+        gains = _to_gains(u, GAIN_BOUNDS)
+        for k in range(5):
+            np.testing.assert_allclose(_from_gains(gains[k], GAIN_BOUNDS),
+                                       u[k])
+
+
+if __name__ == '__main__':
+    unittest.main()
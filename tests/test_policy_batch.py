@@ -0,0 +1,97 @@
+import unittest
+from simglucose.controller.base import Controller, Action
+from simglucose.controller.basal_bolus_ctrller import BBController
+from simglucose.controller.pid_ctrller import PIDController
+from simglucose.simulation.env import Observation
+import numpy as np
+
+PATIENTS = ['adolescent#001', 'adult#003', 'child#005', 'adult#010']
+
+
+class ConstantController(Controller):
+    def policy(self, observation, reward, done, **info):
+        return Action(basal=observation.CGM / 1000, bolus=info['meal'])
+
+    def reset(self):
+        pass
+
+
+def batch(glucose, meals):
+    observations = [Observation(CGM=g) for g in glucose]
+    infos = [{'patient_name': name, 'meal': meal, 'sample_time': 3}
+             for name, meal in zip(PATIENTS, meals)]
+    return observations, infos
+
+
+class TestPolicyBatch(unittest.TestCase):
+    def assert_matches_policy(self, batch_ctrller, ctrllers, steps):
+        for glucose, meals in steps:
+            observations, infos = batch(glucose, meals)
+            action = batch_ctrller.policy_batch(observations, infos)
+            self.assertEqual(action.basal.shape, (len(PATIENTS), ))
+            for i, ctrller in enumerate(ctrllers):
+                expected = ctrller.policy(observations[i], 0, False,
+                                          **infos[i])
+                self.assertAlmostEqual(action.basal[i], expected.basal)
+                self.assertAlmostEqual(action.bolus[i], expected.bolus)
+
+    def test_default_loops_over_policy(self):
+        observations, infos = batch([100, 200, 150, 80], [0, 10, 0, 5])
+        action = ConstantController(0).policy_batch(observations, infos)
+        np.testing.assert_allclose(action.basal, [0.1, 0.2, 0.15, 0.08])
+        np.testing.assert_allclose(action.bolus, [0, 10, 0, 5])
+
+    def test_bb_controller(self):
+        steps = [([100, 200, 150, 80], [0, 10, 0, 5]),
+                 ([180, 120, 250, 60], [20, 0, 15, 0])]
+        self.assert_matches_policy(BBController(), [BBController()] * 4,
+                                   steps)
+        self.assert_matches_policy(BBController(use_tdd_settings=True),
+                                   [BBController(use_tdd_settings=True)] * 4,
+                                   steps)
+
+    def test_pid_controller(self):
+        steps = [([100, 200, 150, 80], [0, 10, 0, 5]),
+                 ([110, 190, 160, 90], [0, 0, 0, 0]),
+                 ([130, 170, 180, 95], [0, 0, 0, 0])]
+        params = dict(P=0.001, I=0.00001, D=0.001)
+        self.assert_matches_policy(PIDController(**params),
+                                   [PIDController(**params) for _ in PATIENTS],
+                                   steps)
+        self.assert_matches_policy(
+            PIDController(is_fully_automated=False, **params),
+            [PIDController(is_fully_automated=False, **params)
+             for _ in PATIENTS], steps)
+
+    def test_pid_reset(self):
+        ctrller = PIDController(P=0.001, I=0.00001, D=0.001)
+        observations, infos = batch([100, 200, 150, 80], [0, 0, 0, 0])
+        first = ctrller.policy_batch(observations, infos)
+        ctrller.policy_batch(observations, infos)
+        ctrller.reset()
+        np.testing.assert_allclose(
+            ctrller.policy_batch(observations, infos).basal, first.basal)
+
+    def test_pid_new_cohort(self):
+        params = dict(P=0.001, I=0.00001, D=0.001)
+        ctrller = PIDController(**params)
+        observations, infos = batch([100, 200, 150, 80], [0, 0, 0, 0])
+        ctrller.policy_batch(observations, infos)
+        # a cohort of the same size starts from a zero state, and a patient
+        # that stays keeps its state wherever it is in the batch
+        cohort = [dict(info, patient_name=name) for info, name in zip(
+            infos, ['adult#001', 'adult#002', PATIENTS[0], 'adult#004'])]
+        action = ctrller.policy_batch(observations, cohort)
+        fresh = PIDController(**params).policy_batch(observations, cohort)
+        np.testing.assert_allclose(action.basal[[0, 1, 3]],
+                                   fresh.basal[[0, 1, 3]])
+        single = PIDController(**params)
+        single.policy(observations[0], 0, False, **infos[0])
+        expected = single.policy(observations[2], 0, False, **cohort[2])
+        self.assertAlmostEqual(action.basal[2], expected.basal)
+
+        with self.assertRaises(ValueError):
+            ctrller.policy_batch(observations, [infos[0]] * 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+from simglucose.simulation.env import T1DSimEnv
+from simglucose.controller.basal_bolus_ctrller import BBController
+from simglucose.sensor.cgm import CGMSensor
+from simglucose.actuator.pump import InsulinPump
+from simglucose.patient.t1dpatient import T1DPatient
+from simglucose.simulation.scenario import CustomScenario
+from simglucose.simulation.sim_engine import SimObj
+from simglucose.simulation.profiler import LatencyProfiler
+from datetime import datetime, timedelta
+import pandas as pd
+import shutil
+import os
+
+save_folder = os.path.join(os.path.dirname(__file__), 'results')
+
+
+class TestLatencyProfiler(unittest.TestCase):
+    def test_summary(self):
+        profiler = LatencyProfiler()
+        for ms in range(1, 101):
+            profiler.record('policy', ms / 1000)
+        profiler.wall_time = 10.0
+        profiler.sim_minutes = 720
+
+        row = profiler.summary().loc['policy']
+        self.assertEqual(row.calls, 100)
+        self.assertAlmostEqual(row.p50_ms, 50.5)
+        self.assertAlmostEqual(row.max_ms, 100)
+        self.assertAlmostEqual(row.calls_per_day, 200)
+        self.assertAlmostEqual(row.wall_share, 0.505)
+        self.assertIn('policy', str(profiler))
+
+    def test_histogram(self):
+        profiler = LatencyProfiler()
+        counts, edges = profiler.histogram('policy', bins=5)
+        self.assertEqual(list(counts), [0] * 5)
+        self.assertEqual(len(edges), 0)
+        for ms in [0, 1, 1, 10]:
+            profiler.record('policy', ms / 1000)
+        counts, edges = profiler.histogram('policy', bins=5)
+        self.assertEqual(counts.sum(), 4)
+        self.assertEqual(len(edges), 6)
+
+    def test_profiled_simulation(self):
+        start_time = datetime(2018, 1, 1, 0, 0, 0)
+        env = T1DSimEnv(T1DPatient.withName('adolescent#001'),
+                        CGMSensor.withName('Dexcom', seed=1),
+                        InsulinPump.withName('Insulet'),
+                        CustomScenario(start_time=start_time,
+                                       scenario=[(1, 50)]))
+        s = SimObj(env, BBController(), timedelta(hours=6), animate=False,
+                   path=save_folder, profile=True)
+        s.simulate()
+        s.save_results()
+
+        summary = s.profiler.summary()
+        self.assertEqual(summary.loc['BBController.policy'].calls, 120)
+        self.assertEqual(summary.loc['T1DSimEnv.step'].calls, 120)
+        self.assertEqual(summary.loc['patient.step'].calls, 360)
+        self.assertAlmostEqual(
+            summary.loc['BBController.policy'].calls_per_day, 480)
+        self.assertLessEqual(summary.wall_share.max(), 1)
+        self.assertIsNone(env.profiler)
+
+        saved = pd.read_csv(
+            os.path.join(save_folder, 'profiles',
+                         s.run_name + '_latency.csv'),
+            index_col=0)
+        self.assertEqual(list(saved.index), list(summary.index))
+
+    def tearDown(self):
+        shutil.rmtree(save_folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
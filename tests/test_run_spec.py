@@ -0,0 +1,77 @@
+import unittest
+from simglucose.simulation.run_spec import RunSpec, BankScenario
+from simglucose.simulation.scenario_bank import ScenarioBank
+from simglucose.simulation.scenario import CustomScenario
+from simglucose.simulation.sim_engine import SimObj, sim, batch_sim
+from simglucose.simulation.env import T1DSimEnv
+from simglucose.simulation.executors import ProcessExecutor
+from simglucose.simulation.scenario_gen import RandomScenario
+from simglucose.controller.basal_bolus_ctrller import BBController
+from simglucose.controller.pid_ctrller import PIDController
+from simglucose.patient.t1dpatient import T1DPatient
+from simglucose.sensor.cgm import CGMSensor
+from simglucose.actuator.pump import InsulinPump
+from pandas.testing import assert_frame_equal
+from datetime import datetime, timedelta
+import pickle
+import tempfile
+import os
+
+start_time = datetime(2018, 1, 1, 0, 0, 0)
+sim_time = timedelta(hours=6)
+
+
+class TestRunSpec(unittest.TestCase):
+    def test_matches_sim_obj(self):
+        spec = RunSpec('adult#003', sim_time, BBController,
+                       start_time=start_time, scenario_seed=4, sensor_seed=2)
+        env = T1DSimEnv(T1DPatient.withName('adult#003'),
+                        CGMSensor.withName('Dexcom', seed=2),
+                        InsulinPump.withName('Insulet'),
+                        RandomScenario(start_time=start_time, seed=4))
+        sim_obj = SimObj(env, BBController(), sim_time, animate=False)
+        self.assertLess(len(pickle.dumps(spec)), 1000)
+        assert_frame_equal(sim(spec), sim(sim_obj))
+
+    def test_patient_params(self):
+        spec = RunSpec('adult#003', sim_time, BBController,
+                       patient_params={'BW': 90.0},
+                       patient_kwargs={'random_init_bg': True, 'seed': 1})
+        patient = spec.build().env.patient
+        self.assertEqual(patient._params.BW, 90.0)
+        self.assertTrue(patient.random_init_bg)
+        self.assertNotEqual(
+            RunSpec('adult#003', sim_time,
+                    BBController).build().env.patient._params.BW, 90.0)
+
+    def test_scenarios(self):
+        custom = CustomScenario(start_time=start_time, scenario=[(1, 20)])
+        built = RunSpec('child#001', sim_time, BBController,
+                        scenario=custom).build().env.scenario
+        self.assertIsNot(built, custom)
+        self.assertEqual(built.scenario, custom.scenario)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'bank')
+            ScenarioBank.from_random(path, 2, start_time, sim_time, seed=1)
+            scenario = RunSpec('child#001', sim_time, BBController,
+                               scenario=BankScenario(path, 1)).build(
+                               ).env.scenario
+            bank = ScenarioBank(path)
+            self.assertEqual(scenario.scenario,
+                             bank.scenario(1, start_time).scenario)
+
+    def test_process_executor(self):
+        specs = [
+            RunSpec(name, sim_time, PIDController,
+                    controller_kwargs=dict(P=0.001, I=0.00001, D=0.001),
+                    scenario_seed=1, sensor_seed=1)
+            for name in ['adolescent#001', 'adult#001', 'unknown']
+        ]
+        results = batch_sim(specs, executor=ProcessExecutor(max_workers=2))
+        self.assertEqual(len(results[0]), len(results[1]))
+        self.assertIn('Unknown patient', results[2].error)
+
+
+if __name__ == '__main__':
+    unittest.main()
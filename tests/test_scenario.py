@@ -0,0 +1,94 @@
+import unittest
+import numpy as np
+from datetime import datetime, timedelta
+from simglucose.simulation.scenario import CustomScenario
+from simglucose.simulation.scenario_gen import (RandomScenario,
+                                                create_meal_vectors)
+
+
+class TestCustomScenario(unittest.TestCase):
+    def setUp(self):
+        self.start_time = datetime(2018, 1, 1, 0, 0, 0)
+        self.meals = [(1, 50), (timedelta(hours=2), 10),
+                      (datetime(2018, 1, 1, 3, 0, 0), 20), (1, 99)]
+        self.scenario = CustomScenario(start_time=self.start_time,
+                                       scenario=self.meals)
+
+    def test_get_action(self):
+        t = self.start_time
+        actions = {}
+        while t < self.start_time + timedelta(hours=4):
+            meal = self.scenario.get_action(t).meal
+            if meal > 0:
+                actions[t] = meal
+            t += timedelta(minutes=1)
+        self.assertEqual(actions, {
+            # the two meals at 1 h are added up
+            self.start_time + timedelta(hours=1): 149,
+            self.start_time + timedelta(hours=2): 10,
+            self.start_time + timedelta(hours=3): 20,
+        })
+
+    def test_meal_vector(self):
+        meals = self.scenario.meal_vector(timedelta(hours=4))
+        self.assertEqual(len(meals), 240)
+        self.assertEqual(meals.sum(), 179)
+        self.assertEqual(meals[60], 149)
+
+        meals = self.scenario.meal_vector(240, sample_time=3)
+        self.assertEqual(len(meals), 80)
+        np.testing.assert_array_equal(np.nonzero(meals)[0], [20, 40, 60])
+
+    def test_update_scenario(self):
+        self.scenario.scenario = [(0.5, 30)]
+        t = self.start_time + timedelta(minutes=30)
+        self.assertEqual(self.scenario.get_action(t).meal, 30)
+        self.assertEqual(
+            self.scenario.get_action(t + timedelta(minutes=30)).meal, 0)
+
+    def test_empty_scenario(self):
+        scenario = CustomScenario(start_time=self.start_time, scenario=[])
+        self.assertEqual(scenario.get_action(self.start_time).meal, 0)
+        self.assertEqual(scenario.meal_vector(10).sum(), 0)
+
+
+class TestRandomScenario(unittest.TestCase):
+    def setUp(self):
+        self.start_time = datetime(2018, 1, 1, 6, 0, 0)
+        self.sim_time = timedelta(days=3)
+
+    def test_meal_vectors_reproducible(self):
+        meals1 = create_meal_vectors(self.start_time, self.sim_time,
+                                     n_patients=4, seed=1)
+        meals2 = create_meal_vectors(self.start_time, self.sim_time,
+                                     n_patients=4, seed=1)
+        meals3 = create_meal_vectors(self.start_time, self.sim_time,
+                                     n_patients=4, seed=2)
+        self.assertEqual(meals1.shape, (4, 3 * 24 * 60))
+        np.testing.assert_array_equal(meals1, meals2)
+        self.assertFalse(np.array_equal(meals1, meals3))
+
+    def test_meals_within_daily_windows(self):
+        meals = create_meal_vectors(self.start_time, self.sim_time,
+                                    n_patients=20, seed=0)
+        p, k = np.nonzero(meals)
+        minute_of_day = (k + 6 * 60) % (24 * 60)
+        self.assertTrue(np.all(minute_of_day >= 5 * 60))
+        self.assertTrue(np.all(minute_of_day <= 23 * 60))
+
+    def test_vectorized_scenario(self):
+        scenario = RandomScenario(start_time=self.start_time, seed=1,
+                                  sim_time=self.sim_time)
+        meals = scenario.meal_vector(self.sim_time)
+        np.testing.assert_array_equal(
+            meals,
+            create_meal_vectors(self.start_time, self.sim_time, seed=1)[0])
+        for k in np.nonzero(meals)[0]:
+            t = self.start_time + timedelta(minutes=int(k))
+            self.assertEqual(scenario.get_action(t).meal, meals[k])
+        self.assertEqual(
+            scenario.get_action(self.start_time + self.sim_time).meal, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
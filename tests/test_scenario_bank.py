@@ -0,0 +1,94 @@
+import unittest
+import pickle
+import shutil
+import os
+import numpy as np
+from datetime import datetime, timedelta
+from simglucose.simulation.scenario import CustomScenario
+from simglucose.simulation.scenario_gen import create_meal_vectors
+from simglucose.simulation.scenario_bank import ScenarioBank, ScenarioBankWriter
+from simglucose.simulation.scenario_stream import StreamScenario
+
+bank_folder = os.path.join(os.path.dirname(__file__), 'scenario_bank')
+
+
+class TestScenarioBank(unittest.TestCase):
+    def setUp(self):
+        self.start_time = datetime(2018, 1, 1, 0, 0, 0)
+        self.sim_time = timedelta(days=2)
+
+    def test_random_bank(self):
+        bank = ScenarioBank.from_random(bank_folder, 25, self.start_time,
+                                        self.sim_time, seed=1, chunk_size=10)
+        self.assertEqual(len(bank), 25)
+        self.assertEqual(bank.start_time, self.start_time)
+        for i in range(len(bank)):
+            meals = bank.meal_vector(i)
+            self.assertEqual(len(meals), 2 * 24 * 60)
+            self.assertGreater(meals.sum(), 0)
+
+        again = ScenarioBank.from_random(bank_folder + '2', 25,
+                                         self.start_time, self.sim_time,
+                                         seed=1, chunk_size=10)
+        for i in range(len(bank)):
+            np.testing.assert_array_equal(bank.meal_vector(i),
+                                          again.meal_vector(i))
+
+    def test_round_trip(self):
+        meals = create_meal_vectors(self.start_time, self.sim_time,
+                                    n_patients=3, seed=0)
+        custom = CustomScenario(self.start_time, [(1, 20), (25.5, 40)])
+        with ScenarioBankWriter(bank_folder, horizon=self.sim_time,
+                                start_time=self.start_time) as writer:
+            writer.add_meal_vectors(meals)
+            writer.add_scenario(custom)
+            writer.add([], [])
+
+        bank = pickle.loads(pickle.dumps(ScenarioBank(bank_folder)))
+        self.assertEqual(len(bank), 5)
+        for i in range(3):
+            np.testing.assert_array_equal(bank.meal_vector(i), meals[i])
+        times, amounts = bank[3]
+        np.testing.assert_array_equal(times, [60, 25.5 * 60])
+        np.testing.assert_array_equal(amounts, [20, 40])
+        self.assertEqual(len(bank[-1][0]), 0)
+
+        scenario = bank.scenario(3)
+        t = self.start_time + timedelta(hours=25.5)
+        self.assertEqual(scenario.get_action(t).meal, 40)
+
+    def test_duplicate_meal_times(self):
+        # every scenario source adds up meals at the same minute
+        meals = [(timedelta(minutes=60), 20), (timedelta(minutes=60), 10),
+                 (timedelta(minutes=90), 35)]
+        expected = np.zeros(120)
+        expected[60], expected[90] = 30, 35
+
+        custom = CustomScenario(start_time=self.start_time, scenario=meals)
+        np.testing.assert_array_equal(custom.meal_vector(120), expected)
+
+        with ScenarioBankWriter(bank_folder, horizon=120,
+                                start_time=self.start_time) as writer:
+            writer.add([60, 60, 90], [20, 10, 35])
+        bank = ScenarioBank(bank_folder)
+        np.testing.assert_array_equal(bank.meal_vector(0), expected)
+        np.testing.assert_array_equal(bank.scenario(0).meal_vector(120),
+                                      expected)
+
+        os.makedirs(bank_folder, exist_ok=True)
+        filename = os.path.join(bank_folder, 'meals.csv')
+        with open(filename, 'w') as f:
+            f.write('time,meal\n1,20\n1,10\n1.5,35\n')
+        stream = StreamScenario(self.start_time, filename)
+        np.testing.assert_array_equal([
+            stream.get_action(self.start_time + timedelta(minutes=k)).meal
+            for k in range(120)
+        ], expected)
+
+    def tearDown(self):
+        for folder in (bank_folder, bank_folder + '2'):
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import copy
+import os
+import shutil
+import pandas as pd
+from datetime import datetime, timedelta
+from simglucose.simulation.scenario_stream import StreamScenario
+
+log_folder = os.path.join(os.path.dirname(__file__), 'meal_logs')
+
+
+class TestStreamScenario(unittest.TestCase):
+    def setUp(self):
+        os.makedirs(log_folder, exist_ok=True)
+        self.start_time = datetime(2018, 1, 1, 0, 0, 0)
+        self.filename = os.path.join(log_folder, 'meals.csv')
+        pd.DataFrame({
+            'time': ['2018-01-01 01:00:10', '2018-01-01 01:00:20',
+                     '2018-01-01 02:00:00', '2018-01-01 02:30:00',
+                     '2018-01-02 07:00:00'],
+            'meal': [20, 10, 0, 35, 50],
+        }).to_csv(self.filename, index=False)
+
+    def collect_meals(self, scenario, hours):
+        meals = {}
+        t = self.start_time
+        while t < self.start_time + timedelta(hours=hours):
+            meal = scenario.get_action(t).meal
+            if meal > 0:
+                meals[(t - self.start_time) / timedelta(minutes=1)] = meal
+            t += timedelta(minutes=1)
+        return meals
+
+    def test_stream(self):
+        scenario = StreamScenario(self.start_time, self.filename, chunksize=2)
+        expected = {60: 30, 150: 35, 31 * 60: 50}
+        self.assertEqual(self.collect_meals(scenario, 36), expected)
+
+        scenario.reset()
+        self.assertEqual(self.collect_meals(scenario, 36), expected)
+
+    def test_same_minute_across_chunks(self):
+        # the meals at 01:00 are split 1 | 2 or 2 | 1 by the chunks
+        filename = os.path.join(log_folder, 'boundary.csv')
+        pd.DataFrame({
+            'time': ['2018-01-01 00:30:00', '2018-01-01 01:00:00',
+                     '2018-01-01 01:00:00', '2018-01-01 01:00:00',
+                     '2018-01-01 02:00:00'],
+            'meal': [5, 20, 10, 1, 35],
+        }).to_csv(filename, index=False)
+        expected = {30: 5, 60: 31, 120: 35}
+        for chunksize in (1, 2, 3, 10):
+            scenario = StreamScenario(self.start_time, filename,
+                                      chunksize=chunksize)
+            self.assertEqual(self.collect_meals(scenario, 3), expected)
+        self.assertEqual(
+            self.collect_meals(copy.deepcopy(scenario), 36), expected)
+
+    def test_hours_since_start(self):
+        filename = os.path.join(log_folder, 'hours.csv')
+        pd.DataFrame({'t': [0.5, 3], 'carbs': [15, 25]}).to_csv(filename)
+        scenario = StreamScenario(self.start_time, filename, time_col='t',
+                                  meal_col='carbs')
+        self.assertEqual(self.collect_meals(scenario, 4), {30: 15, 180: 25})
+
+    def test_unordered_log(self):
+        filename = os.path.join(log_folder, 'unordered.csv')
+        pd.DataFrame({'time': [2, 1], 'meal': [15, 25]}).to_csv(filename)
+        scenario = StreamScenario(self.start_time, filename)
+        with self.assertRaises(ValueError):
+            scenario.get_action(self.start_time)
+
+    def tearDown(self):
+        shutil.rmtree(log_folder)
+
+
+if __name__ == '__main__':
+    unittest.main()
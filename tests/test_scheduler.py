@@ -0,0 +1,126 @@
+import unittest
+from simglucose.simulation.scheduler import CostAwareScheduler, CostModel
+from simglucose.simulation.run_spec import RunSpec
+from simglucose.simulation.sim_engine import batch_sim
+from simglucose.simulation.executors import ProcessExecutor, ThreadExecutor
+from simglucose.simulation.executors import is_failure
+from simglucose.simulation.cache import ResultCache
+from simglucose.simulation.journal import RunJournal
+from simglucose.controller.basal_bolus_ctrller import BBController
+from simglucose.controller.pid_ctrller import PIDController
+from pandas.testing import assert_frame_equal
+from datetime import timedelta
+import pandas as pd
+import tempfile
+import time
+import os
+
+
+def sleep(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def stopped_run(spec):
+    time.sleep(0.2)
+    return pd.DataFrame({'BG': range(11)},
+                        index=pd.date_range('2018-01-01', periods=11,
+                                            freq='3min'))
+
+
+class TestCostModel(unittest.TestCase):
+    def test_estimate(self):
+        model = CostModel(rates={'BBController': 0.01}, smoothing=0.5)
+        short = RunSpec('adolescent#001', timedelta(hours=1), BBController)
+        long = short._replace(sim_time=timedelta(days=1))
+        self.assertAlmostEqual(model.estimate(short), 0.6)
+        self.assertAlmostEqual(model.estimate(long), 14.4)
+        self.assertEqual(model.rate(short._replace(controller=PIDController)),
+                         model.rates['PIDController'])
+
+        model.observe(short, 1.8)
+        self.assertAlmostEqual(model.rates['BBController'], 0.02)
+        # a run stopped after 30 of its 60 minutes
+        model.observe(short, 1.8, minutes=30)
+        self.assertAlmostEqual(model.rates['BBController'], 0.04)
+        model.rates['BBController'] = 0.02
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            model.path = os.path.join(tmpdir, 'rates.json')
+            model.save()
+            self.assertAlmostEqual(
+                CostModel(path=model.path).rates['BBController'], 0.02)
+
+
+class TestExecutorImap(unittest.TestCase):
+    def test_streaming(self):
+        executor = ThreadExecutor(max_workers=2)
+        completed = [i for i, _ in executor.imap(sleep, [0.6, 0.05, 0.3])]
+        self.assertEqual(completed, [1, 2, 0])
+        completed = [i for i, _ in executor.imap(sleep, [0.3, 0.05, 0.6],
+                                                 order=[2, 0, 1])]
+        self.assertEqual(completed, [0, 1, 2])
+
+
+class TestCostAwareScheduler(unittest.TestCase):
+    def test_longest_first(self):
+        specs = [
+            RunSpec('adolescent#001', timedelta(hours=hours), BBController,
+                    scenario_seed=1, sensor_seed=1) for hours in (1, 4, 2)
+        ] + [RunSpec('unknown', timedelta(hours=3), BBController)]
+        scheduler = CostAwareScheduler()
+        self.assertEqual(scheduler.order(specs), [1, 3, 2, 0])
+
+        streamed = list(scheduler.imap(specs))
+        self.assertEqual([i for i, _ in streamed], [1, 3, 2, 0])
+        self.assertTrue(is_failure(streamed[1][1]))
+        self.assertNotEqual(scheduler.cost_model.rates['BBController'],
+                            CostModel().rates['BBController'])
+
+        scheduler = CostAwareScheduler(ProcessExecutor(max_workers=2))
+        results = batch_sim(specs, scheduler=scheduler)
+        expected = batch_sim(specs)
+        for a, b in zip(results[:3], expected[:3]):
+            assert_frame_equal(a, b)
+        self.assertTrue(is_failure(results[3]))
+
+    def test_cache_hits_not_timed(self):
+        specs = [
+            RunSpec('adolescent#001', timedelta(hours=1), BBController,
+                    scenario_seed=seed, sensor_seed=1) for seed in (1, 2)
+        ]
+        scheduler = CostAwareScheduler()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = ResultCache(tmpdir)
+            batch_sim(specs, cache=cache, scheduler=scheduler)
+            rates = dict(scheduler.cost_model.rates)
+            self.assertNotEqual(rates['BBController'],
+                                CostModel().rates['BBController'])
+            batch_sim(specs, cache=cache, scheduler=scheduler)
+            self.assertEqual(cache.hits, 2)
+            self.assertEqual(scheduler.cost_model.rates, rates)
+
+    def test_early_stop_rate(self):
+        # a one day run that stopped after 30 min is timed per 30 min
+        spec = RunSpec('adolescent#001', timedelta(days=1), BBController)
+        scheduler = CostAwareScheduler(cost_model=CostModel(smoothing=1.0))
+        scheduler.map([spec], fn=stopped_run)
+        self.assertAlmostEqual(scheduler.cost_model.rates['BBController'],
+                               0.2 / 30, delta=0.1 / 30)
+
+    def test_conflicting_arguments(self):
+        specs = [RunSpec('adolescent#001', timedelta(hours=1), BBController)]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with self.assertRaises(ValueError):
+                batch_sim(specs, executor=ThreadExecutor(),
+                          scheduler=CostAwareScheduler())
+            with self.assertRaises(ValueError):
+                batch_sim(specs, journal=RunJournal(tmpdir),
+                          scheduler=CostAwareScheduler())
+            with self.assertRaises(ValueError):
+                batch_sim(specs, journal=RunJournal(tmpdir),
+                          cache=ResultCache(tmpdir))
+
+
+if __name__ == '__main__':
+    unittest.main()
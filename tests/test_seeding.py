@@ -0,0 +1,52 @@
+import unittest
+from simglucose.simulation.seeding import run_seeds, spawn_seeds, seed_specs
+from simglucose.simulation.run_spec import RunSpec
+from simglucose.simulation.sim_engine import batch_sim
+from simglucose.simulation.executors import ProcessExecutor
+from simglucose.controller.basal_bolus_ctrller import BBController
+from simglucose.envs.simglucose_gym_env import T1DSimEnv
+from pandas.testing import assert_frame_equal
+from datetime import timedelta
+import numpy as np
+
+
+class TestSeeding(unittest.TestCase):
+    def test_spawn(self):
+        seeds = spawn_seeds(42, 4)
+        self.assertEqual(seeds[2], run_seeds(42, 2))
+        self.assertEqual(seeds, spawn_seeds(42, 4))
+        self.assertNotEqual(seeds, spawn_seeds(43, 4))
+        values = np.array(seeds).ravel()
+        self.assertEqual(len(np.unique(values)), len(values))
+        self.assertTrue((values < 2**32).all())
+
+    def test_independent_of_scheduling(self):
+        names = ['adolescent#001', 'adult#001', 'child#001']
+        specs = seed_specs([
+            RunSpec(name, timedelta(hours=2), BBController,
+                    patient_kwargs={'random_init_bg': True})
+            for name in names
+        ], root_seed=7)
+        self.assertTrue(specs[0].patient_kwargs['random_init_bg'])
+
+        serial = batch_sim(specs)
+        parallel = batch_sim(specs[::-1],
+                             executor=ProcessExecutor(max_workers=2))[::-1]
+        for a, b in zip(serial, parallel):
+            assert_frame_equal(a, b)
+        self.assertFalse(np.allclose(serial[0].CGM - serial[0].BG,
+                                     serial[1].CGM - serial[1].BG))
+
+    def test_gym_env(self):
+        env = T1DSimEnv(patient_name='adolescent#001')
+        obs0, info0 = env.reset(seed=0)
+        obs1, info1 = env.reset(seed=0)
+        self.assertEqual(info0['seeds'], info1['seeds'])
+        np.testing.assert_array_equal(obs0, obs1)
+        _, info2 = env.reset(seed=1)
+        self.assertNotEqual(info0['seeds'], info2['seeds'])
+        self.assertEqual(len(set(info0['seeds'][1:])), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+from simglucose.simulation.shared_results import SharedResults
+from simglucose.simulation.shared_results import batch_sim_shared
+from simglucose.simulation.run_spec import RunSpec
+from simglucose.simulation.sim_engine import sim
+from simglucose.simulation.executors import ProcessExecutor
+from simglucose.controller.basal_bolus_ctrller import BBController
+from pandas.testing import assert_frame_equal
+from datetime import timedelta
+import numpy as np
+import tempfile
+import os
+
+sim_time = timedelta(hours=4)
+
+
+class TestSharedResults(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'results')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_batch(self):
+        names = ['adolescent#001', 'unknown', 'child#002']
+        specs = [
+            RunSpec(name, sim_time, BBController, scenario_seed=k,
+                    sensor_seed=k) for k, name in enumerate(names)
+        ]
+        results, failures = batch_sim_shared(
+            specs, self.path, executor=ProcessExecutor(max_workers=2),
+            keys=names)
+
+        self.assertEqual(list(failures), [1])
+        self.assertEqual(results.values.shape, (3, 81, 9))
+        self.assertEqual(list(results.lengths), [81, 0, 81])
+        self.assertTrue(np.isnan(results.column('BG')[1]).all())
+
+        expected = sim(specs[2])
+        run = results.run(2)
+        self.assertTrue(np.shares_memory(run.values, results.values))
+        assert_frame_equal(run, expected[results.columns],
+                           check_freq=False, check_names=False)
+
+        df = results.to_frame()
+        self.assertEqual(list(df.index.levels[0]),
+                         ['adolescent#001', 'child#002'])
+        self.assertEqual(len(df), 162)
+
+    def test_reopen(self):
+        results = SharedResults.create(self.path, 2, 3, columns=['BG'])
+        self.assertEqual(results.values.shape, (2, 3, 1))
+        self.assertEqual(len(SharedResults(self.path)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+from simglucose.simulation.sinks import CSVSink, NPZSink, ParquetSink
+from simglucose.simulation.sinks import BackgroundWriter, get_sink, parquet
+from simglucose.simulation.run_spec import RunSpec
+from simglucose.simulation.sim_engine import sim, batch_sim
+from simglucose.controller.basal_bolus_ctrller import BBController
+from pandas.testing import assert_frame_equal
+from datetime import timedelta
+import pandas as pd
+import tempfile
+import shutil
+import os
+
+
+class FailingSink(CSVSink):
+    def _write(self, filename, df):
+        raise IOError('disk full')
+
+
+class TestSinks(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = self.tmpdir.name
+        self.df = sim(RunSpec('adolescent#001', timedelta(hours=2),
+                              BBController, scenario_seed=1, sensor_seed=1))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def check_round_trip(self, sink, **kwargs):
+        sink.write('adolescent#001', self.df)
+        self.assertTrue(os.path.exists(sink.filename('adolescent#001')))
+        assert_frame_equal(sink.read('adolescent#001'), self.df,
+                           check_freq=False, **kwargs)
+
+    def test_csv(self):
+        self.check_round_trip(CSVSink(self.path), check_exact=False)
+
+    def test_npz(self):
+        self.check_round_trip(NPZSink(self.path))
+
+    @unittest.skipUnless(parquet, 'needs pyarrow')
+    def test_parquet(self):
+        self.check_round_trip(ParquetSink(self.path))
+
+    def test_get_sink(self):
+        self.assertIsInstance(get_sink('npz', self.path), NPZSink)
+        with self.assertRaises(ValueError):
+            get_sink('hdf5', self.path)
+
+    def test_background_writer(self):
+        with BackgroundWriter(NPZSink(self.path), batch_size=4) as writer:
+            for k in range(10):
+                writer.write('run_{}'.format(k), self.df)
+        self.assertEqual(len(os.listdir(self.path)), 10)
+        assert_frame_equal(NPZSink(self.path).read('run_9'), self.df,
+                           check_freq=False)
+
+        writer = BackgroundWriter(FailingSink(self.path))
+        writer.write('run', self.df)
+        with self.assertRaises(IOError):
+            writer.close()
+
+    def test_sim_with_run_id(self):
+        writer = BackgroundWriter(NPZSink(self.path))
+        specs = [
+            RunSpec('adolescent#001', timedelta(hours=2), BBController,
+                    scenario_seed=seed, sensor_seed=1, sink=writer,
+                    run_id=seed) for seed in (1, 2)
+        ]
+        for spec in specs:
+            sim(spec)
+        writer.close()
+        self.assertEqual(sorted(os.listdir(self.path)),
+                         ['adolescent#001_1.npz', 'adolescent#001_2.npz'])
+        df = NPZSink(self.path).read('adolescent#001_1')
+        self.assertIsInstance(df.index, pd.DatetimeIndex)
+        assert_frame_equal(df, self.df, check_freq=False)
+
+    def test_default_run_name(self):
+        specs = [
+            RunSpec('adolescent#001', timedelta(hours=1), BBController,
+                    scenario_seed=seed, sensor_seed=1, path=self.path)
+            for seed in (1, 2)
+        ] + [
+            RunSpec('adult#001', timedelta(hours=1), BBController,
+                    scenario_seed=1, sensor_seed=1, path=self.path)
+        ]
+        self.assertEqual(specs[0].build().run_name, 'adolescent#001')
+        # only the runs of the same patient are numbered
+        batch_sim(specs)
+        self.assertEqual(
+            sorted(os.listdir(self.path)),
+            ['adolescent#001_0.csv', 'adolescent#001_1.csv', 'adult#001.csv'])
+
+        shutil.rmtree(self.path)
+        sim_objs = [spec.build() for spec in specs[:2]]
+        sim_objs[1].run_id = 'b'
+        batch_sim(sim_objs)
+        self.assertEqual(sorted(os.listdir(self.path)),
+                         ['adolescent#001.csv', 'adolescent#001_b.csv'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+from simglucose.simulation.stop_conditions import DoneStop, ThresholdStop
+from simglucose.simulation.stop_conditions import PredicateStop
+from simglucose.simulation.run_spec import RunSpec
+from simglucose.simulation.sim_engine import sim, batch_sim
+from simglucose.simulation.scenario import CustomScenario
+from simglucose.simulation.sinks import NPZSink
+from simglucose.simulation.executors import ProcessExecutor
+from simglucose.controller.basal_bolus_ctrller import BBController
+from datetime import datetime, timedelta
+import tempfile
+
+start_time = datetime(2018, 1, 1, 0, 0, 0)
+
+
+def info(minutes, bg):
+    return {'time': start_time + timedelta(minutes=minutes), 'bg': bg}
+
+
+def cgm_above_140(observation, reward, done, info):
+    return observation.CGM > 140
+
+
+class TestStopConditions(unittest.TestCase):
+    def test_threshold(self):
+        stop = ThresholdStop(low=70, high=180, duration=15)
+        self.assertIsNone(stop(None, 0, False, info(0, 60)))
+        self.assertIsNone(stop(None, 0, False, info(10, 65)))
+        self.assertEqual(stop(None, 0, False, info(15, 65)), 'hypo')
+        # the count starts over when BG goes back in range
+        self.assertIsNone(stop(None, 0, False, info(20, 100)))
+        self.assertIsNone(stop(None, 0, False, info(25, 200)))
+        self.assertEqual(stop(None, 0, False, info(40, 190)), 'hyper')
+
+        self.assertEqual(DoneStop()(None, 0, True, info(0, 5)), 'done')
+        self.assertIsNone(DoneStop()(None, 0, False, info(0, 100)))
+
+    def test_simulation(self):
+        spec = RunSpec('adolescent#001', timedelta(hours=8), BBController,
+                       scenario=CustomScenario(start_time=start_time,
+                                               scenario=[(1, 150)]),
+                       sensor_seed=1)
+        full = sim(spec)
+        self.assertEqual(full.attrs['termination_reason'], 'sim_time')
+
+        stopped = sim(spec._replace(
+            stop=[DoneStop(), ThresholdStop(high=140, duration=30)]))
+        self.assertEqual(stopped.attrs['termination_reason'], 'hyper')
+        self.assertLess(len(stopped), len(full))
+        self.assertTrue((stopped.BG.iloc[-11:] > 140).all())
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            NPZSink(tmpdir).write('run', stopped)
+            self.assertEqual(
+                NPZSink(tmpdir).read('run').attrs['termination_reason'],
+                'hyper')
+
+        results = batch_sim(
+            [spec._replace(stop=PredicateStop(cgm_above_140, 'cgm')), spec],
+            executor=ProcessExecutor(max_workers=2))
+        self.assertEqual(results[0].attrs['termination_reason'], 'cgm')
+        self.assertEqual(results[1].attrs['termination_reason'], 'sim_time')
+
+
+if __name__ == '__main__':
+    unittest.main()
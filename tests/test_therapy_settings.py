@@ -0,0 +1,36 @@
+import unittest
+from simglucose.controller.basal_bolus_ctrller import BBController
+
+
+class TestTherapySettings(unittest.TestCase):
+    def test_patient_settings(self):
+        ctrller = BBController()
+        quest = ctrller.quest[ctrller.quest.Name == 'adult#001'].iloc[0]
+        params = ctrller.patient_params[
+            ctrller.patient_params.Name == 'adult#001'].iloc[0]
+
+        settings = ctrller.therapy_settings.get('adult#001')
+        self.assertAlmostEqual(settings.basal, params.u2ss * params.BW / 6000)
+        self.assertAlmostEqual(settings.basal_hr, settings.basal * 60)
+        self.assertEqual(settings.cr, quest.CR)
+        self.assertEqual(settings.isf, quest.CF)
+        self.assertIs(ctrller.therapy_settings.get('adult#001'), settings)
+
+    def test_tdd_settings(self):
+        ctrller = BBController(use_tdd_settings=True)
+        tdd = ctrller.quest[ctrller.quest.Name == 'child#002'].TDI.iloc[0]
+        settings = ctrller.therapy_settings.get(
+            'child#002', ctrller.get_therapy_settings_from_tdd)
+        basal_hr, isf, cr = ctrller.get_therapy_settings_from_tdd(tdd)
+        self.assertAlmostEqual(settings.basal_hr, basal_hr)
+        self.assertAlmostEqual(settings.isf, isf)
+        self.assertAlmostEqual(settings.cr, cr)
+
+    def test_unknown_patient(self):
+        settings = BBController().therapy_settings.get('unknown')
+        self.assertAlmostEqual(settings.basal, 1.43 * 57.0 / 6000)
+        self.assertAlmostEqual(settings.cr, 1 / 15)
+
+
+if __name__ == '__main__':
+    unittest.main()
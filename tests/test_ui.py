@@ -1,6 +1,9 @@
 import unittest
 from unittest.mock import patch
 from simglucose.simulation.user_interface import simulate
+from simglucose.simulation.scenario import CustomScenario
+from simglucose.controller.basal_bolus_ctrller import BBController
+from datetime import datetime, timedelta
 import shutil
 import os
 import pandas as pd
@@ -8,6 +11,18 @@ import pandas as pd
 output_folder = os.path.join(os.path.dirname(__file__), 'results')
 
 
+class FailingController(BBController):
+    def __init__(self, failing_patients):
+        super(FailingController, self).__init__()
+        self.failing_patients = failing_patients
+
+    def policy(self, observation, reward, done, **info):
+        if info['patient_name'] in self.failing_patients:
+            raise RuntimeError('controller crashed')
+        return super(FailingController, self).policy(observation, reward,
+                                                     done, **info)
+
+
 class testUI(unittest.TestCase):
     def setUp(self):
         pass
@@ -24,8 +39,30 @@ class testUI(unittest.TestCase):
         results = simulate()
         self.assertIsInstance(results, pd.DataFrame)
 
+    def simulate_with(self, controller):
+        start_time = datetime(2018, 1, 1)
+        return simulate(sim_time=timedelta(hours=2),
+                        scenario=CustomScenario(start_time, [(1, 20)]),
+                        controller=controller,
+                        patient_names=['adolescent#001', 'adult#001'],
+                        cgm_name='Dexcom', cgm_seed=1,
+                        insulin_pump_name='Insulet', start_time=start_time,
+                        save_path=output_folder, animate=False,
+                        parallel=False)
+
+    def test_failed_runs(self):
+        results = self.simulate_with(FailingController(['adolescent#001']))
+        self.assertEqual(list(results.index), ['adult#001'])
+
+        with self.assertRaises(RuntimeError) as raised:
+            self.simulate_with(
+                FailingController(['adolescent#001', 'adult#001']))
+        self.assertIn('All 2 simulations failed', str(raised.exception))
+        self.assertIn('controller crashed', str(raised.exception))
+        self.assertIn('Traceback', str(raised.exception))
+
     def tearDown(self):
-        shutil.rmtree(output_folder)
+        shutil.rmtree(output_folder, ignore_errors=True)
 
 
 if __name__ == '__main__':